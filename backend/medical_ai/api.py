@@ -2,15 +2,24 @@
 FastAPI interface for Leny Medical AI System
 Provides REST API endpoints for clinical reasoning
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
 import uvicorn
-from typing import Optional
+import json
+import hmac
+import time
+import asyncio
+from typing import Optional, AsyncIterator, Dict, Any, List
 
 from models import QueryInput, FormattedResponse, UserType, ContextType, MedicalSpecialty
 from core_engine import ClinicalReasoningEngine
 from config import settings
+from inference_executor import InferenceQueueFull, RequestControl
+from model_registry import model_registry
+from shared_weights import process_memory
+import metrics
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -34,14 +43,31 @@ engine = ClinicalReasoningEngine()
 # Initialize MedGemma on startup
 @app.on_event("startup")
 async def startup_event():
-    """Initialize MedGemma AI system on startup"""
-    try:
-        await engine.initialize()
+    """Load and warm up MedGemma in the background so /health/ready can answer meanwhile"""
+    app.state.startup_task = asyncio.create_task(_initialize_engine())
+
+async def _initialize_engine():
+    await engine.startup()
+    if settings.SERVING_PROFILE == "lite":
+        print("🪶 Lite serving profile: MedGemma not loaded, knowledge-base answers only")
+    elif engine.is_initialized:
         print("✅ MedGemma AI system initialized successfully")
-    except Exception as e:
-        print(f"❌ Failed to initialize MedGemma: {e}")
+    else:
+        print("❌ Failed to initialize MedGemma")
         print("⚠️  Falling back to legacy OpenAI system")
 
+@app.exception_handler(InferenceQueueFull)
+async def inference_queue_full_handler(request: Request, exc: InferenceQueueFull):
+    """Shed load quickly instead of letting queueing latency grow without bound"""
+    return JSONResponse(
+        status_code=503,
+        content={
+            "detail": "MedGemma inference queue is full, please retry later",
+            "queue_depth": exc.queue_depth
+        },
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # API Models
 class QueryRequest(BaseModel):
     text: str
@@ -56,6 +82,24 @@ class QueryResponse(BaseModel):
     specialty: str
     user_type: str
 
+class BatchQueryItem(BaseModel):
+    index: int
+    result: Optional[QueryResponse] = None
+    sources: List[str] = []
+    error: Optional[str] = None
+    status_code: int = 200
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryItem]
+    succeeded: int
+    failed: int
+
+class ModelSwapRequest(BaseModel):
+    model_name: str
+
+class ClassifyBatchRequest(BaseModel):
+    texts: List[str]
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -75,16 +119,68 @@ async def health_check():
             "classifier": "operational",
             "templates": "loaded",
             "agent_configs": "loaded" if engine.agent_configs else "default",
-            "fallback_llm": "available" if engine.fallback_llm else "not_available"
+            "fallback_llm": "available" if engine.fallback_llm else "not_available",
+            "response_cache": engine.response_cache.stats(),
+            "semantic_cache": engine.semantic_cache.stats(),
+            "model_registry": model_registry.status(),
+            "request_coalescing": engine.coalescer.stats(),
+            "specialty_router": engine.specialty_router.stats()
         },
+        "worker": process_memory(),
         "response_modes": {
-            "consumer": "MedGemma direct inference (~1.2s)",
-            "professional": "MedGemma + RAG with citations (~2.5s)"
-        }
+            "consumer": "MedGemma direct inference",
+            "professional": "MedGemma + RAG with citations"
+        },
+        "ready": engine.is_ready,
+        "metrics": "/metrics"
     }
 
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 503 until startup has loaded and warmed up the model"""
+    return JSONResponse(
+        status_code=200 if engine.is_ready else 503,
+        content={
+            "ready": engine.is_ready,
+            "medgemma_model": "initialized" if engine.is_initialized else "not_initialized",
+            "warmup_seconds": {step: round(seconds, 3) for step, seconds in engine.warmup_timings.items()}
+        }
+    )
+
+@app.post("/admin/model/swap", status_code=202)
+async def swap_model(request: ModelSwapRequest, x_admin_token: Optional[str] = Header(None)):
+    """Load a model version in the background and switch traffic to it once it is warm"""
+    if not settings.ADMIN_API_TOKEN or not hmac.compare_digest(x_admin_token or "", settings.ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="A valid X-Admin-Token header is required")
+    if settings.SERVING_PROFILE == "lite":
+        raise HTTPException(status_code=409, detail="The lite serving profile does not load models")
+    running = getattr(app.state, "swap_task", None)
+    if running is not None and not running.done():
+        raise HTTPException(status_code=409, detail=f"A swap to {model_registry.swapping_to} is already in progress")
+    
+    app.state.swap_task = asyncio.create_task(_swap_model(request.model_name))
+    return {"active_model": model_registry.active_model, "swapping_to": request.model_name}
+
+async def _swap_model(model_name: str):
+    try:
+        await model_registry.swap(model_name)
+    except Exception as e:
+        print(f"❌ Model swap to {model_name} failed, still serving {model_registry.active_model}: {e}")
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus exposition: per-stage latency histograms, fallback and cache counters, queue depth, tokens/sec"""
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type)
+
+async def _cancel_on_disconnect(http_request: Request, control: RequestControl):
+    """Stop generation for a request whose client has gone away"""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(0.5)
+    control.cancel("client_disconnected")
+
 @app.post("/query", response_model=QueryResponse)
-async def process_medical_query(request: QueryRequest):
+async def process_medical_query(request: QueryRequest, http_request: Request):
     """
     Process a medical query through the MedGemma clinical reasoning engine
     
@@ -92,6 +188,9 @@ async def process_medical_query(request: QueryRequest):
     - Consumer (Patient): Fast MedGemma direct responses
     - Professional (Provider): MedGemma + RAG with citations
     
+    Generation is bounded by REQUEST_TIMEOUT and stops if the client disconnects;
+    either way the response degrades to a knowledge-based answer (metadata.degraded).
+    
     Args:
         request: QueryRequest containing the medical question and context
         
@@ -107,8 +206,13 @@ async def process_medical_query(request: QueryRequest):
             specialty_hint=request.specialty_hint
         )
         
-        # Process through MedGemma engine
-        response = engine.process_query(query_input)
+        # Process through MedGemma engine on the server's event loop
+        control = RequestControl()
+        watcher = asyncio.create_task(_cancel_on_disconnect(http_request, control))
+        try:
+            response = await engine.aprocess_query(query_input, control)
+        finally:
+            watcher.cancel()
         
         # Return formatted response
         return QueryResponse(
@@ -119,9 +223,142 @@ async def process_medical_query(request: QueryRequest):
             user_type=response.user_type.value
         )
         
+    except InferenceQueueFull:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"MedGemma processing error: {str(e)}")
 
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def process_medical_query_batch(requests: List[QueryRequest], http_request: Request):
+    """
+    Process a list of medical queries in one call
+    
+    Classification, RAG retrieval (once per distinct topic/specialty) and
+    generation batching are shared across items. Results come back in input
+    order; a failing item carries its own error instead of failing the batch.
+    
+    Args:
+        requests: List of QueryRequest objects
+        
+    Returns:
+        BatchQueryResponse with one item per request
+    """
+    if len(requests) > settings.MAX_BATCH_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(requests)} queries exceeds the limit of {settings.MAX_BATCH_QUERIES}"
+        )
+    
+    query_inputs = [
+        QueryInput(
+            text=request.text,
+            user_type=request.user_type,
+            context_hint=request.context_hint,
+            specialty_hint=request.specialty_hint
+        )
+        for request in requests
+    ]
+    
+    # Batches have no deadline, but a disconnected client still stops generation
+    control = RequestControl(timeout=None)
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, control))
+    try:
+        results = await engine.aprocess_batch(query_inputs, control)
+    finally:
+        watcher.cancel()
+    
+    items = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            status_code = 503 if isinstance(result, InferenceQueueFull) else 500
+            items.append(BatchQueryItem(index=index, error=str(result), status_code=status_code))
+        else:
+            items.append(BatchQueryItem(
+                index=index,
+                result=QueryResponse(
+                    content=result.content,
+                    metadata=result.metadata,
+                    escalation_triggered=result.escalation_triggered,
+                    specialty=result.specialty.value,
+                    user_type=result.user_type.value
+                ),
+                sources=result.sources
+            ))
+    
+    failed = sum(1 for item in items if item.error is not None)
+    return BatchQueryResponse(results=items, succeeded=len(items) - failed, failed=failed)
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _sse_stream(first_event: Dict[str, Any], events: AsyncIterator[Dict[str, Any]],
+                      control: RequestControl) -> AsyncIterator[str]:
+    """Translate engine stream events into SSE frames"""
+    finished = False
+    try:
+        event = first_event
+        while True:
+            if event["event"] == "token":
+                yield _sse("token", {"text": event["text"]})
+            else:
+                response = event["response"]
+                yield _sse("done", {
+                    "content": response.content,
+                    "metadata": response.metadata,
+                    "escalation_triggered": response.escalation_triggered,
+                    "specialty": response.specialty.value,
+                    "user_type": response.user_type.value,
+                    "sources": response.sources
+                })
+            event = await events.__anext__()
+    except StopAsyncIteration:
+        finished = True
+    except Exception as e:
+        finished = True
+        yield _sse("error", {"detail": f"MedGemma streaming error: {str(e)}"})
+    finally:
+        # Starlette closes this generator when the client disconnects mid-stream
+        if not finished:
+            control.cancel("client_disconnected")
+
+@app.post("/query/stream")
+async def stream_medical_query(request: QueryRequest, http_request: Request):
+    """
+    Stream a medical query response token by token as server-sent events
+    
+    Emits `token` events as MedGemma decodes, then a single `done` event with
+    the full content, metadata (including time_to_first_token_ms) and sources.
+    
+    Args:
+        request: QueryRequest containing the medical question and context
+        
+    Returns:
+        text/event-stream response
+    """
+    query_input = QueryInput(
+        text=request.text,
+        user_type=request.user_type,
+        context_hint=request.context_hint,
+        specialty_hint=request.specialty_hint
+    )
+    control = RequestControl()
+    events = engine.astream_query(query_input, control)
+    
+    # Pull the first event before committing to a 200 so a full queue still maps to 503
+    try:
+        first_event = await events.__anext__()
+    except InferenceQueueFull:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"MedGemma processing error: {str(e)}")
+    
+    return StreamingResponse(
+        _sse_stream(first_event, events, control),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/classify")
 async def classify_query(text: str):
     """
@@ -134,18 +371,42 @@ async def classify_query(text: str):
         Classification results
     """
     try:
-        context_type, specialty = engine.classifier.classify_query(text)
-        has_red_flags = engine.classifier.has_red_flags(text)
+        classification = await engine.aclassify(QueryInput(text=text))
+        return {"text": text, **classification.to_dict()}
         
-        return {
-            "text": text,
-            "context_type": context_type.value,
-            "specialty": specialty.value,
-            "has_red_flags": has_red_flags
-        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Classification error: {str(e)}")
+
+@app.post("/classify/batch")
+async def classify_query_batch(request: ClassifyBatchRequest):
+    """
+    Classify many medical queries in one call, e.g. to re-triage logged queries
+    
+    Args:
+        request: Texts to classify, at most MAX_CLASSIFY_BATCH
         
+    Returns:
+        One classification per text, in input order, and the batch throughput
+    """
+    if len(request.texts) > settings.MAX_CLASSIFY_BATCH:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(request.texts)} texts exceeds the limit of {settings.MAX_CLASSIFY_BATCH}"
+        )
+    
+    try:
+        start = time.perf_counter()
+        # Pattern scanning is CPU-bound, keep it off the event loop
+        results = await asyncio.to_thread(engine.classifier.classify_many, request.texts)
+        elapsed = time.perf_counter() - start
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Classification error: {str(e)}")
+    
+    return {
+        "results": [{"text": text, **result.to_dict()} for text, result in zip(request.texts, results)],
+        "count": len(results),
+        "texts_per_second": round(len(results) / elapsed, 1) if elapsed > 0 else None
+    }
 
 @app.get("/specialties")
 async def get_specialties():
@@ -325,5 +586,7 @@ if __name__ == "__main__":
         "api:app",
         host=settings.API_HOST,
         port=settings.API_PORT,
-        reload=True
+        workers=settings.API_WORKERS,
+        # uvicorn cannot combine auto-reload with several workers
+        reload=settings.API_WORKERS == 1
     )
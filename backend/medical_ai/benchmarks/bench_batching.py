@@ -0,0 +1,67 @@
+"""
+Micro-batching benchmark for MedGemma generation
+Reports requests/sec against batch window size under concurrent load on CPU
+
+With --backend fake the pipeline runs without a model, at MEDGEMMA_FAKE_* latencies.
+
+Usage:
+    python benchmarks/bench_batching.py --model google/medgemma-4b-it --requests 32 --windows 0 5 10 20
+    python benchmarks/bench_batching.py --backend fake --requests 256
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medgemma_integration import MedGemmaModel, MedGemmaConfig, GenerationParams
+from inference_backend import INFERENCE_BACKENDS
+
+QUERIES = [
+    "I have a headache that won't go away",
+    "My ankle hurts after running",
+    "What helps a sore throat?",
+    "I feel dizzy when I stand up",
+    "Is it normal to feel tired after a cold?",
+    "My knee is swollen and stiff in the morning",
+]
+
+async def run_load(model: MedGemmaModel, params: GenerationParams, requests: int) -> float:
+    """Fire `requests` concurrent prompts and return requests/sec"""
+    prompts = [QUERIES[i % len(QUERIES)] for i in range(requests)]
+    start = time.perf_counter()
+    await asyncio.gather(*[model.generate_response(prompt, params) for prompt in prompts])
+    return requests / (time.perf_counter() - start)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="google/medgemma-4b-it")
+    parser.add_argument("--backend", choices=INFERENCE_BACKENDS, default="transformers")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 5, 10, 20])
+    args = parser.parse_args()
+
+    model = MedGemmaModel(MedGemmaConfig(
+        model_name=args.model, device="cpu", max_batch_size=args.max_batch_size, backend=args.backend
+    ))
+    model.executor.max_pending = args.requests
+    await model.load_model()
+    params = GenerationParams(max_new_tokens=args.max_new_tokens, temperature=1.0, top_p=1.0, do_sample=False)
+
+    # Warm up kernels and the allocator before timing
+    await run_load(model, params, 2)
+
+    print(f"{'window_ms':>10} {'max_batch':>10} {'req/s':>10}")
+    for window in args.windows:
+        model.scheduler.window = window / 1000.0
+        # Window 0 flushes every prompt on arrival, i.e. the unbatched baseline
+        model.scheduler.max_batch_size = args.max_batch_size if window > 0 else 1
+        throughput = await run_load(model, params, args.requests)
+        print(f"{window:>10.1f} {model.scheduler.max_batch_size:>10d} {throughput:>10.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
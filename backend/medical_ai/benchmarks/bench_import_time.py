@@ -0,0 +1,67 @@
+"""
+Import-time benchmark for the API module
+Reports how long `import api` takes in a fresh interpreter and which heavy libraries it pulled in
+
+Model libraries must load on first model use, not at import: knowledge, classification and
+search endpoints never need them. Exits non-zero when the median exceeds --max-ms or a
+deferred library was imported, so it can run as a regression check in CI.
+
+Usage:
+    python benchmarks/bench_import_time.py --runs 5 --max-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MEDICAL_AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that only model inference or the OpenAI fallback may import
+DEFERRED = ("torch", "transformers", "openai", "sentence_transformers", "llama_cpp")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import api
+elapsed = time.perf_counter() - start
+print(json.dumps({"ms": elapsed * 1000, "loaded": [name for name in %r if name in sys.modules]}))
+""" % (DEFERRED,)
+
+def measure(module_env: dict) -> dict:
+    """Import the API once in a new interpreter and return its timing and loaded libraries"""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=MEDICAL_AI_DIR, env=module_env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=1500.0)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    # The first run also warms the OS page cache and .pyc files; it is not counted
+    measure(env)
+    runs = [measure(env) for _ in range(args.runs)]
+    median_ms = statistics.median(run["ms"] for run in runs)
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+
+    print(f"import api: median {median_ms:.0f} ms over {args.runs} runs "
+          f"(min {min(run['ms'] for run in runs):.0f}, max {max(run['ms'] for run in runs):.0f})")
+    print(f"deferred libraries imported: {', '.join(loaded) or 'none'}")
+
+    failures = []
+    if median_ms > args.max_ms:
+        failures.append(f"median {median_ms:.0f} ms exceeds {args.max_ms:.0f} ms")
+    if loaded:
+        failures.append(f"imported at module load: {', '.join(loaded)}")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
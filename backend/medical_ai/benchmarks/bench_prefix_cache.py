@@ -0,0 +1,79 @@
+"""
+Prefix KV-cache benchmark for MedGemma prompt templates
+Reports prefill time and total latency per template with and without preamble reuse
+
+Usage:
+    python benchmarks/bench_prefix_cache.py --model google/medgemma-4b-it --repeats 5 --max-new-tokens 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medgemma_integration import (
+    MedGemmaModel, MedGemmaConfig, MedGemmaConsumerMode, MedGemmaProfessionalMode, GenerationParams
+)
+from transformers_backend import TransformersBackend
+
+QUERY = "My knee is swollen and stiff in the morning"
+RAG_CONTEXT = {
+    "content": "Morning stiffness lasting over 30 minutes with joint swelling suggests inflammatory arthritis.",
+    "citations": [],
+    "evidence_level": "B"
+}
+
+def median_ms(backend: TransformersBackend, prompt: str, params: GenerationParams, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.batch_generate([prompt], params)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="google/medgemma-4b-it")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    model = MedGemmaModel(MedGemmaConfig(model_name=args.model, device="cpu"))
+    await model.load_model()
+    consumer = MedGemmaConsumerMode(model)
+    professional = MedGemmaProfessionalMode(model, rag_system=None)
+
+    prompts = {f"consumer/{name}": template.format(query=QUERY)
+               for name, template in consumer.consumer_prompts.items()}
+    prompts.update({f"professional/{name}": template.format(query=QUERY, rag_context=RAG_CONTEXT["content"])
+                    for name, template in professional.professional_prompts.items()})
+    prefixes = consumer.static_prefixes() + professional.static_prefixes()
+
+    # One generated token is (almost) pure prefill; the longer run adds decode
+    prefill = GenerationParams(max_new_tokens=1, temperature=1.0, top_p=1.0, do_sample=False)
+    full = GenerationParams(max_new_tokens=args.max_new_tokens, temperature=1.0, top_p=1.0, do_sample=False)
+
+    # Warm up kernels and the allocator before timing
+    backend = model.backend
+    backend.batch_generate([next(iter(prompts.values()))], full)
+
+    results = {}
+    for reuse in (False, True):
+        backend.prefix_cache.clear()
+        if reuse:
+            backend.warm_prefixes(prefixes)
+        for name, prompt in prompts.items():
+            results[(name, reuse)] = (median_ms(backend, prompt, prefill, args.repeats),
+                                      median_ms(backend, prompt, full, args.repeats))
+
+    print(f"{'template':<28} {'prefill_ms':>11} {'reuse':>9} {'total_ms':>10} {'reuse':>9} {'speedup':>8}")
+    for name in prompts:
+        (prefill_off, total_off), (prefill_on, total_on) = results[(name, False)], results[(name, True)]
+        print(f"{name:<28} {prefill_off:>11.1f} {prefill_on:>9.1f} {total_off:>10.1f} {total_on:>9.1f} "
+              f"{prefill_off / prefill_on:>7.2f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
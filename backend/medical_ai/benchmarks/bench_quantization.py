@@ -0,0 +1,100 @@
+"""
+Quantized CPU inference benchmark for MedGemma
+Reports tokens/sec, peak RSS and greedy-output agreement with fp32 for each quantization mode
+
+Each mode runs in its own process so peak RSS is not inflated by earlier loads.
+Agreement is the fraction of fp32 greedy tokens reproduced at the same position.
+
+Usage:
+    python benchmarks/bench_quantization.py --model google/medgemma-4b-it --modes none int8 int4 --max-new-tokens 64
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUERIES = [
+    "I have a headache that won't go away",
+    "My ankle hurts after running",
+    "What helps a sore throat?",
+    "I feel dizzy when I stand up",
+    "What are the side effects of metformin?",
+    "My knee is swollen and stiff in the morning",
+    "How is high blood pressure treated?",
+    "Should I worry about a mole that changed color?",
+]
+
+def run_mode(model_name: str, quantization: str, max_new_tokens: int, results: dict):
+    """Load the model in `quantization` mode, generate greedily for every query and record the numbers"""
+    import torch
+    from medgemma_integration import MedGemmaModel, MedGemmaConfig, MedGemmaConsumerMode
+
+    model = MedGemmaModel(MedGemmaConfig(model_name=model_name, device="cpu", quantization=quantization))
+    asyncio.run(model.load_model())
+    consumer = MedGemmaConsumerMode(model)
+    backend = model.backend
+    kwargs = {"max_new_tokens": max_new_tokens, "do_sample": False, "pad_token_id": backend.tokenizer.eos_token_id}
+
+    # Warm up kernels and the allocator before timing
+    with torch.no_grad():
+        backend.model.generate(**backend._prepare_inputs([consumer.build_prompt(QUERIES[0])]), **kwargs)
+
+    outputs, tokens, elapsed = [], 0, 0.0
+    for query in QUERIES:
+        inputs = backend._prepare_inputs([consumer.build_prompt(query)])
+        start = time.perf_counter()
+        with torch.no_grad():
+            generated = backend.model.generate(**inputs, **kwargs)[0, inputs["input_ids"].shape[1]:]
+        elapsed += time.perf_counter() - start
+        tokens += len(generated)
+        outputs.append(generated.tolist())
+
+    results[quantization] = {
+        "tokens_per_sec": tokens / elapsed,
+        # ru_maxrss is in KB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "outputs": outputs
+    }
+
+def agreement(reference: list, candidate: list) -> float:
+    matched = sum(
+        sum(1 for a, b in zip(ref, cand) if a == b) for ref, cand in zip(reference, candidate)
+    )
+    total = sum(len(ref) for ref in reference)
+    return matched / total if total else 1.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="google/medgemma-4b-it")
+    parser.add_argument("--modes", nargs="+", default=["none", "int8", "int4"])
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    # fp32 is the reference, so it always runs
+    modes = ["none"] + [mode for mode in args.modes if mode != "none"]
+    context = multiprocessing.get_context("spawn")
+    results = context.Manager().dict()
+    for mode in modes:
+        process = context.Process(target=run_mode, args=(args.model, mode, args.max_new_tokens, results))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"{mode}: failed (exit code {process.exitcode})")
+
+    if "none" not in results:
+        return
+    reference = results["none"]["outputs"]
+    print(f"{'mode':<6} {'tokens/s':>10} {'peak_rss_mb':>12} {'agreement':>10}")
+    for mode in modes:
+        if mode in results:
+            result = results[mode]
+            print(f"{mode:<6} {result['tokens_per_sec']:>10.2f} {result['peak_rss_mb']:>12.0f} "
+                  f"{agreement(reference, result['outputs']):>10.3f}")
+
+if __name__ == "__main__":
+    main()
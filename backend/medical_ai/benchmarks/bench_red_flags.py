@@ -0,0 +1,80 @@
+"""
+Red-flag scan micro-benchmark
+Compares the Aho-Corasick scanner with the per-phrase substring loop it replaced, on inputs of growing length
+
+The loop lowercases every phrase of ALL_RED_FLAGS and searches the text once per phrase,
+so its cost grows with phrases x text length; the scanner reads the text once. The old
+loop stops at the first flag, while the scanner reports every phrase with its category,
+so the loop is also timed listing all phrases ("loop all"), which is what reporting
+matches that way would cost. Inputs either carry no red flag or one near the end.
+
+Usage:
+    python benchmarks/bench_red_flags.py --lengths 200 2000 20000 --repeats 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ALL_RED_FLAGS
+from red_flag_scanner import RedFlagScanner
+
+FILLER = (
+    "patient reports mild intermittent discomfort after meals with occasional bloating and "
+    "reduced appetite over several weeks no recent travel sleeps poorly takes vitamins daily"
+).split()
+
+def substring_loop(text: str) -> bool:
+    """The previous ContextClassifier.has_red_flags"""
+    text_lower = text.lower()
+    for red_flag in ALL_RED_FLAGS:
+        if red_flag.lower() in text_lower:
+            return True
+    return False
+
+def substring_loop_all(text: str) -> list:
+    text_lower = text.lower()
+    return [red_flag for red_flag in ALL_RED_FLAGS if red_flag.lower() in text_lower]
+
+def make_text(words: int, flagged: bool, rng: random.Random) -> str:
+    text = " ".join(rng.choice(FILLER) for _ in range(words))
+    return text + " and now severe shortness of breath" if flagged else text
+
+def median_us(fn, text: str, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[20, 200, 2000, 20000], help="Words per input")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    start = time.perf_counter()
+    scanner = RedFlagScanner()
+    print(f"scanner: {len(scanner.phrases)} phrases, compiled pattern {len(scanner.pattern)} chars, "
+          f"built in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    print(f"{'words':>7} {'input':>8} {'loop us':>10} {'loop all us':>12} {'scanner us':>11} "
+          f"{'vs loop all':>12}  matches")
+    for words in args.lengths:
+        for flagged in (False, True):
+            text = make_text(words, flagged, rng)
+            loop_us = median_us(substring_loop, text, args.repeats)
+            loop_all_us = median_us(substring_loop_all, text, args.repeats)
+            scan_us = median_us(scanner.scan, text, args.repeats)
+            found = ", ".join(sorted({f"{m.phrase} ({m.category})" for m in scanner.scan(text)})) or "-"
+            print(f"{words:>7} {'flagged' if flagged else 'clean':>8} {loop_us:>10.1f} {loop_all_us:>12.1f} "
+                  f"{scan_us:>11.1f} {loop_all_us / scan_us:>11.2f}x  {found}")
+
+if __name__ == "__main__":
+    main()
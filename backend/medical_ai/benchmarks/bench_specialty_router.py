@@ -0,0 +1,80 @@
+"""
+Specialty router micro-benchmark
+Times ranking every MedicalSpecialty for a query: query encoding and the centroid product, separately
+
+The router's own work per query is one (specialties x dim) matrix-vector product, a
+softmax and a top-k, which should stay well under a millisecond on CPU; encoding the
+query with the sentence-transformers model is reported apart because it dominates.
+--synthetic replaces the encoder with random unit vectors, to time the product alone
+where the model is not available.
+
+Usage:
+    python benchmarks/bench_specialty_router.py --repeats 2000
+    python benchmarks/bench_specialty_router.py --synthetic --dim 768
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from query_embeddings import get_encoder
+from specialty_router import SpecialtyRouter
+
+QUERIES = [
+    "my ears keep ringing and i have trouble hearing on one side",
+    "what does a high psa level mean for a 60 year old man",
+    "itchy red patches on my elbows that keep coming back",
+    "how long should i wait to drive after general anesthesia",
+    "my daughter sprained her ankle during soccer practice",
+    "feeling hopeless and not sleeping for weeks",
+]
+
+def median_us(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--synthetic", action="store_true", help="Random unit centroids and queries, no encoder")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding size with --synthetic")
+    args = parser.parse_args()
+
+    router = SpecialtyRouter(enabled=True)
+    rng = np.random.default_rng(0)
+
+    def unit(rows: int) -> np.ndarray:
+        vectors = rng.standard_normal((rows, args.dim)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    if args.synthetic:
+        router.centroids = unit(len(router.specialties))
+        embeddings = unit(len(QUERIES))
+    else:
+        start = time.perf_counter()
+        router.load()
+        print(f"centroids: {router.centroids.shape[0]} specialties x {router.centroids.shape[1]} dims, "
+              f"built in {(time.perf_counter() - start) * 1000:.0f} ms")
+        encoder = get_encoder(router.model_name)
+        embeddings = encoder.encode(QUERIES)
+        encode_us = median_us(lambda: encoder.encode([QUERIES[0]]), max(1, args.repeats // 20))
+        print(f"query encoding: {encode_us:.0f} us median")
+
+    route_us = [median_us(lambda: router.route(embedding, args.top_k), args.repeats) for embedding in embeddings]
+    print(f"route (matmul + softmax + top-{args.top_k}): {statistics.median(route_us):.1f} us median\n")
+    for query, embedding in zip(QUERIES, embeddings):
+        ranked = ", ".join(f"{match.specialty.value} {match.confidence:.2f}" for match in router.route(embedding, args.top_k))
+        print(f"{query[:60]:<60}  {ranked}")
+
+if __name__ == "__main__":
+    main()
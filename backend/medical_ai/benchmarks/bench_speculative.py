@@ -0,0 +1,106 @@
+"""
+Speculative decoding benchmark for MedGemma
+Reports tokens/sec with and without the draft model, and the draft acceptance rate, per prompt set
+
+Consumer prompts are short conversational answers; professional prompts carry a RAG context
+and ask for clinical detail. Decoding is greedy, so both runs produce the same tokens.
+
+Usage:
+    python benchmarks/bench_speculative.py --model google/medgemma-4b-it --draft-model google/gemma-3-270m-it --max-new-tokens 128
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch
+from prometheus_client import REGISTRY
+
+from medgemma_integration import MedGemmaModel, MedGemmaConfig, MedGemmaConsumerMode, MedGemmaProfessionalMode
+from transformers_backend import TransformersBackend
+
+CONSUMER_QUERIES = [
+    "I have a headache that won't go away",
+    "My ankle hurts after running",
+    "What helps a sore throat?",
+    "I feel dizzy when I stand up",
+]
+
+PROFESSIONAL_QUERIES = [
+    "First-line management of newly diagnosed type 2 diabetes",
+    "Differential diagnosis for morning joint stiffness with swelling",
+    "Workup for syncope in a 70-year-old",
+    "Anticoagulation choice in atrial fibrillation with CKD stage 3",
+]
+
+RAG_CONTEXT = {
+    "content": "Current guidelines recommend metformin with lifestyle modification as initial therapy; "
+               "add an SGLT2 inhibitor or GLP-1 receptor agonist for patients with cardiovascular or renal disease.",
+    "citations": [],
+    "evidence_level": "A"
+}
+
+def draft_tokens(result: str) -> float:
+    return REGISTRY.get_sample_value("leny_speculative_draft_tokens_total", {"result": result}) or 0.0
+
+def run_set(backend: TransformersBackend, prompts: list, max_new_tokens: int, speculative: bool) -> dict:
+    """Generate greedily for every prompt and return tokens/sec and draft acceptance"""
+    kwargs = {"max_new_tokens": max_new_tokens, "do_sample": False, "pad_token_id": backend.tokenizer.eos_token_id}
+    proposed_before, accepted_before = draft_tokens("proposed"), draft_tokens("accepted")
+    tokens, elapsed = 0, 0.0
+    for prompt in prompts:
+        inputs = backend._prepare_inputs([prompt])
+        assistant = backend._speculative_kwargs(1) if speculative else {}
+        start = time.perf_counter()
+        with torch.no_grad():
+            outputs = backend.model.generate(**inputs, **kwargs, **assistant)
+        elapsed += time.perf_counter() - start
+        new_tokens = outputs.shape[1] - inputs["input_ids"].shape[1]
+        tokens += new_tokens
+        if assistant:
+            backend.speculative.record(new_tokens)
+
+    proposed = draft_tokens("proposed") - proposed_before
+    accepted = draft_tokens("accepted") - accepted_before
+    return {"tokens_per_sec": tokens / elapsed, "acceptance": accepted / proposed if proposed else None}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="google/medgemma-4b-it")
+    parser.add_argument("--draft-model", default="google/gemma-3-270m-it")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args()
+
+    # Never auto-disable during the benchmark; low acceptance is what it should report
+    model = MedGemmaModel(MedGemmaConfig(
+        model_name=args.model, device="cpu", draft_model=args.draft_model, draft_min_acceptance=0.0
+    ))
+    await model.load_model()
+    backend = model.backend
+    if backend.speculative is None:
+        print(f"{args.draft_model} cannot draft for {args.model} (vocabulary mismatch)")
+        return
+
+    consumer = MedGemmaConsumerMode(model)
+    professional = MedGemmaProfessionalMode(model, rag_system=None)
+    prompt_sets = {
+        "consumer": [consumer.build_prompt(query) for query in CONSUMER_QUERIES] * args.repeats,
+        "professional": [professional.build_prompt(query, RAG_CONTEXT) for query in PROFESSIONAL_QUERIES] * args.repeats,
+    }
+
+    # Warm up kernels and the allocator for both models before timing
+    run_set(backend, prompt_sets["consumer"][:1], args.max_new_tokens, speculative=True)
+
+    print(f"{'prompt_set':<14} {'tokens/s':>10} {'draft':>10} {'speedup':>8} {'acceptance':>11}")
+    for name, prompts in prompt_sets.items():
+        baseline = run_set(backend, prompts, args.max_new_tokens, speculative=False)
+        assisted = run_set(backend, prompts, args.max_new_tokens, speculative=True)
+        print(f"{name:<14} {baseline['tokens_per_sec']:>10.2f} {assisted['tokens_per_sec']:>10.2f} "
+              f"{assisted['tokens_per_sec'] / baseline['tokens_per_sec']:>7.2f}x {assisted['acceptance'] or 0.0:>11.3f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
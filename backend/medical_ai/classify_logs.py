@@ -0,0 +1,84 @@
+"""
+Offline Query Classification for Leny Medical AI System
+Re-classifies logged queries from JSONL in batches, e.g. after the classifier patterns change
+
+Each input line is a JSON object holding the query under --field (default "text"), or a
+bare JSON string. Each output line is the input object with a "classification" added;
+lines that cannot be read are echoed as {"line": n, "error": ...} instead. Input is
+processed --batch-size lines at a time, so logs of any size stream in constant memory.
+Throughput is reported on stderr.
+
+Usage:
+    python classify_logs.py queries.jsonl -o classified.jsonl --batch-size 10000
+    zcat queries.jsonl.gz | python classify_logs.py > classified.jsonl
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, IO, Iterator, List, Tuple
+
+from context_classifier import ContextClassifier
+
+def read_batches(lines: IO[str], field: str,
+                 batch_size: int) -> Iterator[List[Tuple[int, Dict[str, Any], bool]]]:
+    """(line number, record, readable) batches; unreadable lines become error records"""
+    batch = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {field: record}
+            if not isinstance(record, dict) or not isinstance(record.get(field), str):
+                raise ValueError(f"expected an object with a string '{field}' or a JSON string")
+            readable = True
+        except ValueError as e:
+            record, readable = {"line": number, "error": str(e)}, False
+        batch.append((number, record, readable))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def classify_batch(classifier: ContextClassifier, batch: List[Tuple[int, Dict[str, Any], bool]], field: str) -> int:
+    """Add a classification to every readable record of the batch; returns how many were classified"""
+    # Readability is tracked apart from the record: log records may carry their own "error" field
+    records = [record for _, record, readable in batch if readable]
+    for record, result in zip(records, classifier.classify_many([record[field] for record in records])):
+        record["classification"] = result.to_dict()
+    return len(records)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of queries, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file to write, - for stdout")
+    parser.add_argument("--field", default="text", help="Key holding the query in each input object")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Lines classified per batch")
+    args = parser.parse_args()
+
+    classifier = ContextClassifier()
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    classified = 0
+    start = time.perf_counter()
+    try:
+        for batch in read_batches(source, args.field, args.batch_size):
+            classified += classify_batch(classifier, batch, args.field)
+            sink.writelines(json.dumps(record) + "\n" for _, record, _ in batch)
+            elapsed = time.perf_counter() - start
+            print(f"{classified} texts classified, {classified / elapsed:.0f} texts/sec", file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {classified} texts in {elapsed:.1f}s "
+          f"({classified / elapsed if elapsed > 0 else 0.0:.0f} texts/sec)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 Configuration settings for Leny Medical AI System
 """
 import os
-from typing import Dict, List
+from typing import Any, Dict, List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -12,6 +12,23 @@ class Settings(BaseSettings):
     MEDGEMMA_DEVICE: str = "cuda"  # cuda or cpu
     MEDGEMMA_MAX_TOKENS: int = 1024
     MEDGEMMA_TEMPERATURE: float = 0.1
+    MEDGEMMA_QUANTIZATION: str = "none"  # CPU only: none, int8 (dynamic) or int4 (weight-only NF4)
+    MEDGEMMA_CONSUMER_MAX_TOKENS: int = 1024  # Generation budget for consumer-mode answers
+    MEDGEMMA_PROMPT_TOKEN_BUDGET: int = 1920  # Prompt tokens per request; lowest-priority RAG snippets are dropped to fit
+    MEDGEMMA_BACKEND: str = "transformers"  # Inference engine: transformers, llamacpp (GGUF on CPU) or fake
+    MEDGEMMA_GGUF_MODEL: str = ""  # Local .gguf file for the llamacpp backend
+    MEDGEMMA_GGUF_CONTEXT: int = 4096  # llama.cpp context window in tokens
+    MEDGEMMA_FAKE_PREFILL_MS: float = 50.0  # Fake backend: simulated prefill latency per call
+    MEDGEMMA_FAKE_TOKEN_MS: float = 20.0  # Fake backend: simulated latency per decode step
+    MEDGEMMA_FAKE_OUTPUT_TOKENS: int = 64  # Fake backend: tokens per answer (capped by max tokens)
+    
+    # Micro-batching Configuration
+    MEDGEMMA_BATCH_WINDOW_MS: float = 10.0  # How long to gather concurrent prompts into one generate
+    MEDGEMMA_MAX_BATCH_SIZE: int = 8  # Flush early once this many prompts are waiting
+    MEDGEMMA_DRAFT_MODEL: str = ""  # Small same-tokenizer model for speculative decoding, e.g. google/gemma-3-270m-it
+    MEDGEMMA_DRAFT_MIN_ACCEPTANCE: float = 0.4  # Disable drafting when fewer proposed tokens are accepted
+    MEDGEMMA_DRAFT_WINDOW_TOKENS: int = 512  # Draft tokens per acceptance evaluation
+    MEDGEMMA_PREFIX_CACHE: bool = True  # Prefill each template's static preamble once and reuse its KV cache
     
     # Fallback Model Configuration
     FALLBACK_MODEL: str = "gpt-4"  # OpenAI fallback for emergencies
@@ -31,6 +48,7 @@ class Settings(BaseSettings):
     # API Configuration
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
+    SERVING_PROFILE: str = "full"  # full, or lite: never load MedGemma; queries get knowledge-base answers
     
     # Response Mode Configuration
     CONSUMER_MODE_FAST: bool = True  # Use direct MedGemma for consumers
@@ -41,9 +59,58 @@ class Settings(BaseSettings):
     RED_FLAG_ESCALATION: bool = True
     
     # Performance Configuration
-    MAX_CONCURRENT_REQUESTS: int = 10
+    MAX_CONCURRENT_REQUESTS: int = 10  # Admission queue size of each loaded model (small and large tiers each get one)
     REQUEST_TIMEOUT: int = 30
-    RESPONSE_CACHE_TTL: int = 3600  # 1 hour cache for repeated queries
+    RESPONSE_CACHE_TTL: int = 3600  # 1 hour cache for repeated queries (0 disables the cache)
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_MAX_MB: int = 64  # Approximate memory cap for cached responses
+    RESPONSE_CACHE_BYPASS_RED_FLAGS: bool = True  # Always regenerate answers for red-flag queries
+    
+    # Semantic Cache Configuration (near-duplicate phrasings of a cached query)
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Minimum cosine similarity to reuse an answer
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 5000  # Per (user_type, specialty) scope
+    MAX_BATCH_QUERIES: int = 256  # Upper bound on items per /query/batch call
+    MAX_CLASSIFY_BATCH: int = 10000  # Upper bound on texts per /classify/batch call; larger logs go through classify_logs.py
+    REQUEST_COALESCING: bool = True  # Identical concurrent queries share one in-flight generation
+    
+    # Specialty Router Configuration (embedding fallback when no specialty pattern matches)
+    SPECIALTY_ROUTER_ENABLED: bool = False
+    SPECIALTY_ROUTER_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    SPECIALTY_ROUTER_MIN_CONFIDENCE: float = 0.3  # Below this the query keeps the internal medicine default
+    SPECIALTY_ROUTER_TOP_K: int = 3  # Candidate specialties reported per query
+    
+    # Multi-worker Serving Configuration
+    API_WORKERS: int = 1  # uvicorn worker processes
+    MEDGEMMA_SHARED_WEIGHTS: bool = False  # CPU: memory-map one exported copy of the weights across workers
+    MEDGEMMA_SHARED_WEIGHTS_PATH: str = "./models/medgemma/shared"
+    MEDGEMMA_TORCH_THREADS: int = 0  # Intra-op threads per worker (0 = cores / API_WORKERS)
+    
+    # Startup Warmup Configuration
+    MEDGEMMA_WARMUP: bool = True  # Run every prompt template before /health/ready reports ready
+    MEDGEMMA_WARMUP_QUERIES: List[str] = [
+        "I have had a headache and mild fever since yesterday",
+        "First-line treatment for newly diagnosed hypertension"
+    ]
+    MEDGEMMA_WARMUP_MAX_TOKENS: int = 16  # Generation budget per warmup prompt
+    MEDGEMMA_TORCH_COMPILE: bool = False  # torch.compile the model forward (transformers backend)
+    MEDGEMMA_COMPILE_CACHE_DIR: str = "./models/medgemma/compile_cache"  # Inductor artifacts, reused across restarts
+    
+    # Model Registry Configuration
+    MODEL_LOAD_RETRY_SECONDS: float = 5.0  # Wait after a failed model load, doubled per consecutive failure
+    MODEL_LOAD_MAX_RETRY_SECONDS: float = 300.0  # Cap on the failed-load backoff
+    ADMIN_API_TOKEN: str = ""  # Enables POST /admin/model/swap when set; sent as the X-Admin-Token header
+    
+    # Tiered Model Routing Configuration
+    MODEL_ROUTING_SMALL_MODEL: str = ""  # Smaller model for simple consumer queries; empty sends everything to PRIMARY_MODEL
+    MODEL_ROUTING_DEFAULT_TIER: str = "large"  # Tier for queries that match no rule: small or large
+    MODEL_ROUTING_RULES: List[Dict[str, Any]] = [  # First match wins (see model_routing.ModelRouter)
+        {"red_flags": True, "tier": "large"},
+        {"user_type": "provider", "tier": "large"},
+        {"user_type": "patient", "context_type": ["symptom", "medication", "follow_up", "logistics", "other"],
+         "max_words": 60, "tier": "small"}
+    ]
     
     model_config = {"env_file": ".env", "extra": "ignore"}
 
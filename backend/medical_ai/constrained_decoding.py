@@ -0,0 +1,245 @@
+"""
+Constrained JSON Decoding for Leny Medical AI System
+Logits processor and stopping criterion that keep generation inside a template's JSON shape
+"""
+import json
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+logger = logging.getLogger(__name__)
+
+# Decoding state is an immutable cons list of pending tasks, (task, rest) ... (), so it
+# is cheap to copy for lookahead and hashable for caching token masks:
+#   ("lit", text)             text that must be emitted verbatim
+#   ("str", length)           inside a string value, `length` characters so far
+#   ("more", item, count)     after array item `count`: ", " and another item, or "]"
+
+def _lit(text: str, rest: Tuple) -> Tuple:
+    if rest and rest[0][0] == "lit":
+        return (("lit", text + rest[0][1]), rest[1])
+    return (("lit", text), rest)
+
+def _push(shape: Tuple, rest: Tuple) -> Tuple:
+    """Tasks that emit one value of `shape` (compact separators), followed by `rest`"""
+    kind = shape[0]
+    if kind == "array":
+        return _lit("[", _push(shape[1], (("more", shape[1], 1), rest)))
+    if kind == "object":
+        stack = _lit("}", rest)
+        fields = shape[1]
+        for index in range(len(fields) - 1, -1, -1):
+            key, value = fields[index]
+            stack = _lit(("{" if index == 0 else ", ") + json.dumps(key) + ": ", _push(value, stack))
+        return stack if fields else _lit("{}", rest)
+    return _lit('"', (("str", 0), rest))
+
+def _step(stack: Tuple, ch: str, max_string_chars: Optional[int], max_items: int) -> Optional[Tuple]:
+    """State after emitting `ch`, or None if `ch` would leave the shape; `max_string_chars=None` skips the cap"""
+    if not stack:
+        return None
+    task, rest = stack
+    kind = task[0]
+    if kind == "lit":
+        text = task[1]
+        if ch != text[0]:
+            return None
+        return (("lit", text[1:]), rest) if len(text) > 1 else rest
+    if kind == "str":
+        if ch == '"':
+            return rest
+        # No escapes: quotes, backslashes and control characters never appear inside values
+        if ch == "\\" or ch < " " or (max_string_chars is not None and task[1] >= max_string_chars):
+            return None
+        return (("str", task[1] + 1), rest)
+    item, count = task[1], task[2]
+    if ch == "]":
+        return rest
+    if ch == "," and count < max_items:
+        return _lit(" ", _push(item, (("more", item, count + 1), rest)))
+    return None
+
+def _max_item_growth(shape: Tuple) -> int:
+    """Most characters one ", " plus new array item can add to the shortest completion"""
+    kind = shape[0]
+    if kind == "array":
+        own = len(", ") + len(_closing_text(_push(shape[1], ())))
+        return max(own, _max_item_growth(shape[1]))
+    if kind == "object":
+        return max((_max_item_growth(value) for _, value in shape[1]), default=0)
+    return 0
+
+def _closing_text(stack: Tuple) -> str:
+    """Shortest text that completes the object from this state"""
+    parts = []
+    while stack:
+        task, stack = stack
+        parts.append(task[1] if task[0] == "lit" else '"' if task[0] == "str" else "]")
+    return "".join(parts)
+
+class TokenTable:
+    """Decoded text of every vocabulary entry, indexed for fast mask construction (built once per tokenizer)"""
+
+    def __init__(self, tokenizer, vocab_size: int, max_cached_masks: int = 8192):
+        self.vocab_size = vocab_size
+        # Per cache; states repeat across requests of one template, so the caches rarely fill
+        self.max_cached_masks = max_cached_masks
+        # Decode each token after an anchor so leading spaces survive (SentencePiece drops them otherwise)
+        anchor = tokenizer.convert_tokens_to_ids(tokenizer.tokenize("a"))[0]
+        anchor_text = tokenizer.decode([anchor])
+        special = set(tokenizer.all_special_ids)
+        token_count = min(len(tokenizer), vocab_size)
+        decoded = tokenizer.batch_decode([[anchor, token] for token in range(token_count)],
+                                         clean_up_tokenization_spaces=False)
+
+        self.texts: List[Optional[str]] = [None] * vocab_size
+        self.by_first_char: Dict[str, List[int]] = {}
+        self.string_safe = torch.zeros(vocab_size, dtype=torch.bool)
+        for token, text in enumerate(decoded):
+            text = text[len(anchor_text):]
+            # Partial UTF-8 pieces cannot be validated on their own
+            if token in special or not text or "\ufffd" in text:
+                continue
+            self.texts[token] = text
+            self.by_first_char.setdefault(text[0], []).append(token)
+            if not any(ch in '"\\' or ch < " " for ch in text):
+                self.string_safe[token] = True
+        self.quote_tokens = self.by_first_char.get('"', [])
+        self.eos_ids = [token for token in [tokenizer.eos_token_id] if token is not None]
+        self._masks: Dict[Tuple, torch.Tensor] = {}
+        self._quote_masks: Dict[Tuple, torch.Tensor] = {}
+        logger.info(f"Constrained decoding table built for {token_count} tokens")
+
+    def mask_for(self, stack: Tuple, max_string_chars: int, max_items: int) -> torch.Tensor:
+        """Allowed-token mask for a state whose next character is structural (cached across requests)"""
+        mask = self._masks.get(stack)
+        if mask is None:
+            task = stack[0]
+            first_chars = task[1][0] if task[0] == "lit" else ",]"
+            mask = torch.zeros(self.vocab_size, dtype=torch.bool)
+            for ch in first_chars:
+                for token in self.by_first_char.get(ch, []):
+                    if self.consume(stack, self.texts[token], max_string_chars, max_items) is not None:
+                        mask[token] = True
+            if len(self._masks) >= self.max_cached_masks:
+                self._masks.clear()
+            self._masks[stack] = mask
+        return mask
+
+    def quote_mask_for(self, rest: Tuple, max_string_chars: int, max_items: int) -> torch.Tensor:
+        """Tokens that close the current string value and continue validly into `rest` (cached)"""
+        mask = self._quote_masks.get(rest)
+        if mask is None:
+            mask = torch.zeros(self.vocab_size, dtype=torch.bool)
+            for token in self.quote_tokens:
+                if self.consume(rest, self.texts[token][1:], max_string_chars, max_items) is not None:
+                    mask[token] = True
+            if len(self._quote_masks) >= self.max_cached_masks:
+                self._quote_masks.clear()
+            self._quote_masks[rest] = mask
+        return mask
+
+    @staticmethod
+    def consume(stack: Tuple, text: str, max_string_chars: Optional[int], max_items: int) -> Optional[Tuple]:
+        for ch in text:
+            stack = _step(stack, ch, max_string_chars, max_items)
+            if stack is None:
+                return None
+        return stack
+
+class JsonShapeLogitsProcessor(LogitsProcessor):
+    """
+    Masks every token that would take a row's output outside the JSON shape
+
+    Output always starts at "{", uses compact separators and closes in time: once the
+    remaining token budget only covers the shortest completion, that completion is forced.
+    `max_new_tokens` is raised when the shape cannot fit in it; pass the final value to generate().
+    """
+
+    def __init__(self, table: TokenTable, shape: Tuple, max_new_tokens: int,
+                 max_string_chars: int = 600, max_items: int = 8):
+        self.table = table
+        self.initial = _push(shape, ())
+        # One token can open a new array item (twice, allowing for merged punctuation tokens);
+        # keep that much slack so the shortest completion always fits the remaining budget
+        self.slack = 2 * _max_item_growth(shape) + 1
+        # Every character is at worst one token, so this budget can always finish the object
+        self.max_new_tokens = max(max_new_tokens, len(_closing_text(self.initial)) + self.slack + 1)
+        self.max_string_chars = max_string_chars
+        self.max_items = max_items
+        self.prompt_length: Optional[int] = None
+        self.states: List[Tuple] = []
+        self.outputs: List[List[str]] = []
+
+    def sync(self, input_ids: torch.LongTensor):
+        """Advance each row's state over tokens appended since the last call"""
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[1]
+            self.states = [self.initial] * input_ids.shape[0]
+            self.outputs = [[] for _ in range(input_ids.shape[0])]
+            return
+        for position in range(self.prompt_length + len(self.outputs[0]), input_ids.shape[1]):
+            for row in range(input_ids.shape[0]):
+                if not self.states[row]:
+                    # Finished rows are padded by generate(); nothing left to track
+                    self.outputs[row].append("")
+                    continue
+                text = self.table.texts[int(input_ids[row, position])] or ""
+                self.states[row] = self.table.consume(self.states[row], text, None, self.max_items) or ()
+                self.outputs[row].append(text)
+
+    def complete(self, row: int) -> bool:
+        return self.prompt_length is not None and not self.states[row]
+
+    def text(self, row: int) -> str:
+        """The JSON emitted for a row, exactly as validated"""
+        return "".join(self.outputs[row])
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        self.sync(input_ids)
+        remaining = self.max_new_tokens - (input_ids.shape[1] - self.prompt_length)
+        for row, stack in enumerate(self.states):
+            mask = self._row_mask(stack, remaining).to(scores.device)
+            scores[row] = scores[row].masked_fill(~mask[:scores.shape[-1]], float("-inf"))
+        return scores
+
+    def _row_mask(self, stack: Tuple, remaining: int) -> torch.Tensor:
+        table = self.table
+        if not stack:
+            mask = torch.zeros(table.vocab_size, dtype=torch.bool)
+            mask[table.eos_ids] = True
+            return mask
+
+        closing = _closing_text(stack)
+        if len(closing) + self.slack >= remaining:
+            # Out of budget: only tokens that are a prefix of the shortest completion
+            mask = torch.zeros(table.vocab_size, dtype=torch.bool)
+            for token in table.by_first_char.get(closing[0], []):
+                if closing.startswith(table.texts[token]):
+                    mask[token] = True
+            return mask
+
+        task = stack[0]
+        if task[0] != "str":
+            return table.mask_for(stack, self.max_string_chars, self.max_items)
+
+        # Inside a string: any escape-free text, or a quote that closes it validly
+        closing = table.quote_mask_for(stack[1], self.max_string_chars, self.max_items)
+        if task[1] < self.max_string_chars:
+            return table.string_safe | closing
+        return closing
+
+class JsonCompleteCriteria(StoppingCriteria):
+    """Stops each row as soon as its top-level JSON object closes"""
+
+    def __init__(self, processor: JsonShapeLogitsProcessor):
+        self.processor = processor
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        self.processor.sync(input_ids)
+        return torch.tensor(
+            [self.processor.complete(row) for row in range(input_ids.shape[0])],
+            dtype=torch.bool, device=input_ids.device
+        )
@@ -3,8 +3,49 @@ Context Classification Module for Leny Medical AI System
 Classifies user queries into medical context types
 """
 import re
-from typing import Tuple
-from models import ContextType, MedicalSpecialty
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from models import ContextType, MedicalSpecialty, QueryInput
+from metrics import stage_timer
+from red_flag_scanner import red_flag_scanner, RedFlagMatch, normalize
+from specialty_router import SpecialtyMatch
+
+Label = Union[ContextType, MedicalSpecialty]
+
+@dataclass
+class ClassificationResult:
+    """Everything the classifier found in one query; computed once and carried on the QueryInput"""
+    context_type: ContextType
+    specialty: MedicalSpecialty
+    context_scores: Dict[ContextType, int]
+    specialty_scores: Dict[MedicalSpecialty, int]
+    spans: List[Tuple[Label, int, int]] = field(default_factory=list)  # (label, start, end) per pattern match
+    red_flags: List[RedFlagMatch] = field(default_factory=list)
+    # Set by the embedding specialty router when no specialty pattern matched
+    specialty_candidates: List[SpecialtyMatch] = field(default_factory=list)
+
+    @property
+    def has_red_flags(self) -> bool:
+        return bool(self.red_flags)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready summary: winners, per-label scores and red flags (spans are left out)"""
+        return {
+            "context_type": self.context_type.value,
+            "specialty": self.specialty.value,
+            "context_scores": {label.value: score for label, score in self.context_scores.items()},
+            "specialty_scores": {label.value: score for label, score in self.specialty_scores.items()},
+            "has_red_flags": self.has_red_flags,
+            "red_flags": [{"phrase": match.phrase, "category": match.category} for match in self.red_flags],
+            "specialty_candidates": [
+                {"specialty": match.specialty.value, "similarity": round(match.similarity, 4),
+                 "confidence": round(match.confidence, 4)}
+                for match in self.specialty_candidates
+            ]
+        }
 
 class ContextClassifier:
     def __init__(self):
@@ -63,56 +104,158 @@ class ContextClassifier:
             ]
         }
 
+        # One scanner for every context, specialty and red-flag pattern (see classify)
+        self._rules: List[Tuple[Label, "re.Pattern"]] = [
+            (label, re.compile(pattern))
+            for table in (self.patterns, self.specialty_patterns)
+            for label, patterns in table.items()
+            for pattern in patterns
+        ]
+        alternatives = [f"(?=(?P<r{index}>{rule.pattern}))" for index, (_, rule) in enumerate(self._rules)]
+        alternatives.append(f"(?={red_flag_scanner.pattern})")
+        # Patterns all start at a word, so only word starts are tried
+        self._scanner = re.compile(r"\b(?=\w)(?:" + "|".join(alternatives) + ")")
+        # _tails[i]: the same alternatives from pattern i on, to find the next pattern matching at a position
+        self._tails = [re.compile("|".join(alternatives[index:])) for index in range(len(alternatives))]
+        # Pattern -> label one-hot rows, so a texts x patterns hit matrix times these gives label scores
+        self._context_weights = self._label_weights(list(self.patterns))
+        self._specialty_weights = self._label_weights(list(self.specialty_patterns))
+
+    def _label_weights(self, labels: List[Label]) -> np.ndarray:
+        weights = np.zeros((len(self._rules), len(labels)), dtype=np.int32)
+        for index, (label, _) in enumerate(self._rules):
+            if label in labels:
+                weights[index, labels.index(label)] = 1
+        return weights
+
+    def classify(self, text: str) -> ClassificationResult:
+        """Score every context type and specialty and find red flags in one pass over the query"""
+        with stage_timer("classification"):
+            hits, red_flags = self._scan(normalize(text))
+            context_scores = dict.fromkeys(self.patterns, 0)
+            specialty_scores = dict.fromkeys(self.specialty_patterns, 0)
+            spans: List[Tuple[Label, int, int]] = []
+            for index, start, end in hits:
+                label = self._rules[index][0]
+                spans.append((label, start, end))
+                scores = context_scores if isinstance(label, ContextType) else specialty_scores
+                scores[label] += 1
+
+        return ClassificationResult(
+            # Highest score wins; no match defaults to symptom / internal medicine
+            context_type=max(context_scores, key=context_scores.get) if any(context_scores.values()) else ContextType.SYMPTOM,
+            specialty=(max(specialty_scores, key=specialty_scores.get) if any(specialty_scores.values())
+                       else MedicalSpecialty.INTERNAL_MEDICINE),
+            context_scores=context_scores,
+            specialty_scores=specialty_scores,
+            spans=spans,
+            red_flags=red_flags
+        )
+
+    def classify_many(self, texts: Sequence[str]) -> List[ClassificationResult]:
+        """
+        Classify a batch of texts, same results as classify on each one
+
+        Each distinct text is scanned once; texts that are equal after normalization share one
+        result object. Pattern hits are collected into a sparse texts x patterns count matrix,
+        and one product with each pattern-to-label matrix scores the whole batch.
+        """
+        from scipy import sparse
+
+        distinct: Dict[str, int] = {}  # Normalized text -> its row in the hit matrix
+        text_rows = [distinct.setdefault(normalize(text), len(distinct)) for text in texts]
+
+        rows: List[int] = []
+        columns: List[int] = []
+        scanned = []
+        for row, text_lower in enumerate(distinct):
+            hits, red_flags = self._scan(text_lower)
+            rows.extend(row for _ in hits)
+            columns.extend(index for index, _, _ in hits)
+            scanned.append((hits, red_flags))
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(columns), dtype=np.int32), (rows, columns)),
+            shape=(len(scanned), len(self._rules))
+        )
+        context_scores = matrix @ self._context_weights
+        specialty_scores = matrix @ self._specialty_weights
+        # argmax keeps the first of tied labels, like max() over the score dicts in classify
+        context_winners = np.where(context_scores.max(axis=1) > 0, context_scores.argmax(axis=1), -1)
+        specialty_winners = np.where(specialty_scores.max(axis=1) > 0, specialty_scores.argmax(axis=1), -1)
+
+        context_labels = list(self.patterns)
+        specialty_labels = list(self.specialty_patterns)
+        results = [
+            ClassificationResult(
+                context_type=context_labels[context_winner] if context_winner >= 0 else ContextType.SYMPTOM,
+                specialty=specialty_labels[specialty_winner] if specialty_winner >= 0 else MedicalSpecialty.INTERNAL_MEDICINE,
+                context_scores=dict(zip(context_labels, context_row.tolist())),
+                specialty_scores=dict(zip(specialty_labels, specialty_row.tolist())),
+                spans=[(self._rules[index][0], start, end) for index, start, end in hits],
+                red_flags=red_flags
+            )
+            for (hits, red_flags), context_row, specialty_row, context_winner, specialty_winner
+            in zip(scanned, context_scores, specialty_scores, context_winners.tolist(), specialty_winners.tolist())
+        ]
+        return [results[row] for row in text_rows]
+
+    def _scan(self, text_lower: str) -> Tuple[List[Tuple[int, int, int]], List[RedFlagMatch]]:
+        """
+        (pattern index, start, end) of every pattern match, and the red flags, of a normalized text
+
+        The scanner stops at each word where any pattern matches and reports the first one;
+        the patterns after it are then tried at that position only. Each pattern counts
+        non-overlapping matches, like re.findall did when every pattern scanned the text alone.
+        """
+        hits: List[Tuple[int, int, int]] = []
+        red_flags: List[RedFlagMatch] = []
+        resume = [0] * len(self._rules)  # Per pattern: where its previous match ended
+
+        for hit in self._scanner.finditer(text_lower):
+            position = hit.start()
+            while hit is not None:
+                index = self._rule_index(hit)
+                if index == len(self._rules):
+                    red_flags.extend(red_flag_scanner.match_at(text_lower, position))
+                    break
+                # Inside this pattern's previous match: findall would not have matched here
+                if position >= resume[index]:
+                    end = hit.end(f"r{index}")
+                    resume[index] = end
+                    hits.append((index, position, end))
+                hit = self._tails[index + 1].match(text_lower, position)
+        return hits, red_flags
+
+    def _rule_index(self, hit: "re.Match") -> int:
+        """Index in _rules of the pattern a scanner hit reports; len(_rules) for a red flag"""
+        name = hit.lastgroup
+        return int(name[1:]) if name and name[0] == "r" else len(self._rules)
+
+    def classify_input(self, query_input: QueryInput) -> ClassificationResult:
+        """Classification of a request, computed on first use and kept on the QueryInput for later stages"""
+        if query_input.classification is None:
+            query_input.classification = self.classify(query_input.text)
+        return query_input.classification
+
     def classify_context(self, text: str) -> ContextType:
         """Classify the context type of a medical query"""
-        text_lower = text.lower()
-        
-        # Score each context type
-        scores = {}
-        for context_type, patterns in self.patterns.items():
-            score = 0
-            for pattern in patterns:
-                matches = len(re.findall(pattern, text_lower))
-                score += matches
-            scores[context_type] = score
-        
-        # Return highest scoring context type, default to symptom
-        if max(scores.values()) == 0:
-            return ContextType.SYMPTOM
-        
-        return max(scores, key=scores.get)
+        return self.classify(text).context_type
 
     def classify_specialty(self, text: str) -> MedicalSpecialty:
         """Classify the medical specialty most relevant to the query"""
-        text_lower = text.lower()
-        
-        # Score each specialty
-        scores = {}
-        for specialty, patterns in self.specialty_patterns.items():
-            score = 0
-            for pattern in patterns:
-                matches = len(re.findall(pattern, text_lower))
-                score += matches
-            scores[specialty] = score
-        
-        # Return highest scoring specialty, default to internal medicine
-        if max(scores.values()) == 0:
-            return MedicalSpecialty.INTERNAL_MEDICINE
-        
-        return max(scores, key=scores.get)
+        return self.classify(text).specialty
 
     def classify_query(self, text: str) -> Tuple[ContextType, MedicalSpecialty]:
         """Classify both context and specialty for a query"""
-        context = self.classify_context(text)
-        specialty = self.classify_specialty(text)
-        return context, specialty
+        result = self.classify(text)
+        return result.context_type, result.specialty
+
+    def find_red_flags(self, text: str) -> List[RedFlagMatch]:
+        """Every red flag phrase in the query, with its RED_FLAG_KEYWORDS category"""
+        with stage_timer("red_flag_scan"):
+            return red_flag_scanner.scan(text)
 
     def has_red_flags(self, text: str) -> bool:
         """Check if query contains red flag keywords requiring escalation"""
-        from config import ALL_RED_FLAGS
-        
-        text_lower = text.lower()
-        for red_flag in ALL_RED_FLAGS:
-            if red_flag.lower() in text_lower:
-                return True
-        return False
+        return bool(self.find_red_flags(text))
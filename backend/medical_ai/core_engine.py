@@ -5,7 +5,9 @@ Handles the main processing pipeline with MedGemma integration
 import json
 import yaml
 import asyncio
-from typing import Dict, Any, Optional
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
 import os
 import logging
 
@@ -13,8 +15,8 @@ from models import (
     QueryInput, ClinicalResponse, FormattedResponse,
     ContextType, UserType, MedicalSpecialty
 )
-from context_classifier import ContextClassifier
-from prompt_templates import PromptTemplates
+from context_classifier import ContextClassifier, ClassificationResult
+from prompt_templates import PromptTemplates, TEMPLATE_VERSION
 from config import settings
 from comprehensive_medical_db import (
     get_all_specialties, get_literature_sources, get_clinical_tools,
@@ -24,21 +26,37 @@ from medical_knowledge_db import (
     get_diagnosis_info, get_clinical_rule, check_drug_interactions,
     get_lab_reference, get_emergency_protocol
 )
-from medgemma_integration import get_medgemma_ai
+from model_registry import model_registry, ModelUnavailable
+from model_routing import ModelRouter
+from inference_executor import InferenceQueueFull, RequestControl, GenerationAborted, until_deadline
+from response_cache import ResponseCache
+from semantic_cache import SemanticResponseCache, SemanticProbe
+from specialty_router import SpecialtyRouter
+from request_coalescing import RequestCoalescer
+from metrics import stage_timer, observe_tier, FALLBACKS, WARMUP_SECONDS
 
 class ClinicalReasoningEngine:
     def __init__(self):
         self.classifier = ContextClassifier()
+        self.specialty_router = SpecialtyRouter()
+        self.router = ModelRouter(self.classifier)
         self.templates = PromptTemplates()
         self.agent_configs = self._load_agent_configs()
         self.logger = logging.getLogger(__name__)
         
-        # Initialize MedGemma AI system
-        self.medgemma_ai = None
-        self.is_initialized = False
+        # MedGemma comes from the process-wide model registry (see medgemma_ai)
+        self.is_ready = False  # Startup (model load and warmup) has finished
+        self.warmup_timings: Dict[str, float] = {}
         
-        # Fallback OpenAI system for emergencies
-        self.fallback_llm = self._init_fallback_llm()
+        # Fallback OpenAI system for emergencies, created on first use (see fallback_llm)
+        self._fallback_llm = None
+        self._fallback_llm_checked = False
+        
+        # Caches of finished responses: exact repeats, then near-duplicate phrasings
+        self.response_cache = ResponseCache()
+        self.semantic_cache = SemanticResponseCache()
+        # Concurrent identical queries share one in-flight generation
+        self.coalescer = RequestCoalescer()
         
         # Legacy components for compatibility
         self.vector_store = None
@@ -53,17 +71,60 @@ class ClinicalReasoningEngine:
             print("Warning: agent_configs.yaml not found, using default configs")
             return {}
 
+    @property
+    def medgemma_ai(self):
+        """Active MedGemma integration, or None until it has loaded; read per request so swaps take effect"""
+        return model_registry.current()
+    
+    @property
+    def is_initialized(self) -> bool:
+        return model_registry.current() is not None
+    
     async def initialize(self):
-        """Initialize MedGemma AI system"""
-        try:
-            if not self.is_initialized:
-                self.logger.info("Initializing MedGemma AI system...")
-                self.medgemma_ai = await get_medgemma_ai()
-                self.is_initialized = True
-                self.logger.info("MedGemma AI system initialized successfully")
-        except Exception as e:
-            self.logger.error(f"Failed to initialize MedGemma: {e}")
-            self.is_initialized = False
+        """Load MedGemma through the registry: one load per process, none while backing off after a failure"""
+        if settings.SERVING_PROFILE == "lite":
+            # The lite profile never loads a model; queries take the knowledge-base path
+            return
+        # The active (large) model, plus the small tier's model when routing is enabled
+        model_names = [None] + ([self.router.small_model] if self.router.enabled else [])
+        for model_name in model_names:
+            try:
+                await model_registry.get(model_name)
+            except ModelUnavailable as e:
+                # The registry already logged the failed load; requests during backoff fail fast
+                self.logger.debug(str(e))
+    
+    async def startup(self):
+        """Initialize, then warm up every prompt template; marks the engine ready either way"""
+        start = time.perf_counter()
+        await self.initialize()
+        self.warmup_timings["initialize"] = time.perf_counter() - start
+        WARMUP_SECONDS.labels("initialize").set(self.warmup_timings["initialize"])
+        
+        # The small tier warms up first so the step gauges end up describing the large model
+        tiers = [("large", self.medgemma_ai)]
+        if self.router.enabled:
+            tiers.insert(0, ("small", model_registry.current(self.router.small_model)))
+        for tier, medgemma_ai in tiers:
+            if medgemma_ai is None or not settings.MEDGEMMA_WARMUP:
+                continue
+            try:
+                timings = await medgemma_ai.warmup(settings.MEDGEMMA_WARMUP_QUERIES, settings.MEDGEMMA_WARMUP_MAX_TOKENS)
+            except Exception as e:
+                self.logger.error(f"MedGemma {tier} tier warmup failed: {e}")
+                continue
+            prefix = "" if tier == "large" else f"{tier}_"
+            self.warmup_timings.update({prefix + step: seconds for step, seconds in timings.items()})
+        # Without MedGemma the legacy pipeline serves, so startup still ends in ready
+        self.is_ready = True
+
+    @property
+    def fallback_llm(self):
+        """OpenAI client, imported and created on first use so importing the engine stays cheap"""
+        if not self._fallback_llm_checked:
+            self._fallback_llm = self._init_fallback_llm()
+            self._fallback_llm_checked = True
+        return self._fallback_llm
 
     def _init_fallback_llm(self):
         """Initialize fallback OpenAI LLM for emergency situations"""
@@ -79,7 +140,7 @@ class ClinicalReasoningEngine:
             self.logger.warning("OpenAI package not available for fallback")
             return None
 
-    def _retrieve_context(self, query: str) -> str:
+    def _retrieve_context(self, query: str, has_red_flags: bool) -> str:
         """Retrieve relevant context using medical knowledge database"""
         context_parts = []
         
@@ -110,7 +171,7 @@ class ClinicalReasoningEngine:
                             context_parts.append(f"Lab Reference: {test_name} - {ranges}")
         
         # Search for emergency protocols if red flags detected
-        if self.classifier.has_red_flags(query):
+        if has_red_flags:
             emergency_keywords = ["cardiac", "stroke", "anaphylaxis"]
             for keyword in emergency_keywords:
                 if keyword in query.lower():
@@ -120,10 +181,10 @@ class ClinicalReasoningEngine:
         
         return "\n".join(context_parts[:5])  # Limit to top 5 most relevant
 
-    def _should_escalate(self, query: str, context_type: ContextType) -> bool:
+    def _should_escalate(self, has_red_flags: bool, context_type: ContextType) -> bool:
         """Determine if query should be escalated to premium model"""
         # Check for red flags
-        if self.classifier.has_red_flags(query):
+        if has_red_flags:
             return True
         
         # Escalate triage questions
@@ -153,10 +214,11 @@ class ClinicalReasoningEngine:
 
     def _format_for_audience(self, response: Dict[str, Any], user_type: UserType, specialty: MedicalSpecialty) -> str:
         """Format response based on audience (patient vs provider)"""
-        if user_type == UserType.PROVIDER:
-            return self._format_provider_response(response, specialty)
-        else:
-            return self._format_patient_response(response, specialty)
+        with stage_timer("formatting"):
+            if user_type == UserType.PROVIDER:
+                return self._format_provider_response(response, specialty)
+            else:
+                return self._format_patient_response(response, specialty)
 
     def _format_provider_response(self, response: Dict[str, Any], specialty: MedicalSpecialty) -> str:
         """Format response for healthcare providers"""
@@ -350,33 +412,390 @@ class ClinicalReasoningEngine:
         
         return response
 
-    def process_query(self, query_input: QueryInput) -> FormattedResponse:
-        """Main processing pipeline with MedGemma integration"""
+    async def aprocess_query(self, query_input: QueryInput,
+                             control: Optional[RequestControl] = None) -> FormattedResponse:
+        """
+        Main processing pipeline with MedGemma integration, run on the caller's event loop
+        
+        `control` carries the request deadline (settings.REQUEST_TIMEOUT by default) and lets
+        the caller abort generation, e.g. when the client disconnects.
+        """
+        control = control or RequestControl()
+        if settings.SERVING_PROFILE == "lite":
+            return self._lite_response(query_input)
+        await self.aclassify(query_input)
+        cache_key = self._cache_key(query_input)
+        cached, probe = await self._cache_lookup(query_input, cache_key)
+        if cached:
+            return cached
+        
+        async def produce(flight_control: RequestControl) -> AsyncIterator[FormattedResponse]:
+            response = await self._aprocess_uncached(query_input, flight_control)
+            self._cache_store(cache_key, response, probe)
+            yield response
+        
+        response, shared = None, False
         try:
-            # Use MedGemma AI system
-            return asyncio.run(self._process_with_medgemma(query_input))
+            async for response, shared in self.coalescer.subscribe(
+                self._coalescing_key("query", query_input), control, produce
+            ):
+                pass
+        except GenerationAborted:
+            # This request's own deadline or disconnect detached it from a shared generation
+            return self._degraded_response(query_input, control.reason)
+        if response is None:
+            # produce always yields an answer; a flight ending without one is treated as aborted
+            return self._degraded_response(query_input, control.reason or "no_response")
+        return self._shared_copy(response, query_input) if shared else response
+    
+    async def _aprocess_uncached(self, query_input: QueryInput, control: RequestControl) -> FormattedResponse:
+        try:
+            # Use MedGemma AI system; the deadline also bounds time spent queued for the model,
+            # and may be extended meanwhile by identical requests joining this generation
+            return await until_deadline(self._process_with_medgemma(query_input, control), control)
             
+        except InferenceQueueFull:
+            raise
+        except (GenerationAborted, asyncio.TimeoutError):
+            control.cancel("deadline_exceeded")
+            self.logger.warning(f"MedGemma generation stopped ({control.reason}), degrading to knowledge base")
+            return self._degraded_response(query_input, control.reason)
         except Exception as e:
-            # Error handling - fallback to legacy system
+            # Error handling - fallback to legacy system (blocking LLM client, keep it off the loop)
             self.logger.error(f"MedGemma processing error: {e}, falling back to legacy system")
-            return self._legacy_process_query(query_input)
+            return await asyncio.to_thread(self._legacy_process_query, query_input)
+    
+    async def aprocess_batch(self, query_inputs: List[QueryInput],
+                             control: Optional[RequestControl] = None) -> List[Any]:
+        """
+        Batch pipeline: one FormattedResponse or exception per input, in order
+        
+        A failure on one item never fails the batch; items MedGemma cannot answer
+        fall back to the legacy pipeline individually. Batches have no deadline by
+        default, but `control` can still abort them.
+        """
+        control = control or RequestControl(timeout=None)
+        if settings.SERVING_PROFILE == "lite":
+            return [self._lite_response(query_input) for query_input in query_inputs]
+        # Classification and cache probes encode queries in worker threads; run them side by side
+        await asyncio.gather(*[self.aclassify(query_input) for query_input in query_inputs])
+        cache_keys = [self._cache_key(query_input) for query_input in query_inputs]
+        lookups = await asyncio.gather(*[
+            self._cache_lookup(query_input, key) for query_input, key in zip(query_inputs, cache_keys)
+        ])
+        results: List[Any] = [cached for cached, _ in lookups]
+        misses = [index for index, result in enumerate(results) if result is None]
+        if not misses:
+            return results
+        
+        try:
+            answers = await self._respond_many_routed([query_inputs[index] for index in misses], control)
+        except Exception as e:
+            self.logger.error(f"MedGemma batch processing error: {e}, falling back to legacy system")
+            answers = [e] * len(misses)
+        
+        for index, answer in zip(misses, answers):
+            if isinstance(answer, GenerationAborted):
+                answer = self._degraded_response(query_inputs[index], answer.reason)
+            elif isinstance(answer, Exception) and not isinstance(answer, InferenceQueueFull):
+                answer = await asyncio.to_thread(self._legacy_process_query, query_inputs[index])
+            if not isinstance(answer, Exception):
+                self._cache_store(cache_keys[index], answer, lookups[index][1])
+            results[index] = answer
+        return results
+    
+    async def _respond_many_routed(self, query_inputs: List[QueryInput], control: RequestControl) -> List[Any]:
+        """respond_many per model tier, run concurrently; answers come back in input order"""
+        positions: Dict[str, List[int]] = {}
+        integrations: Dict[str, Any] = {}
+        
+        async def respond_tier(tier: str) -> List[Any]:
+            start = time.perf_counter()
+            answers = await integrations[tier].respond_many([query_inputs[p] for p in positions[tier]], control)
+            observe_tier(tier, time.perf_counter() - start, len(answers))
+            for answer in answers:
+                if isinstance(answer, FormattedResponse):
+                    answer.metadata["model_tier"] = tier
+            return answers
+        
+        async with AsyncExitStack() as leases:
+            for position, query_input in enumerate(query_inputs):
+                medgemma_ai, tier = await leases.enter_async_context(self._medgemma_for(query_input))
+                integrations[tier] = medgemma_ai
+                positions.setdefault(tier, []).append(position)
+            
+            tiers = list(positions)
+            tier_answers = await asyncio.gather(*[respond_tier(tier) for tier in tiers])
+        
+        answers: List[Any] = [None] * len(query_inputs)
+        for tier, answers_for_tier in zip(tiers, tier_answers):
+            for position, answer in zip(positions[tier], answers_for_tier):
+                answers[position] = answer
+        return answers
+    
+    async def astream_query(self, query_input: QueryInput,
+                            control: Optional[RequestControl] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming pipeline: 'token' events followed by a 'done' event carrying the FormattedResponse
+        
+        If the deadline stops generation mid-stream, the 'done' event carries the degraded
+        knowledge-based answer, which replaces the partial text.
+        """
+        control = control or RequestControl()
+        start = time.perf_counter()
+        
+        if settings.SERVING_PROFILE == "lite":
+            response = self._lite_response(query_input)
+            self._record_stream_timing(response, start, time.perf_counter())
+            yield {"event": "token", "text": response.content}
+            yield {"event": "done", "response": response}
+            return
+        
+        await self.aclassify(query_input)
+        cache_key = self._cache_key(query_input)
+        cached, probe = await self._cache_lookup(query_input, cache_key)
+        if cached:
+            self._record_stream_timing(cached, start, time.perf_counter())
+            yield {"event": "token", "text": cached.content}
+            yield {"event": "done", "response": cached}
+            return
+        
+        first_token_at = None
+        try:
+            async for event, shared in self.coalescer.subscribe(
+                self._coalescing_key("stream", query_input), control,
+                lambda flight_control: self._astream_uncached(query_input, flight_control, start, cache_key, probe)
+            ):
+                if event["event"] == "token" and first_token_at is None:
+                    first_token_at = time.perf_counter()
+                elif event["event"] == "done" and shared:
+                    response = self._shared_copy(event["response"], query_input)
+                    self._record_stream_timing(response, start, first_token_at)
+                    event = {"event": "done", "response": response}
+                yield event
+        except GenerationAborted:
+            # This request's own deadline or disconnect detached it from a shared generation
+            response = self._degraded_response(query_input, control.reason)
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                yield {"event": "token", "text": response.content}
+            self._record_stream_timing(response, start, first_token_at)
+            yield {"event": "done", "response": response}
+    
+    async def _astream_uncached(self, query_input: QueryInput, control: RequestControl, start: float,
+                                cache_key: Optional[str], probe: Optional[SemanticProbe]) -> AsyncIterator[Dict[str, Any]]:
+        """MedGemma stream with degraded and legacy fallbacks; coalesced requests share `control`"""
+        first_token_at = None
+        try:
+            async with self._medgemma_for(query_input) as (medgemma_ai, tier):
+                async for event in medgemma_ai.stream(query_input, control):
+                    if event["event"] == "token" and first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    elif event["event"] == "done":
+                        observe_tier(tier, time.perf_counter() - start)
+                        event["response"].metadata["model_tier"] = tier
+                        self._cache_store(cache_key, event["response"], probe)
+                        self._record_stream_timing(event["response"], start, first_token_at)
+                    yield event
+            return
+            
+        except InferenceQueueFull:
+            raise
+        except GenerationAborted:
+            self.logger.warning(f"MedGemma stream stopped ({control.reason}), degrading to knowledge base")
+            response = self._degraded_response(query_input, control.reason)
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                yield {"event": "token", "text": response.content}
+            self._record_stream_timing(response, start, first_token_at)
+            yield {"event": "done", "response": response}
+            return
+        except Exception as e:
+            # Once tokens have been sent we cannot switch answers mid-stream
+            if first_token_at is not None:
+                raise
+            self.logger.error(f"MedGemma streaming error: {e}, falling back to legacy system")
+        
+        response = await asyncio.to_thread(self._legacy_process_query, query_input)
+        first_token_at = time.perf_counter()
+        self._record_stream_timing(response, start, first_token_at)
+        yield {"event": "token", "text": response.content}
+        yield {"event": "done", "response": response}
+    
+    def _cache_version(self) -> str:
+        """Model and prompt template versions that produced a cached answer"""
+        model_name = self.medgemma_ai.config.model_name if self.medgemma_ai else settings.PRIMARY_MODEL
+        if self.router.enabled:
+            model_name += f"+{self.router.small_model}"
+        return f"{model_name}:{TEMPLATE_VERSION}"
     
-    async def _process_with_medgemma(self, query_input: QueryInput) -> FormattedResponse:
-        """Process query using MedGemma AI system"""
+    def _coalescing_key(self, kind: str, query_input: QueryInput) -> str:
+        """In-flight key: same normalization as the response cache, but red-flag queries are shared too"""
+        return f"{kind}:{self.response_cache.make_key(query_input, self._cache_version())}"
+    
+    @staticmethod
+    def _shared_copy(response: FormattedResponse, query_input: QueryInput) -> FormattedResponse:
+        """Private copy of another request's answer, addressed to this request's wording"""
+        response = response.model_copy(deep=True)
+        response.original_query = query_input.text
+        response.metadata["coalesced"] = True
+        return response
+    
+    async def aclassify(self, query_input: QueryInput) -> ClassificationResult:
+        """
+        Classification of a request, kept on it for later stages
+        
+        When no specialty pattern matched, the embedding specialty router ranks every specialty
+        and its best one replaces the internal medicine default if confident enough.
+        """
+        classification = self.classifier.classify_input(query_input)
+        if (self.specialty_router.enabled and not classification.specialty_candidates
+                and not any(classification.specialty_scores.values())):
+            # Encoding the query is CPU-bound, keep it off the event loop
+            candidates = await asyncio.to_thread(self.specialty_router.route_query, query_input)
+            classification.specialty_candidates = candidates
+            if candidates and candidates[0].confidence >= self.specialty_router.min_confidence:
+                classification.specialty = candidates[0].specialty
+        return classification
+    
+    def _cache_key(self, query_input: QueryInput) -> Optional[str]:
+        """Response cache key, or None when this query must not be served from cache"""
+        if not self.response_cache.enabled:
+            return None
+        if settings.RESPONSE_CACHE_BYPASS_RED_FLAGS and self.classifier.classify_input(query_input).has_red_flags:
+            return None
+        
+        return self.response_cache.make_key(query_input, self._cache_version())
+    
+    async def _cache_lookup(self, query_input: QueryInput,
+                            cache_key: Optional[str]) -> Tuple[Optional[FormattedResponse], Optional[SemanticProbe]]:
+        """Exact cache first, then the semantic cache; the probe lets a miss be stored without re-embedding"""
+        if cache_key is None:
+            return None, None
+        cached = self.response_cache.get(cache_key)
+        if cached:
+            cached.metadata["cache"] = "hit"
+            return cached, None
+        
+        if not self.semantic_cache.enabled:
+            return None, None
+        specialty = query_input.specialty_hint or self.classifier.classify_input(query_input).specialty
+        scope = (query_input.user_type.value, specialty.value, self._cache_version())
+        # Encoding the query is CPU-bound, keep it off the event loop
+        cached, probe = await asyncio.to_thread(self.semantic_cache.lookup, scope, query_input)
+        if cached:
+            cached.original_query = query_input.text
+        return cached, probe
+    
+    def _cache_store(self, cache_key: Optional[str], response: FormattedResponse,
+                     probe: Optional[SemanticProbe] = None):
+        """Cache model answers only; fallback and legacy answers should be retried once MedGemma recovers"""
+        if cache_key is None:
+            return
+        metadata = response.metadata
+        if metadata.get("fallback") or metadata.get("degraded") or "error" in metadata or metadata.get("system") == "legacy":
+            return
+        self.response_cache.put(cache_key, response)
+        if probe is not None:
+            self.semantic_cache.add(probe, response)
+    
+    def _record_stream_timing(self, response: FormattedResponse, start: float, first_token_at: Optional[float]):
+        """Attach time-to-first-token and total stream time to the response metadata"""
+        end = time.perf_counter()
+        ttft = (first_token_at or end) - start
+        response.metadata["time_to_first_token_ms"] = round(ttft * 1000, 1)
+        response.metadata["total_time_ms"] = round((end - start) * 1000, 1)
+        self.logger.info(f"Streamed response: ttft={ttft * 1000:.1f}ms total={(end - start) * 1000:.1f}ms")
+    
+    def process_query(self, query_input: QueryInput) -> FormattedResponse:
+        """Synchronous wrapper for scripts; must not be called from a running event loop"""
+        return asyncio.run(self.aprocess_query(query_input))
+    
+    async def _process_with_medgemma(self, query_input: QueryInput,
+                                     control: Optional[RequestControl] = None) -> FormattedResponse:
+        """Process query using the MedGemma tier the router picks"""
+        async with self._medgemma_for(query_input) as (medgemma_ai, tier):
+            start = time.perf_counter()
+            response = await medgemma_ai.respond(query_input, control)
+            observe_tier(tier, time.perf_counter() - start)
+        response.metadata["model_tier"] = tier
+        return response
+    
+    @asynccontextmanager
+    async def _medgemma_for(self, query_input: QueryInput) -> AsyncIterator[Tuple[Any, str]]:
+        """
+        Integration and tier that answer this query, leased from the registry until the block exits
+        
+        The small tier falls back to the large model while unavailable. The lease keeps a
+        model swapped out meanwhile from being released under the request.
+        """
+        model_name = None
+        if self.router.route(query_input) == "small" and settings.SERVING_PROFILE != "lite":
+            try:
+                await model_registry.get(self.router.small_model)
+                model_name = self.router.small_model
+            except ModelUnavailable as e:
+                self.logger.debug(f"{e}; routing to the large tier")
+        
         # Ensure MedGemma is initialized
-        if not self.is_initialized:
+        if model_name is None and not self.is_initialized:
             await self.initialize()
-        
-        if self.medgemma_ai:
-            return await self.medgemma_ai.respond(query_input)
-        else:
-            raise Exception("MedGemma AI not available")
+            if not self.is_initialized:
+                raise Exception("MedGemma AI not available")
+        async with model_registry.lease(model_name) as medgemma_ai:
+            yield medgemma_ai, "small" if model_name else "large"
+    
+    def _degraded_response(self, query_input: QueryInput, reason: Optional[str]) -> FormattedResponse:
+        """Knowledge-base answer used when generation was stopped by the deadline or a disconnect"""
+        FALLBACKS.labels("degraded").inc()
+        return self._knowledge_base_response(
+            query_input, {"degraded": True, "degraded_reason": reason or "deadline_exceeded"}
+        )
+    
+    def _knowledge_base_response(self, query_input: QueryInput,
+                                 metadata: Optional[Dict[str, Any]] = None) -> FormattedResponse:
+        """Answer from the knowledge base alone, tinted for the specialty; never calls a model"""
+        classification = self.classifier.classify_input(query_input)
+        context_type, specialty = classification.context_type, classification.specialty
+        if query_input.context_hint:
+            context_type = query_input.context_hint
+        if query_input.specialty_hint:
+            specialty = query_input.specialty_hint
+        
+        clinical_data = self._generate_knowledge_based_response(query_input.text, context_type, specialty)
+        tinted_response = self._apply_agent_tinting(clinical_data, specialty)
+        should_escalate = self._should_escalate(classification.has_red_flags, context_type)
+        
+        return FormattedResponse(
+            original_query=query_input.text,
+            user_type=query_input.user_type,
+            specialty=specialty,
+            content=self._format_for_audience(tinted_response, query_input.user_type, specialty),
+            metadata={
+                "context_type": context_type.value,
+                "escalated": should_escalate,
+                "system": "knowledge_base",
+                **(metadata or {})
+            },
+            escalation_triggered=should_escalate
+        )
+    
+    def _lite_response(self, query_input: QueryInput) -> FormattedResponse:
+        """
+        The lite profile loads no model, so its answers come straight from the knowledge base
+        
+        This is the profile's normal path, not a fallback: no error is logged, no fallback is
+        counted, and the legacy pipeline's OpenAI escalation is never reached.
+        """
+        return self._knowledge_base_response(query_input, {"serving_profile": "lite"})
     
     def _legacy_process_query(self, query_input: QueryInput) -> FormattedResponse:
         """Legacy processing pipeline as fallback"""
+        FALLBACKS.labels("legacy").inc()
         try:
             # Step 1: Classify context and specialty
-            context_type, specialty = self.classifier.classify_query(query_input.text)
+            classification = self.classifier.classify_input(query_input)
+            context_type, specialty = classification.context_type, classification.specialty
             
             # Use hints if provided
             if query_input.context_hint:
@@ -385,14 +804,26 @@ class ClinicalReasoningEngine:
                 specialty = query_input.specialty_hint
             
             # Step 2: Retrieve relevant context
-            rag_context = self._retrieve_context(query_input.text)
+            rag_context = self._retrieve_context(query_input.text, classification.has_red_flags)
             
             # Step 3: Choose LLM based on escalation criteria
-            should_escalate = self._should_escalate(query_input.text, context_type)
-            llm = self.fallback_llm if should_escalate else self.primary_llm
+            should_escalate = self._should_escalate(classification.has_red_flags, context_type)
+            llm = self.fallback_llm if should_escalate else None
+            local_model = self.medgemma_ai.model if self.medgemma_ai and self.medgemma_ai.model.is_loaded else None
+            if local_model is not None and not local_model.backend.supports_json:
+                # Free-form output would need the JSON parsing this path avoids; use the knowledge base
+                local_model = None
             
             # Step 4: Generate base clinical response
-            if llm is None:
+            if llm is None and local_model is not None:
+                # MedGemma decodes under the template's JSON shape, so the result always parses
+                try:
+                    prompt = self.templates.format_template(context_type, query_input.text, rag_context)
+                    clinical_data = local_model.generate_json_blocking(prompt, self.templates.get_json_shape(context_type))
+                except Exception as e:
+                    self.logger.error(f"Constrained MedGemma generation failed: {e}")
+                    clinical_data = self._generate_knowledge_based_response(query_input.text, context_type, specialty)
+            elif llm is None:
                 # Use knowledge-based response when LLM is not available
                 clinical_data = self._generate_knowledge_based_response(query_input.text, context_type, specialty)
             else:
@@ -403,7 +834,8 @@ class ClinicalReasoningEngine:
                         model="gpt-3.5-turbo",
                         messages=[{"role": "user", "content": prompt}],
                         temperature=0.1,
-                        max_tokens=2000
+                        max_tokens=2000,
+                        response_format={"type": "json_object"}
                     )
                     
                     raw_response = response.choices[0].message.content
@@ -0,0 +1,148 @@
+"""
+Inference Backends for Leny Medical AI System
+Engine-neutral generation interface, backend selection and a deterministic fake backend for load tests
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+import random
+import time
+import zlib
+
+from inference_executor import RequestControl, GenerationAborted
+from metrics import observe_generation
+
+# transformers: HF checkpoints (GPU or CPU); llamacpp: GGUF files on CPU; fake: no model, simulated latency
+INFERENCE_BACKENDS = ("transformers", "llamacpp", "fake")
+
+@dataclass(frozen=True)
+class GenerationParams:
+    """Sampling parameters; prompts are only batched together when these match"""
+    max_new_tokens: int
+    temperature: float
+    top_p: float
+    do_sample: bool = True
+
+class InferenceBackend(ABC):
+    """Engine that turns prompts into text; every method blocks and runs on the inference thread"""
+
+    name = "base"
+    # Whether generate_json is implemented; callers check it instead of catching NotImplementedError
+    supports_json = False
+
+    @abstractmethod
+    def load(self):
+        """Load weights and tokenizer"""
+
+    @abstractmethod
+    def batch_generate(self, prompts: List[str], params: GenerationParams,
+                       controls: Optional[List[Optional[RequestControl]]] = None) -> List[Any]:
+        """One output per prompt, in order: its text, or GenerationAborted if its control stopped it"""
+
+    @abstractmethod
+    def stream(self, prompt: str, params: GenerationParams, on_text: Callable[[str], None],
+               control: Optional[RequestControl] = None):
+        """Generate one prompt, passing decoded text to `on_text` as it arrives; raises GenerationAborted if stopped"""
+
+    def generate(self, prompt: str, params: GenerationParams, control: Optional[RequestControl] = None) -> str:
+        output = self.batch_generate([prompt], params, [control])[0]
+        if isinstance(output, GenerationAborted):
+            raise output
+        return output
+
+    def count_tokens(self, text: str) -> int:
+        """Tokens `text` encodes to, without special tokens; safe to call off the inference thread"""
+        # Rough estimate for engines without a tokenizer: about four characters per token
+        return (len(text) + 3) // 4
+
+    def warm_prefixes(self, prefixes: List[str]):
+        """Precompute state for static prompt preambles; a no-op unless the engine can reuse it"""
+
+    def generate_json(self, prompt: str, shape: Tuple, params: GenerationParams,
+                      control: Optional[RequestControl] = None) -> Dict[str, Any]:
+        """One JSON object of `shape`, decoded under that constraint"""
+        raise NotImplementedError(f"The {self.name} backend has no constrained JSON decoding")
+
+def create_backend(config: "MedGemmaConfig") -> InferenceBackend:
+    """Backend selected by `config.backend`; engine libraries are only imported for the one in use"""
+    if config.backend == "transformers":
+        from transformers_backend import TransformersBackend
+        return TransformersBackend(config)
+    if config.backend == "llamacpp":
+        from llamacpp_backend import LlamaCppBackend
+        return LlamaCppBackend(config)
+    if config.backend == "fake":
+        return FakeBackend(config.fake_prefill_ms, config.fake_token_ms, config.fake_output_tokens)
+    raise ValueError(f"Unknown MEDGEMMA_BACKEND '{config.backend}', expected one of {INFERENCE_BACKENDS}")
+
+_FAKE_WORDS = (
+    "rest", "fluids", "monitor", "symptoms", "consult", "your", "doctor", "if", "pain", "persists",
+    "evidence", "suggests", "first-line", "therapy", "with", "follow-up", "in", "two", "weeks", "and",
+)
+
+class FakeBackend(InferenceBackend):
+    """
+    Model-free backend with a fixed latency profile, for load tests and pipeline benchmarks
+
+    Each call sleeps `prefill_ms` once, then `token_ms` per decode step; a batch decodes its
+    rows in lockstep like a real model. Output depends only on the prompt, so repeated runs match.
+    """
+
+    name = "fake"
+
+    def __init__(self, prefill_ms: float = 50.0, token_ms: float = 20.0, output_tokens: int = 64):
+        self.prefill = prefill_ms / 1000.0
+        self.token_time = token_ms / 1000.0
+        self.output_tokens = output_tokens
+        self.logger = logging.getLogger(__name__)
+
+    def load(self):
+        self.logger.info(f"Fake inference backend: {self.prefill * 1000:.0f} ms prefill, "
+                         f"{self.token_time * 1000:.0f} ms/token, {self.output_tokens} tokens")
+
+    def count_tokens(self, text: str) -> int:
+        return len(text.split())
+
+    def _words(self, prompt: str, params: GenerationParams) -> List[str]:
+        # crc32 rather than hash(): str hashes are salted per process
+        rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+        return [rng.choice(_FAKE_WORDS) for _ in range(min(self.output_tokens, params.max_new_tokens))]
+
+    def batch_generate(self, prompts: List[str], params: GenerationParams,
+                       controls: Optional[List[Optional[RequestControl]]] = None) -> List[Any]:
+        controls = controls or [None] * len(prompts)
+        rows = [self._words(prompt, params) for prompt in prompts]
+        stopped: Dict[int, GenerationAborted] = {}
+
+        start = time.perf_counter()
+        time.sleep(self.prefill)
+        first_step_at = time.perf_counter()
+        tokens = 0
+        for step in range(max((len(words) for words in rows), default=0)):
+            for row, control in enumerate(controls):
+                # Rows that already finished keep their answer whatever happens to their deadline
+                if step < len(rows[row]) and row not in stopped and control is not None and control.should_stop():
+                    stopped[row] = GenerationAborted(control.reason)
+            live = [row for row, words in enumerate(rows) if step < len(words) and row not in stopped]
+            if not live:
+                break
+            time.sleep(self.token_time)
+            tokens += len(live)
+        observe_generation(first_step_at - start, time.perf_counter() - first_step_at, tokens)
+
+        return [stopped.get(row) or " ".join(words) for row, words in enumerate(rows)]
+
+    def stream(self, prompt: str, params: GenerationParams, on_text: Callable[[str], None],
+               control: Optional[RequestControl] = None):
+        start = time.perf_counter()
+        time.sleep(self.prefill)
+        first_step_at = time.perf_counter()
+        words = self._words(prompt, params)
+        for step, word in enumerate(words):
+            if control is not None and control.should_stop():
+                observe_generation(first_step_at - start, time.perf_counter() - first_step_at, step)
+                raise GenerationAborted(control.reason)
+            time.sleep(self.token_time)
+            on_text(word if step == 0 else " " + word)
+        observe_generation(first_step_at - start, time.perf_counter() - first_step_at, len(words))
@@ -0,0 +1,192 @@
+"""
+Inference Executor for Leny Medical AI System
+Runs blocking model work off the event loop behind a bounded admission queue
+"""
+import asyncio
+import functools
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional
+import logging
+
+from config import settings
+from metrics import QUEUE_DEPTH
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference admission queue is at capacity"""
+
+    def __init__(self, queue_depth: int, retry_after: int):
+        super().__init__(f"Inference queue is full ({queue_depth} requests pending)")
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+class GenerationAborted(Exception):
+    """Raised when generation was stopped by a request deadline or client disconnect"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Generation aborted: {reason}")
+        self.reason = reason
+
+class RequestControl:
+    """Per-request deadline and cancellation flag, checked by the generation thread between decode steps"""
+
+    def __init__(self, timeout: Optional[float] = settings.REQUEST_TIMEOUT):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason: Optional[str] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[str], None]] = []
+
+    def cancel(self, reason: str = "cancelled"):
+        """Ask in-flight generation for this request to stop (e.g. client disconnected)"""
+        with self._lock:
+            if self._stopped.is_set():
+                return
+            self.reason = reason
+            self._stopped.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(reason)
+
+    def add_cancel_callback(self, callback: Callable[[str], None]):
+        """Call `callback(reason)` once this request is cancelled, on whichever thread cancels it"""
+        with self._lock:
+            if not self._stopped.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self.reason)
+
+    def extend(self, deadline: Optional[float]) -> bool:
+        """
+        Move the deadline (a time.monotonic() value, None for none) later, never earlier
+
+        Returns False, leaving the control unchanged, once it has been cancelled or its
+        deadline has passed: a stopped request cannot be revived.
+        """
+        with self._lock:
+            if self._stopped.is_set() or (self.deadline is not None and time.monotonic() >= self.deadline):
+                return False
+            if self.deadline is not None and (deadline is None or deadline > self.deadline):
+                self.deadline = deadline
+            return True
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None when the request has no deadline"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def should_stop(self) -> bool:
+        if self._stopped.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline_exceeded")
+            return True
+        return False
+
+async def until_deadline(awaitable: Awaitable[Any], control: RequestControl) -> Any:
+    """
+    Await `awaitable`, cancelling it and raising asyncio.TimeoutError once `control` reaches its deadline
+
+    Unlike asyncio.wait_for, the deadline is read again whenever it expires, so a deadline
+    extended meanwhile (see RequestControl.extend) is honoured.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=control.remaining())
+            if done:
+                return task.result()
+            if control.should_stop():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise asyncio.TimeoutError()
+    finally:
+        task.cancel()
+
+class InferenceExecutor:
+    """Dedicated worker thread that owns the model, fed by a bounded admission queue"""
+
+    def __init__(self, max_pending: int = settings.MAX_CONCURRENT_REQUESTS, workers: int = 1, model: str = ""):
+        self.max_pending = max(1, max_pending)
+        self.model = model
+        # Each loaded model has its own queue, so each reports its own depth
+        self._queue_depth = QUEUE_DEPTH.labels(model)
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="medgemma-inference")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._avg_service_time = 1.0  # seconds, exponentially weighted
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of admitted jobs that are queued or running"""
+        return self._pending
+
+    def retry_after(self) -> int:
+        """Estimate seconds until a slot frees up, for the Retry-After header"""
+        return max(1, math.ceil(self._avg_service_time * self._pending / self.workers))
+
+    def reserve(self, slots: int = 1):
+        """Claim admission slots; raises InferenceQueueFull when the queue is saturated"""
+        with self._lock:
+            if self._pending + slots > self.max_pending:
+                raise InferenceQueueFull(self._pending, self.retry_after())
+            self._pending += slots
+            self._queue_depth.set(self._pending)
+
+    def release(self, slots: int = 1):
+        """Return admission slots that will not be dispatched"""
+        with self._lock:
+            self._pending -= slots
+            self._queue_depth.set(self._pending)
+
+    async def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Admit a job into the bounded queue and await its result; raises InferenceQueueFull when saturated"""
+        self.reserve(1)
+        return await self.dispatch(1, fn, *args, **kwargs)
+
+    async def dispatch(self, slots: int, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a job that already holds `slots` reserved admissions, releasing them when it finishes"""
+        try:
+            future = self._pool.submit(self._timed, fn, *args, **kwargs)
+        except Exception:
+            self.release(slots)
+            raise
+
+        # Release the slots when the worker finishes, not when the caller stops waiting:
+        # a cancelled request still occupies the model until generate returns.
+        future.add_done_callback(lambda _: self.release(slots))
+        return await asyncio.wrap_future(future)
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Blocking submit for code already running on another thread (e.g. under asyncio.to_thread)"""
+        self.reserve(1)
+        try:
+            future = self._pool.submit(self._timed, fn, *args, **kwargs)
+        except Exception:
+            self.release(1)
+            raise
+        future.add_done_callback(lambda _: self.release(1))
+        return future.result()
+    
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a job on the inference thread without admission control (model load, warmup)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+
+    def _timed(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * elapsed
+
+    def shutdown(self):
+        """Stop accepting work and wait for the running job to finish"""
+        self._pool.shutdown(wait=True)
+        self._queue_depth.set(0)
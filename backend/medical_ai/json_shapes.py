@@ -0,0 +1,31 @@
+"""
+JSON Shapes for Leny Medical AI System
+Structure of a template's example JSON, kept free of torch so templates import cheaply
+"""
+from typing import Any, Dict, Tuple
+
+# Shapes mirror the example object in a PromptTemplates template:
+# ("string",), ("array", item_shape) or ("object", ((key, shape), ...))
+STRING_SHAPE = ("string",)
+
+def json_shape(example: Any) -> Tuple:
+    """Shape of an example JSON value; arrays take the shape of their first item"""
+    if isinstance(example, dict):
+        return ("object", tuple((key, json_shape(value)) for key, value in example.items()))
+    if isinstance(example, list):
+        return ("array", json_shape(example[0]) if example else STRING_SHAPE)
+    return STRING_SHAPE
+
+def json_schema(shape: Tuple) -> Dict[str, Any]:
+    """JSON Schema accepting exactly the values of `shape`, for engines that constrain decoding with schemas"""
+    if shape[0] == "object":
+        return {
+            "type": "object",
+            "properties": {key: json_schema(value) for key, value in shape[1]},
+            "required": [key for key, _ in shape[1]],
+            "additionalProperties": False
+        }
+    if shape[0] == "array":
+        # Constrained decoding always emits at least one item
+        return {"type": "array", "items": json_schema(shape[1]), "minItems": 1}
+    return {"type": "string"}
@@ -0,0 +1,106 @@
+"""
+llama.cpp Inference Backend for Leny Medical AI System
+Quantized GGUF MedGemma on CPU through llama-cpp-python
+"""
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from inference_executor import RequestControl, GenerationAborted
+from inference_backend import InferenceBackend, GenerationParams
+from json_shapes import json_schema
+from metrics import observe_generation, stage_timer
+
+class LlamaCppBackend(InferenceBackend):
+    """GGUF model on CPU; llama.cpp decodes one sequence at a time, so batch rows run back to back"""
+
+    name = "llamacpp"
+    supports_json = True
+
+    def __init__(self, config: "MedGemmaConfig"):
+        self.config = config
+        self.llm = None
+        self._grammars: Dict[Tuple, Any] = {}  # JSON shape -> compiled GBNF grammar
+        self.logger = logging.getLogger(__name__)
+
+    def load(self):
+        """Map the GGUF file; needs the llama-cpp-python package"""
+        from llama_cpp import Llama
+
+        if not self.config.gguf_model:
+            raise ValueError("MEDGEMMA_GGUF_MODEL must point to a .gguf file for the llamacpp backend")
+        self.logger.info(f"Loading GGUF model {self.config.gguf_model}...")
+        self.llm = Llama(
+            model_path=self.config.gguf_model,
+            n_ctx=self.config.gguf_context,
+            n_threads=self.config.cpu_threads(),
+            verbose=False
+        )
+        self.logger.info("GGUF model loaded successfully")
+
+    def count_tokens(self, text: str) -> int:
+        if self.llm is None:
+            return super().count_tokens(text)
+        return len(self.llm.tokenize(text.encode("utf-8"), add_bos=False))
+
+    def _completion_kwargs(self, params: GenerationParams) -> dict:
+        # Match transformers generate(): no repetition penalty, and greedy decoding when not sampling
+        return {
+            "max_tokens": params.max_new_tokens,
+            "temperature": params.temperature if params.do_sample else 0.0,
+            "top_p": params.top_p,
+            "top_k": 0 if params.do_sample else 1,
+            "repeat_penalty": 1.0
+        }
+
+    def stream(self, prompt: str, params: GenerationParams, on_text: Callable[[str], None],
+               control: Optional[RequestControl] = None, grammar: Any = None):
+        start = time.perf_counter()
+        first_token_at = None
+        tokens = 0
+        completion = self.llm.create_completion(prompt, stream=True, grammar=grammar, **self._completion_kwargs(params))
+        try:
+            # Each streamed chunk carries one sampled token
+            for chunk in completion:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                tokens += 1
+                text = chunk["choices"][0]["text"]
+                if text:
+                    on_text(text)
+                if control is not None and control.should_stop():
+                    raise GenerationAborted(control.reason)
+        finally:
+            completion.close()
+            end = time.perf_counter()
+            first_token_at = first_token_at or end
+            observe_generation(first_token_at - start, end - first_token_at, tokens)
+
+    def generate_json(self, prompt: str, shape: Tuple, params: GenerationParams,
+                      control: Optional[RequestControl] = None) -> Dict[str, Any]:
+        """Decode under a GBNF grammar compiled from the shape's JSON schema"""
+        grammar = self._grammars.get(shape)
+        if grammar is None:
+            from llama_cpp import LlamaGrammar
+            grammar = LlamaGrammar.from_json_schema(json.dumps(json_schema(shape)), verbose=False)
+            self._grammars[shape] = grammar
+
+        chunks: List[str] = []
+        self.stream(prompt, params, chunks.append, control, grammar=grammar)
+        # The grammar keeps the text valid, but max_tokens can still cut the object short
+        with stage_timer("decode_to_text"):
+            return json.loads("".join(chunks))
+
+    def batch_generate(self, prompts: List[str], params: GenerationParams,
+                       controls: Optional[List[Optional[RequestControl]]] = None) -> List[Any]:
+        outputs = []
+        for prompt, control in zip(prompts, controls or [None] * len(prompts)):
+            chunks: List[str] = []
+            try:
+                self.stream(prompt, params, chunks.append, control)
+            except GenerationAborted as e:
+                outputs.append(e)
+                continue
+            outputs.append("".join(chunks).strip())
+        return outputs
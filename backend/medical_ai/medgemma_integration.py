@@ -3,110 +3,222 @@ MedGemma 4B-IT Integration Module
 Handles both consumer (direct) and professional (RAG) modes
 """
 import os
+import time
 import asyncio
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple, AsyncIterator
 from enum import Enum
-from dataclasses import dataclass
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from dataclasses import dataclass, field
 import logging
 
-from models import UserType, QueryInput, FormattedResponse, MedicalSpecialty
+from models import UserType, QueryInput, FormattedResponse, MedicalSpecialty, ContextType
 from config import settings
+from inference_executor import InferenceExecutor, InferenceQueueFull, RequestControl, GenerationAborted
+from inference_backend import InferenceBackend, GenerationParams, create_backend
+from prompt_packing import PromptSegment, PromptPacker, PackedPrompt, template_segments
+from context_classifier import ContextClassifier
+from metrics import stage_timer, FALLBACKS, WARMUP_SECONDS
 
 class ResponseMode(str, Enum):
     CONSUMER = "consumer"  # Fast, direct MedGemma responses
     PROFESSIONAL = "professional"  # MedGemma + RAG with citations
 
+def _default_device() -> str:
+    """cuda when a GPU is visible; probing imports torch, so only the transformers backend does it"""
+    if settings.MEDGEMMA_BACKEND != "transformers":
+        return "cpu"
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
 @dataclass
 class MedGemmaConfig:
     model_name: str = "google/medgemma-4b-it"
     model_path: Optional[str] = None
-    device: str = "cuda" if torch.cuda.is_available() else "cpu"
+    device: str = field(default_factory=_default_device)
     max_tokens: int = 1024
+    consumer_max_tokens: int = settings.MEDGEMMA_CONSUMER_MAX_TOKENS
+    prompt_token_budget: int = settings.MEDGEMMA_PROMPT_TOKEN_BUDGET
     temperature: float = 0.1
     top_p: float = 0.95
+    batch_window_ms: float = settings.MEDGEMMA_BATCH_WINDOW_MS
+    max_batch_size: int = settings.MEDGEMMA_MAX_BATCH_SIZE
+    prefix_cache: bool = settings.MEDGEMMA_PREFIX_CACHE
+    quantization: str = settings.MEDGEMMA_QUANTIZATION
+    shared_weights: bool = settings.MEDGEMMA_SHARED_WEIGHTS
+    shared_weights_path: str = settings.MEDGEMMA_SHARED_WEIGHTS_PATH
+    torch_threads: int = settings.MEDGEMMA_TORCH_THREADS
+    draft_model: str = settings.MEDGEMMA_DRAFT_MODEL
+    draft_min_acceptance: float = settings.MEDGEMMA_DRAFT_MIN_ACCEPTANCE
+    draft_window_tokens: int = settings.MEDGEMMA_DRAFT_WINDOW_TOKENS
+    backend: str = settings.MEDGEMMA_BACKEND
+    gguf_model: str = settings.MEDGEMMA_GGUF_MODEL
+    gguf_context: int = settings.MEDGEMMA_GGUF_CONTEXT
+    fake_prefill_ms: float = settings.MEDGEMMA_FAKE_PREFILL_MS
+    fake_token_ms: float = settings.MEDGEMMA_FAKE_TOKEN_MS
+    fake_output_tokens: int = settings.MEDGEMMA_FAKE_OUTPUT_TOKENS
+    torch_compile: bool = settings.MEDGEMMA_TORCH_COMPILE
+    compile_cache_dir: str = settings.MEDGEMMA_COMPILE_CACHE_DIR
+    
+    def generation_params(self, mode: ResponseMode = ResponseMode.PROFESSIONAL) -> GenerationParams:
+        """Generation parameters for a response mode"""
+        max_tokens = self.consumer_max_tokens if mode == ResponseMode.CONSUMER else self.max_tokens
+        return GenerationParams(
+            max_new_tokens=max_tokens,
+            temperature=self.temperature,
+            top_p=self.top_p
+        )
+    
+    def cpu_threads(self) -> int:
+        """Threads for CPU inference: split the cores between workers instead of every worker using all of them"""
+        return self.torch_threads or max(1, (os.cpu_count() or 1) // max(1, settings.API_WORKERS))
+
+def static_prefix(template: str) -> str:
+    """Fixed instruction text of a prompt template, up to its first placeholder"""
+    return template.split("{", 1)[0]
+
+@dataclass
+class _PendingPrompt:
+    prompt: str
+    control: Optional[RequestControl]
+    future: asyncio.Future
+
+class MicroBatchScheduler:
+    """Gathers prompts arriving within a short window and runs one padded batched generate per parameter group"""
+    
+    def __init__(self, model: "MedGemmaModel", window_ms: float, max_batch_size: int):
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: Dict[GenerationParams, List[_PendingPrompt]] = {}
+        self._timers: Dict[GenerationParams, asyncio.TimerHandle] = {}
+        # The event loop only keeps weak references to tasks; running batches are held here
+        self._running: Set[asyncio.Task] = set()
+    
+    async def submit(self, prompt: str, params: GenerationParams, control: Optional[RequestControl] = None) -> str:
+        """Queue a prompt for the next batch with matching parameters and await its completion"""
+        # Admission is per prompt, so backpressure is unchanged by batching
+        self.model.executor.reserve(1)
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(params, [])
+        batch.append(_PendingPrompt(prompt, control, future))
+        
+        if len(batch) >= self.max_batch_size or self.window <= 0:
+            self._flush(params)
+        elif len(batch) == 1:
+            self._timers[params] = loop.call_later(self.window, self._flush, params)
+        
+        return await future
+    
+    def _flush(self, params: GenerationParams):
+        timer = self._timers.pop(params, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(params, [])
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(params, batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+    
+    async def _run_batch(self, params: GenerationParams, batch: List[_PendingPrompt]):
+        # Callers that gave up or ran out of time while waiting are dropped before generate
+        live = []
+        for item in batch:
+            if item.control and item.control.should_stop() and not item.future.done():
+                item.future.set_exception(GenerationAborted(item.control.reason))
+            elif not item.future.done():
+                live.append(item)
+        self.model.executor.release(len(batch) - len(live))
+        if not live:
+            return
+        
+        try:
+            outputs = await self.model.executor.dispatch(
+                len(live), self.model.backend.batch_generate,
+                [item.prompt for item in live], params, [item.control for item in live]
+            )
+        except Exception as e:
+            for item in live:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        
+        for item, output in zip(live, outputs):
+            if item.future.done():
+                continue
+            if isinstance(output, GenerationAborted):
+                item.future.set_exception(output)
+            else:
+                item.future.set_result(output)
 
 class MedGemmaModel:
-    """MedGemma 4B-IT model wrapper with optimized inference"""
+    """MedGemma model wrapper: admission, micro-batching and streaming over a pluggable inference backend"""
     
-    def __init__(self, config: MedGemmaConfig):
+    def __init__(self, config: MedGemmaConfig, backend: Optional[InferenceBackend] = None):
         self.config = config
-        self.model = None
-        self.tokenizer = None
+        self.backend = backend or create_backend(config)
+        self.packer = PromptPacker(self.backend.count_tokens, config.prompt_token_budget)
         self.is_loaded = False
         self.logger = logging.getLogger(__name__)
         
+        # Backend calls block, so they run on a dedicated inference thread
+        # MAX_CONCURRENT_REQUESTS bounds each loaded model's queue (small and large tiers, swaps)
+        self.executor = InferenceExecutor(max_pending=settings.MAX_CONCURRENT_REQUESTS, model=config.model_name)
+        self.scheduler = MicroBatchScheduler(self, config.batch_window_ms, config.max_batch_size)
+        
     async def load_model(self):
         """Load MedGemma model asynchronously"""
-        try:
-            self.logger.info("Loading MedGemma 4B-IT model...")
-            
-            # Load tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                self.config.model_name,
-                cache_dir=self.config.model_path
-            )
-            
-            # Load model
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.config.model_name,
-                cache_dir=self.config.model_path,
-                torch_dtype=torch.float16 if self.config.device == "cuda" else torch.float32,
-                device_map="auto" if self.config.device == "cuda" else None,
-                low_cpu_mem_usage=True
-            )
-            
-            if self.config.device == "cuda":
-                self.model = self.model.cuda()
-            
-            self.is_loaded = True
-            self.logger.info("MedGemma model loaded successfully")
-            
-        except Exception as e:
-            self.logger.error(f"Failed to load MedGemma model: {e}")
-            self.is_loaded = False
-            raise
+        await self.executor.run(self.backend.load)
+        self.is_loaded = True
+    
+    async def warm_prefixes(self, prefixes: List[str]):
+        """Let the backend precompute static template preambles so requests only prefill their own text"""
+        await self.executor.run(self.backend.warm_prefixes, prefixes)
     
-    async def generate_response(self, prompt: str) -> str:
-        """Generate response using MedGemma"""
+    async def generate_response(self, prompt: str, params: Optional[GenerationParams] = None,
+                                control: Optional[RequestControl] = None) -> str:
+        """Generate response using MedGemma; raises GenerationAborted if `control` stops it"""
         if not self.is_loaded:
             await self.load_model()
         
-        try:
-            # Tokenize input
-            inputs = self.tokenizer(
-                prompt,
-                return_tensors="pt",
-                truncation=True,
-                max_length=2048
-            )
-            
-            if self.config.device == "cuda":
-                inputs = {k: v.cuda() for k, v in inputs.items()}
-            
-            # Generate response
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=self.config.max_tokens,
-                    temperature=self.config.temperature,
-                    top_p=self.config.top_p,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.eos_token_id
-                )
-            
-            # Decode response
-            response = self.tokenizer.decode(
-                outputs[0][inputs['input_ids'].shape[1]:],
-                skip_special_tokens=True
-            )
-            
-            return response.strip()
-            
-        except Exception as e:
-            self.logger.error(f"Error generating MedGemma response: {e}")
-            raise
+        return await self.scheduler.submit(prompt, params or self.config.generation_params(), control)
+    
+    async def stream_response(self, prompt: str, params: Optional[GenerationParams] = None,
+                              control: Optional[RequestControl] = None) -> AsyncIterator[str]:
+        """Yield decoded text chunks as MedGemma generates them"""
+        if not self.is_loaded:
+            await self.load_model()
+        
+        # Streams bypass the batcher but still count against the admission queue
+        self.executor.reserve(1)
+        
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        def on_text(text: str):
+            loop.call_soon_threadsafe(queue.put_nowait, text)
+        
+        task = asyncio.ensure_future(self.executor.dispatch(
+            1, self.backend.stream, prompt, params or self.config.generation_params(), on_text, control
+        ))
+        # Guarantees the end sentinel even when generation raises before finishing the stream
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield chunk
+        
+        # Re-raises GenerationAborted when `control` stopped the stream
+        await task
+    
+    def generate_json_blocking(self, prompt: str, shape: Tuple, params: Optional[GenerationParams] = None,
+                               control: Optional[RequestControl] = None) -> Dict[str, Any]:
+        """Generate one JSON object of `shape`; for callers on worker threads (the legacy pipeline)"""
+        return self.executor.call(
+            self.backend.generate_json, prompt, shape, params or self.config.generation_params(), control
+        )
 
 class MedGemmaConsumerMode:
     """Fast consumer responses using MedGemma alone"""
@@ -144,18 +256,51 @@ Provide a supportive response:"""
         else:
             return "general"
     
-    async def respond(self, query: str) -> str:
+    def static_prefixes(self) -> List[str]:
+        """Fixed preambles of the consumer templates, for prefix KV caching"""
+        return [static_prefix(template) for template in self.consumer_prompts.values()]
+    
+    def pack(self, template_type: str, query: str) -> PackedPrompt:
+        """Fill one consumer template, counting its tokens"""
+        return self.model.packer.pack(template_segments(
+            self.consumer_prompts[template_type], {"query": [PromptSegment("query", query, required=True)]}
+        ))
+    
+    def assemble(self, query: str) -> PackedPrompt:
+        """Fill the consumer template selected for this query, counting its tokens"""
+        with stage_timer("prompt_build"):
+            return self.pack(self._select_prompt_template(query), query)
+    
+    def build_prompt(self, query: str) -> str:
+        return self.assemble(query).text
+    
+    def _disclaimer_for(self, response: str) -> str:
+        """Standard disclaimer, unless the answer already tells the user to consult someone"""
+        if "consult" not in response.lower():
+            return "\n\n💙 Remember to consult with a healthcare provider for proper medical advice."
+        return ""
+    
+    async def respond(self, query: str, control: Optional[RequestControl] = None) -> str:
         """Generate fast consumer response"""
-        template_type = self._select_prompt_template(query)
-        prompt = self.consumer_prompts[template_type].format(query=query)
-        
-        response = await self.model.generate_response(prompt)
+        response = await self.model.generate_response(
+            self.build_prompt(query), self.model.config.generation_params(ResponseMode.CONSUMER), control
+        )
         
         # Add standard disclaimer
-        if "consult" not in response.lower():
-            response += "\n\n💙 Remember to consult with a healthcare provider for proper medical advice."
+        return response + self._disclaimer_for(response)
+    
+    async def stream(self, query: str, control: Optional[RequestControl] = None) -> AsyncIterator[str]:
+        """Stream a consumer response, closing with the standard disclaimer"""
+        chunks = []
+        async for chunk in self.model.stream_response(
+            self.build_prompt(query), self.model.config.generation_params(ResponseMode.CONSUMER), control
+        ):
+            chunks.append(chunk)
+            yield chunk
         
-        return response
+        disclaimer = self._disclaimer_for("".join(chunks))
+        if disclaimer:
+            yield disclaimer
 
 class MedGemmaProfessionalMode:
     """Professional responses using MedGemma + RAG with citations"""
@@ -209,20 +354,65 @@ Provide evidence-based treatment guidance:"""
         else:
             return "clinical_query"
     
-    async def respond(self, query: str, specialty: MedicalSpecialty) -> Dict[str, Any]:
-        """Generate professional response with RAG"""
-        # Get RAG context
-        rag_context = await self.rag.get_clinical_context(query, specialty)
+    async def retrieve(self, query: str, specialty: MedicalSpecialty) -> Dict[str, Any]:
+        """Fetch RAG context and citations for a query"""
+        with stage_timer("retrieval"):
+            return await self.rag.get_clinical_context(query, specialty)
+    
+    def static_prefixes(self) -> List[str]:
+        """Fixed preambles of the professional templates, for prefix KV caching"""
+        return [static_prefix(template) for template in self.professional_prompts.values()]
+    
+    def _rag_segments(self, rag_context: Dict[str, Any]) -> List[PromptSegment]:
+        """
+        Retrieved evidence as packable segments: the first snippet, then the source list, then the rest
         
-        # Select prompt template
-        template_type = self._select_professional_template(query)
-        prompt = self.professional_prompts[template_type].format(
-            query=query,
-            rag_context=rag_context["content"]
-        )
+        Contexts without separate snippets (older callers) pack their content as a single snippet.
+        """
+        if "snippets" not in rag_context:
+            return [PromptSegment("rag_snippet", rag_context["content"])]
+        # Priorities: first snippet 0, sources 1, later snippets 2, 3, ...
+        segments = [
+            PromptSegment("rag_snippet", snippet if index == 0 else "\n\n" + snippet, priority=0 if index == 0 else index + 1)
+            for index, snippet in enumerate(rag_context["snippets"])
+        ]
+        if rag_context["sources"]:
+            text = "\n\n**Evidence Sources:**\n" + "".join(f"{source}\n" for source in rag_context["sources"])
+            segments.append(PromptSegment("citations", text, priority=1))
+        return segments
+    
+    def pack(self, template_type: str, query: str, rag_context: Dict[str, Any]) -> PackedPrompt:
+        """Fill one professional template, packing RAG context into the token budget"""
+        return self.model.packer.pack(template_segments(self.professional_prompts[template_type], {
+            "query": [PromptSegment("query", query, required=True)],
+            "rag_context": self._rag_segments(rag_context)
+        }))
+    
+    def assemble(self, query: str, rag_context: Dict[str, Any]) -> PackedPrompt:
+        """Fill the professional template selected for this query, packing RAG context into the token budget"""
+        with stage_timer("prompt_build"):
+            packed = self.pack(self._select_professional_template(query), query, rag_context)
+        if packed.dropped_tokens:
+            self.model.logger.info(f"Prompt packing dropped {packed.dropped_tokens} tokens ({packed.dropped})")
+        return packed
+    
+    def build_prompt(self, query: str, rag_context: Dict[str, Any]) -> str:
+        return self.assemble(query, rag_context).text
+    
+    async def respond(self, query: str, specialty: MedicalSpecialty,
+                      rag_context: Optional[Dict[str, Any]] = None,
+                      control: Optional[RequestControl] = None) -> Dict[str, Any]:
+        """Generate professional response with RAG, reusing rag_context when already retrieved"""
+        # Get RAG context
+        if rag_context is None:
+            rag_context = await self.retrieve(query, specialty)
         
         # Generate response
-        response = await self.model.generate_response(prompt)
+        response = await self.model.generate_response(
+            self.build_prompt(query, rag_context),
+            self.model.config.generation_params(ResponseMode.PROFESSIONAL),
+            control
+        )
         
         return {
             "content": response,
@@ -230,13 +420,24 @@ Provide evidence-based treatment guidance:"""
             "evidence_level": rag_context["evidence_level"],
             "specialty": specialty.value
         }
+    
+    async def stream(self, query: str, rag_context: Dict[str, Any],
+                     control: Optional[RequestControl] = None) -> AsyncIterator[str]:
+        """Stream a professional response for already-retrieved RAG context"""
+        async for chunk in self.model.stream_response(
+            self.build_prompt(query, rag_context),
+            self.model.config.generation_params(ResponseMode.PROFESSIONAL),
+            control
+        ):
+            yield chunk
 
 class MedGemmaIntegration:
     """Main MedGemma integration with dual-mode support"""
     
-    def __init__(self):
-        self.config = MedGemmaConfig()
+    def __init__(self, config: Optional[MedGemmaConfig] = None):
+        self.config = config or MedGemmaConfig()
         self.model = MedGemmaModel(self.config)
+        self.classifier = ContextClassifier()
         self.consumer_mode = None
         self.professional_mode = None
         self.rag_system = None
@@ -259,78 +460,215 @@ class MedGemmaIntegration:
             # Initialize professional mode
             self.professional_mode = MedGemmaProfessionalMode(self.model, self.rag_system)
             
+            # Prefill every template preamble once; requests then prefill only their own text
+            await self.model.warm_prefixes(
+                self.consumer_mode.static_prefixes() + self.professional_mode.static_prefixes()
+            )
+            
             self.logger.info("MedGemma integration initialized successfully")
             
         except Exception as e:
             self.logger.error(f"Failed to initialize MedGemma integration: {e}")
             raise
     
-    async def respond(self, query_input: QueryInput) -> FormattedResponse:
+    async def warmup(self, queries: List[str], max_new_tokens: int) -> Dict[str, float]:
+        """
+        Run every consumer and professional template once, then one full micro-batch
+        
+        The first calls pay for kernel selection, graph compilation and allocator growth;
+        doing them here keeps that cost off real requests. Returns seconds per step.
+        """
+        params = GenerationParams(max_new_tokens=max_new_tokens, temperature=self.config.temperature,
+                                  top_p=self.config.top_p)
+        timings: Dict[str, float] = {}
+        
+        async def timed(step: str, awaitable):
+            start = time.perf_counter()
+            result = await awaitable
+            timings[step] = time.perf_counter() - start
+            WARMUP_SECONDS.labels(step).set(timings[step])
+            return result
+        
+        prompts = []
+        for index, query in enumerate(queries):
+            # Retrieval and classification have their own first-call costs (index loading, embeddings)
+            specialty = self.classifier.classify(query).specialty
+            rag_context = await timed(f"retrieval/{index}", self.professional_mode.retrieve(query, specialty))
+            # Packed exactly as live requests are, so the primed prefixes are the ones traffic hits
+            prompts += [(f"consumer/{name}/{index}", self.consumer_mode.pack(name, query).text)
+                        for name in self.consumer_mode.consumer_prompts]
+            prompts += [(f"professional/{name}/{index}", self.professional_mode.pack(name, query, rag_context).text)
+                        for name in self.professional_mode.professional_prompts]
+        
+        # One at a time, as single-row calls take the prefix-cache path
+        for step, prompt in prompts:
+            await timed(step, self.model.generate_response(prompt, params))
+        
+        # Then concurrently, so the padded batch shapes are exercised too
+        batch = [prompt for _, prompt in prompts[:self.config.max_batch_size]]
+        await timed("batch", asyncio.gather(*[self.model.generate_response(prompt, params) for prompt in batch]))
+        
+        self.logger.info(f"Warmup finished: {len(prompts)} prompts in {sum(timings.values()):.1f}s")
+        return timings
+    
+    async def respond(self, query_input: QueryInput, control: Optional[RequestControl] = None) -> FormattedResponse:
         """Main response method with mode selection"""
         try:
             # Determine response mode based on user type
             if query_input.user_type == UserType.PROVIDER:
-                return await self._professional_response(query_input)
+                return await self._professional_response(query_input, control)
             else:
-                return await self._consumer_response(query_input)
+                return await self._consumer_response(query_input, control)
                 
+        except (InferenceQueueFull, GenerationAborted):
+            # Backpressure and deadlines are handled by the caller (503 / degraded answer)
+            raise
         except Exception as e:
             self.logger.error(f"Error in MedGemma response: {e}")
             return self._fallback_response(query_input, str(e))
     
-    async def _consumer_response(self, query_input: QueryInput) -> FormattedResponse:
-        """Fast consumer response using MedGemma alone"""
-        response_content = await self.consumer_mode.respond(query_input.text)
+    async def respond_many(self, query_inputs: List[QueryInput],
+                           control: Optional[RequestControl] = None) -> List[Any]:
+        """
+        Answer a batch of queries, sharing classification, retrieval and generation work
         
-        return FormattedResponse(
-            original_query=query_input.text,
-            user_type=query_input.user_type,
-            specialty=MedicalSpecialty.FAMILY_MEDICINE,
-            content=response_content,
-            metadata={
-                "response_mode": "consumer",
-                "model": "medgemma-4b-it",
-                "rag_used": False,
-                "response_time": "fast",
-                "citations_included": False
-            },
-            escalation_triggered=False
+        Returns one entry per input, in order: a FormattedResponse, or the exception
+        that prevented that single item from being answered.
+        """
+        # Classify every provider query in one pass
+        classified = {
+            index: self._classify(query_input)
+            for index, query_input in enumerate(query_inputs)
+            if query_input.user_type == UserType.PROVIDER
+        }
+        
+        # Retrieve RAG context once per distinct (topic, specialty) pair
+        contexts: Dict[Any, Dict[str, Any]] = {}
+        rag_by_index: Dict[int, Dict[str, Any]] = {}
+        for index, (_, specialty, _) in classified.items():
+            text = query_inputs[index].text
+            key = self.rag_system.context_key(text, specialty)
+            if key not in contexts:
+                contexts[key] = await self.professional_mode.retrieve(text, specialty)
+            rag_by_index[index] = contexts[key]
+        
+        # Feed generation in scheduler-sized waves so batches fill without flooding the admission queue
+        wave = asyncio.Semaphore(self.config.max_batch_size)
+        
+        async def answer(index: int, query_input: QueryInput) -> FormattedResponse:
+            async with wave:
+                try:
+                    if index not in classified:
+                        return await self._consumer_response(query_input, control)
+                    
+                    context_type, specialty, has_red_flags = classified[index]
+                    rag_context = rag_by_index[index]
+                    response_data = await self.professional_mode.respond(
+                        query_input.text, specialty, rag_context, control
+                    )
+                    return self._build_professional_response(
+                        query_input, context_type, specialty, has_red_flags, response_data["content"],
+                        response_data["evidence_level"], response_data["citations"]
+                    )
+                except (InferenceQueueFull, GenerationAborted):
+                    raise
+                except Exception as e:
+                    self.logger.error(f"Error in MedGemma batch item {index}: {e}")
+                    return self._fallback_response(query_input, str(e))
+        
+        return await asyncio.gather(
+            *[answer(index, query_input) for index, query_input in enumerate(query_inputs)],
+            return_exceptions=True
         )
     
-    async def _professional_response(self, query_input: QueryInput) -> FormattedResponse:
-        """Professional response with MedGemma + RAG"""
-        from context_classifier import ContextClassifier
-        classifier = ContextClassifier()
-        
-        # Classify query for specialty routing
-        context_type, specialty = classifier.classify_query(query_input.text)
+    async def stream(self, query_input: QueryInput,
+                     control: Optional[RequestControl] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream token events, then a final 'done' event carrying the FormattedResponse"""
+        chunks = []
+        if query_input.user_type == UserType.PROVIDER:
+            context_type, specialty, has_red_flags = self._classify(query_input)
+            rag_context = await self.professional_mode.retrieve(query_input.text, specialty)
+            async for chunk in self.professional_mode.stream(query_input.text, rag_context, control):
+                chunks.append(chunk)
+                yield {"event": "token", "text": chunk}
+            response = self._build_professional_response(
+                query_input, context_type, specialty, has_red_flags, "".join(chunks).strip(),
+                rag_context["evidence_level"], rag_context["citations"]
+            )
+        else:
+            async for chunk in self.consumer_mode.stream(query_input.text, control):
+                chunks.append(chunk)
+                yield {"event": "token", "text": chunk}
+            response = self._build_consumer_response(query_input, "".join(chunks).strip())
         
-        # Check for red flags
-        has_red_flags = classifier.has_red_flags(query_input.text)
+        yield {"event": "done", "response": response}
+    
+    async def _consumer_response(self, query_input: QueryInput,
+                                 control: Optional[RequestControl] = None) -> FormattedResponse:
+        """Fast consumer response using MedGemma alone"""
+        response_content = await self.consumer_mode.respond(query_input.text, control)
+        return self._build_consumer_response(query_input, response_content)
+    
+    def _build_consumer_response(self, query_input: QueryInput, content: str) -> FormattedResponse:
+        with stage_timer("formatting"):
+            return FormattedResponse(
+                original_query=query_input.text,
+                user_type=query_input.user_type,
+                specialty=MedicalSpecialty.FAMILY_MEDICINE,
+                content=content,
+                metadata={
+                    "response_mode": "consumer",
+                    "model": self.config.model_name,
+                    "rag_used": False,
+                    "response_time": "fast",
+                    "citations_included": False
+                },
+                escalation_triggered=False
+            )
+    
+    def _classify(self, query_input: QueryInput) -> Tuple[ContextType, MedicalSpecialty, bool]:
+        """Specialty routing and red flags, reusing the request's classification when the engine already made it"""
+        classification = self.classifier.classify_input(query_input)
+        return classification.context_type, classification.specialty, classification.has_red_flags
+    
+    async def _professional_response(self, query_input: QueryInput,
+                                     control: Optional[RequestControl] = None) -> FormattedResponse:
+        """Professional response with MedGemma + RAG"""
+        context_type, specialty, has_red_flags = self._classify(query_input)
         
         # Generate professional response
-        response_data = await self.professional_mode.respond(query_input.text, specialty)
+        response_data = await self.professional_mode.respond(query_input.text, specialty, control=control)
         
-        return FormattedResponse(
-            original_query=query_input.text,
-            user_type=query_input.user_type,
-            specialty=specialty,
-            content=response_data["content"],
-            metadata={
-                "response_mode": "professional",
-                "model": "medgemma-4b-it",
-                "rag_used": True,
-                "context_type": context_type.value,
-                "evidence_level": response_data["evidence_level"],
-                "citations_included": True,
-                "red_flags": has_red_flags
-            },
-            escalation_triggered=has_red_flags,
-            sources=response_data["citations"]
+        return self._build_professional_response(
+            query_input, context_type, specialty, has_red_flags, response_data["content"],
+            response_data["evidence_level"], response_data["citations"]
         )
     
+    def _build_professional_response(self, query_input: QueryInput, context_type: ContextType,
+                                     specialty: MedicalSpecialty, has_red_flags: bool, content: str,
+                                     evidence_level: str, citations: List[str]) -> FormattedResponse:
+        with stage_timer("formatting"):
+            return FormattedResponse(
+                original_query=query_input.text,
+                user_type=query_input.user_type,
+                specialty=specialty,
+                content=content,
+                metadata={
+                    "response_mode": "professional",
+                    "model": self.config.model_name,
+                    "rag_used": True,
+                    "context_type": context_type.value,
+                    "evidence_level": evidence_level,
+                    "citations_included": True,
+                    "red_flags": has_red_flags
+                },
+                escalation_triggered=has_red_flags,
+                sources=citations
+            )
+    
     def _fallback_response(self, query_input: QueryInput, error: str) -> FormattedResponse:
         """Fallback response when MedGemma fails"""
+        FALLBACKS.labels("medgemma_error").inc()
         return FormattedResponse(
             original_query=query_input.text,
             user_type=query_input.user_type,
@@ -346,7 +684,6 @@ class MedGemmaIntegration:
 
 # Factory function for easy integration
 async def get_medgemma_ai():
-    """Factory function to get initialized MedGemma AI"""
-    medgemma_ai = MedGemmaIntegration()
-    await medgemma_ai.initialize()
-    return medgemma_ai
\ No newline at end of file
+    """Shared, initialized MedGemma AI for the active model; loaded once per process (see model_registry)"""
+    from model_registry import model_registry
+    return await model_registry.get()
\ No newline at end of file
@@ -160,6 +160,33 @@ class MedicalLiteratureDatabase:
         
         # Clinical content database
         self.clinical_content = self._build_clinical_content()
+        
+        # Query keywords that pull in specialty-specific literature
+        self.specialty_mappings = {
+            "chest pain": ["cardiology"],
+            "heart": ["cardiology"],
+            "cardiac": ["cardiology"],
+            "pharyngitis": ["infectious_disease", "family_medicine"],
+            "sore throat": ["infectious_disease", "family_medicine"],
+            "headache": ["neurology"],
+            "migraine": ["neurology"],
+            "fever": ["infectious_disease", "pediatrics", "family_medicine"],
+            "ankle": ["orthopedics"],
+            "joint": ["orthopedics", "rheumatology"],
+            "abdominal": ["gastroenterology"]
+        }
+        
+        # Every keyword whose presence in a query can change the retrieved context
+        self.topic_keywords = sorted(
+            {keyword for topic in self.literature_db for keyword in topic.replace('_', ' ').split()}
+            | {keyword for topic in self.clinical_content for keyword in topic.replace('_', ' ').split()}
+            | set(self.specialty_mappings)
+        )
+    
+    def topic_key(self, query: str) -> Tuple[str, ...]:
+        """Keywords present in a query; queries with equal keys retrieve identical context"""
+        query_lower = query.lower()
+        return tuple(keyword for keyword in self.topic_keywords if keyword in query_lower)
     
     def _build_clinical_content(self) -> Dict[str, str]:
         """Build clinical content database with evidence-based information"""
@@ -264,22 +291,8 @@ class MedicalLiteratureDatabase:
                 results.extend(citations)
         
         # Specialty-specific searches
-        specialty_mappings = {
-            "chest pain": ["cardiology"],
-            "heart": ["cardiology"],
-            "cardiac": ["cardiology"],
-            "pharyngitis": ["infectious_disease", "family_medicine"],
-            "sore throat": ["infectious_disease", "family_medicine"],
-            "headache": ["neurology"],
-            "migraine": ["neurology"],
-            "fever": ["infectious_disease", "pediatrics", "family_medicine"],
-            "ankle": ["orthopedics"],
-            "joint": ["orthopedics", "rheumatology"],
-            "abdominal": ["gastroenterology"]
-        }
-        
         specialty_value = specialty.value.lower()
-        for keyword, relevant_specialties in specialty_mappings.items():
+        for keyword, relevant_specialties in self.specialty_mappings.items():
             if keyword in query_lower and specialty_value in relevant_specialties:
                 topic_key = keyword.replace(' ', '_')
                 if topic_key in self.literature_db:
@@ -328,6 +341,10 @@ class MedicalRAGSystem:
         """Initialize the RAG system"""
         self.logger.info("Medical RAG system initialized")
     
+    def context_key(self, query: str, specialty: MedicalSpecialty) -> Tuple[Tuple[str, ...], MedicalSpecialty]:
+        """Cache key for get_clinical_context: (topic keywords, specialty)"""
+        return self.literature_db.topic_key(query), specialty
+    
     async def get_clinical_context(self, query: str, specialty: MedicalSpecialty) -> Dict[str, Any]:
         """Get clinical context with evidence and citations"""
         try:
@@ -350,6 +367,9 @@ class MedicalRAGSystem:
             
             return {
                 "content": context_content,
+                # The same context in pieces, so prompt packing can drop the least relevant ones
+                "snippets": [snippet for snippet in clinical_content.split("\n\n") if snippet.strip()],
+                "sources": [f"• {citation.title} ({citation.source} {citation.year})" for citation in citations],
                 "citations": [citation.format_citation() for citation in citations],
                 "evidence_level": evidence_level,
                 "specialty": specialty.value,
@@ -0,0 +1,130 @@
+"""
+Metrics for Leny Medical AI System
+Prometheus collectors for per-stage latency, fallback paths, caching and inference throughput
+"""
+import os
+from typing import Tuple
+
+from prometheus_client import (
+    REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+
+# Pipeline stages, in request order
+STAGES = (
+    "classification", "red_flag_scan", "retrieval", "prompt_build", "tokenization",
+    "prefill", "decode", "decode_to_text", "formatting"
+)
+
+STAGE_SECONDS = Histogram(
+    "leny_stage_duration_seconds", "Time spent in each pipeline stage", ["stage"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+FALLBACKS = Counter(
+    "leny_fallback_total", "Responses not produced by MedGemma, by path (legacy, medgemma_error, degraded)", ["path"]
+)
+
+CACHE_LOOKUPS = Counter(
+    "leny_cache_lookups_total", "Cache lookups by cache (exact, semantic, prefix) and result (hit, miss)",
+    ["cache", "result"]
+)
+
+QUEUE_DEPTH = Gauge(
+    "leny_inference_queue_depth", "Admitted inference jobs queued or running, per loaded model", ["model"],
+    multiprocess_mode="livesum"
+)
+
+GENERATED_TOKENS = Counter("leny_generated_tokens_total", "Tokens generated by MedGemma")
+
+DECODE_TOKENS_PER_SECOND = Histogram(
+    "leny_decode_tokens_per_second", "Decode throughput of each generate call (all rows of a batch), by mode",
+    ["mode"], buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+)
+
+PROMPT_DROPPED_TOKENS = Counter(
+    "leny_prompt_dropped_tokens_total", "Prompt tokens left out by token-budgeted packing, by segment kind", ["segment"]
+)
+
+WARMUP_SECONDS = Gauge(
+    "leny_warmup_seconds", "Duration of each startup warmup step", ["step"], multiprocess_mode="liveall"
+)
+
+SPECULATIVE_TOKENS = Counter(
+    "leny_speculative_draft_tokens_total", "Draft-model tokens proposed and accepted by MedGemma", ["result"]
+)
+
+SPECULATIVE_ACCEPTANCE = Gauge(
+    "leny_speculative_acceptance_rate", "Draft acceptance rate over the last evaluation window, per target model",
+    ["model"], multiprocess_mode="liveall"
+)
+
+SPECULATIVE_ENABLED = Gauge(
+    "leny_speculative_enabled", "1 while speculative decoding is active, per target model", ["model"],
+    multiprocess_mode="liveall"
+)
+
+MODEL_LOADS = Counter("leny_model_loads_total", "MedGemma model load attempts by result (success, failure)", ["result"])
+
+MODEL_SWAPS = Counter("leny_model_swaps_total", "Live MedGemma model swaps by result (success, failure)", ["result"])
+
+COALESCED_REQUESTS = Counter(
+    "leny_coalesced_requests_total",
+    "Requests that started a generation (leader) or joined an identical one in flight (follower)", ["role"]
+)
+
+MODEL_TIER_SECONDS = Histogram(
+    "leny_model_tier_request_seconds", "MedGemma time per request by model tier (small, large); counts give traffic share",
+    ["tier"], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+# Export every series from startup so rates and alerts never see a missing label
+for _path in ("legacy", "medgemma_error", "degraded"):
+    FALLBACKS.labels(_path)
+for _mode in ("standard", "speculative"):
+    DECODE_TOKENS_PER_SECOND.labels(_mode)
+for _segment in ("rag_snippet", "citations"):
+    PROMPT_DROPPED_TOKENS.labels(_segment)
+for _result in ("proposed", "accepted"):
+    SPECULATIVE_TOKENS.labels(_result)
+for _result in ("success", "failure"):
+    MODEL_LOADS.labels(_result)
+    MODEL_SWAPS.labels(_result)
+for _role in ("leader", "follower"):
+    COALESCED_REQUESTS.labels(_role)
+for _tier in ("small", "large"):
+    MODEL_TIER_SECONDS.labels(_tier)
+for _cache in ("exact", "semantic", "prefix"):
+    for _result in ("hit", "miss"):
+        CACHE_LOOKUPS.labels(_cache, _result)
+
+# Label lookups cost a dict access and a lock; bind the stage children once
+_stage_observers = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+
+def stage_timer(stage: str):
+    """Context manager that records the wrapped block as one observation of `stage`"""
+    return _stage_observers[stage].time()
+
+def observe_stage(stage: str, seconds: float):
+    _stage_observers[stage].observe(seconds)
+
+def observe_tier(tier: str, seconds: float, requests: int = 1):
+    """Record `requests` requests answered by model `tier`; a batch shares one duration"""
+    for _ in range(requests):
+        MODEL_TIER_SECONDS.labels(tier).observe(seconds)
+
+def observe_generation(prefill_seconds: float, decode_seconds: float, tokens: int, mode: str = "standard"):
+    """Record one generate call: prefill and decode latency, tokens produced and decode throughput"""
+    observe_stage("prefill", prefill_seconds)
+    observe_stage("decode", decode_seconds)
+    GENERATED_TOKENS.inc(tokens)
+    if decode_seconds > 0:
+        DECODE_TOKENS_PER_SECOND.labels(mode).observe(tokens / decode_seconds)
+
+def render() -> Tuple[bytes, str]:
+    """Exposition payload and content type; aggregates all workers when PROMETHEUS_MULTIPROC_DIR is set"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
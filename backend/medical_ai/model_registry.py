@@ -0,0 +1,171 @@
+"""
+Model Registry for Leny Medical AI System
+Process-wide MedGemma instances: each model loads once, is shared by every engine and can be swapped live
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional, Set
+import logging
+
+from config import settings
+from medgemma_integration import MedGemmaIntegration, MedGemmaConfig
+from metrics import MODEL_LOADS, MODEL_SWAPS
+
+class ModelUnavailable(Exception):
+    """A model failed to load and is inside its retry backoff window"""
+
+    def __init__(self, model_name: str, retry_in: float, error: Optional[BaseException] = None):
+        self.model_name = model_name
+        self.retry_in = retry_in
+        self.error = error
+        super().__init__(f"MedGemma model {model_name} unavailable ({error}); next load attempt in {retry_in:.1f}s")
+
+@dataclass
+class _RegistryEntry:
+    instance: Optional[MedGemmaIntegration] = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    failures: int = 0
+    retry_at: float = 0.0  # time.monotonic() before which loads are not attempted
+    last_error: Optional[BaseException] = None
+
+class ModelRegistry:
+    """
+    Loaded MedGemma integrations keyed by model name, plus which one is active
+
+    Loads are single-flight: concurrent callers for the same model wait on one load
+    instead of starting their own. A failed load is not retried until an exponential
+    backoff expires; callers in between get ModelUnavailable immediately. Requests take
+    a lease() for as long as they use an instance, so a swap releases the old model
+    only after every request holding it has finished.
+    """
+
+    def __init__(self, active_model: str = settings.PRIMARY_MODEL,
+                 retry_seconds: float = settings.MODEL_LOAD_RETRY_SECONDS,
+                 max_retry_seconds: float = settings.MODEL_LOAD_MAX_RETRY_SECONDS):
+        self.active_model = active_model
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.swapping_to: Optional[str] = None
+        self._entries: Dict[str, _RegistryEntry] = {}
+        # Instance -> requests currently using it (see lease)
+        self._leases: Dict[MedGemmaIntegration, int] = {}
+        # The event loop only keeps weak references to tasks; models being released are held here
+        self._retiring: Set[asyncio.Task] = set()
+        self.logger = logging.getLogger(__name__)
+
+    def current(self, model_name: Optional[str] = None) -> Optional[MedGemmaIntegration]:
+        """Integration for `model_name` (default: the active model) if it has loaded, without waiting or loading"""
+        entry = self._entries.get(model_name or self.active_model)
+        return entry.instance if entry else None
+
+    async def get(self, model_name: Optional[str] = None) -> MedGemmaIntegration:
+        """Loaded integration for `model_name` (default: the active model), loading it on first use"""
+        model_name = model_name or self.active_model
+        entry = self._entries.setdefault(model_name, _RegistryEntry())
+        if entry.instance is not None:
+            return entry.instance
+
+        async with entry.lock:
+            # Whoever held the lock may have finished the load (or failed it) meanwhile
+            if entry.instance is not None:
+                return entry.instance
+            retry_in = entry.retry_at - time.monotonic()
+            if retry_in > 0:
+                raise ModelUnavailable(model_name, retry_in, entry.last_error)
+
+            self.logger.info(f"Loading MedGemma model {model_name}...")
+            start = time.perf_counter()
+            instance = MedGemmaIntegration(MedGemmaConfig(model_name=model_name))
+            try:
+                await instance.initialize()
+            except Exception as e:
+                entry.failures += 1
+                entry.last_error = e
+                backoff = min(self.max_retry_seconds, self.retry_seconds * 2 ** (entry.failures - 1))
+                entry.retry_at = time.monotonic() + backoff
+                MODEL_LOADS.labels("failure").inc()
+                self.logger.error(f"Failed to load MedGemma model {model_name} (attempt {entry.failures}): {e}; "
+                                  f"retrying in {backoff:.1f}s")
+                raise ModelUnavailable(model_name, backoff, e) from e
+
+            entry.instance = instance
+            entry.failures = 0
+            entry.last_error = None
+            MODEL_LOADS.labels("success").inc()
+            self.logger.info(f"MedGemma model {model_name} loaded in {time.perf_counter() - start:.1f}s")
+            return instance
+
+    @asynccontextmanager
+    async def lease(self, model_name: Optional[str] = None) -> AsyncIterator[MedGemmaIntegration]:
+        """get() for the duration of a request: the instance is not released until the lease ends"""
+        instance = await self.get(model_name)
+        # No await between get() and here, so a swap cannot retire the instance before it is leased
+        self._leases[instance] = self._leases.get(instance, 0) + 1
+        try:
+            yield instance
+        finally:
+            self._leases[instance] -= 1
+            if not self._leases[instance]:
+                del self._leases[instance]
+
+    async def swap(self, model_name: str) -> MedGemmaIntegration:
+        """
+        Load and warm up `model_name` next to the active model, then make it active
+
+        Requests keep using the old model until the switch, which is a single assignment on
+        the event loop; requests holding a lease on the old instance finish on it before it
+        is released.
+        """
+        if self.swapping_to is not None:
+            raise RuntimeError(f"A swap to {self.swapping_to} is already in progress")
+        self.swapping_to = model_name
+        try:
+            instance = await self.get(model_name)
+            if settings.MEDGEMMA_WARMUP:
+                await instance.warmup(settings.MEDGEMMA_WARMUP_QUERIES, settings.MEDGEMMA_WARMUP_MAX_TOKENS)
+        except Exception:
+            MODEL_SWAPS.labels("failure").inc()
+            raise
+        finally:
+            self.swapping_to = None
+
+        previous, self.active_model = self.active_model, model_name
+        MODEL_SWAPS.labels("success").inc()
+        self.logger.info(f"Active MedGemma model swapped from {previous} to {model_name}")
+        if previous != model_name:
+            retired = self._entries.pop(previous, None)
+            if retired and retired.instance:
+                task = asyncio.create_task(self._retire(previous, retired.instance))
+                self._retiring.add(task)
+                task.add_done_callback(self._retiring.discard)
+        return instance
+
+    async def _retire(self, model_name: str, instance: MedGemmaIntegration):
+        """Release a swapped-out model once every request leasing it has finished"""
+        while self._leases.get(instance):
+            await asyncio.sleep(0.1)
+        # Generation abandoned by cancelled requests still runs; shutdown waits for it
+        await asyncio.to_thread(instance.model.executor.shutdown)
+        self.logger.info(f"Released MedGemma model {model_name}")
+
+    def status(self) -> Dict[str, object]:
+        """Active model, swap in progress and per-model load state, for /health"""
+        return {
+            "active_model": self.active_model,
+            "swapping_to": self.swapping_to,
+            "models": {
+                name: {
+                    "loaded": entry.instance is not None,
+                    "failures": entry.failures,
+                    "retry_in_seconds": round(max(0.0, entry.retry_at - time.monotonic()), 1),
+                    "leases": self._leases.get(entry.instance, 0) if entry.instance else 0
+                }
+                for name, entry in self._entries.items()
+            },
+            "retiring": len(self._retiring)
+        }
+
+# Shared by every engine in the process
+model_registry = ModelRegistry()
@@ -0,0 +1,84 @@
+"""
+Model Routing for Leny Medical AI System
+Picks the small or large model tier for each query from configurable rules over classifier outputs
+"""
+from typing import Any, Dict, List, Optional
+import logging
+
+from models import QueryInput
+from context_classifier import ContextClassifier
+from config import settings
+
+# small: MODEL_ROUTING_SMALL_MODEL, for simple consumer questions; large: the active MedGemma model
+MODEL_TIERS = ("small", "large")
+
+# Conditions a rule may test; every condition in a rule must hold for it to match
+_RULE_CONDITIONS = ("user_type", "context_type", "specialty", "red_flags", "max_words")
+
+class ModelRouter:
+    """
+    First matching rule decides the tier; queries no rule matches get the default tier
+
+    A rule is a dict with a "tier" and any of: "user_type", "context_type" and "specialty"
+    (a value or list of values), "red_flags" (bool) and "max_words" (int). Without a small
+    model configured every query is routed to the large tier and nothing is classified.
+    """
+
+    def __init__(self, classifier: ContextClassifier,
+                 small_model: str = settings.MODEL_ROUTING_SMALL_MODEL,
+                 rules: Optional[List[Dict[str, Any]]] = None,
+                 default_tier: str = settings.MODEL_ROUTING_DEFAULT_TIER):
+        self.classifier = classifier
+        self.small_model = small_model
+        self.rules = [self._validate(rule) for rule in (settings.MODEL_ROUTING_RULES if rules is None else rules)]
+        if default_tier not in MODEL_TIERS:
+            raise ValueError(f"Unknown MODEL_ROUTING_DEFAULT_TIER '{default_tier}', expected one of {MODEL_TIERS}")
+        self.default_tier = default_tier
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.small_model)
+
+    @staticmethod
+    def _validate(rule: Dict[str, Any]) -> Dict[str, Any]:
+        if rule.get("tier") not in MODEL_TIERS:
+            raise ValueError(f"Unknown tier '{rule.get('tier')}' in routing rule {rule}, expected one of {MODEL_TIERS}")
+        unknown = set(rule) - set(_RULE_CONDITIONS) - {"tier"}
+        if unknown:
+            raise ValueError(f"Unknown condition(s) {sorted(unknown)} in routing rule {rule}, "
+                             f"expected any of {_RULE_CONDITIONS}")
+        # Single values and lists are both accepted for the enum conditions
+        return {
+            key: [value] if key in ("user_type", "context_type", "specialty") and isinstance(value, str) else value
+            for key, value in rule.items()
+        }
+
+    def route(self, query_input: QueryInput) -> str:
+        """Tier that should answer `query_input`"""
+        if not self.enabled:
+            return "large"
+
+        classification = self.classifier.classify_input(query_input)
+        facts = {
+            "user_type": query_input.user_type.value,
+            "context_type": classification.context_type.value,
+            "specialty": classification.specialty.value,
+            "red_flags": classification.has_red_flags,
+            "words": len(query_input.text.split())
+        }
+        for rule in self.rules:
+            if self._matches(rule, facts):
+                return rule["tier"]
+        return self.default_tier
+
+    @staticmethod
+    def _matches(rule: Dict[str, Any], facts: Dict[str, Any]) -> bool:
+        for key in ("user_type", "context_type", "specialty"):
+            if key in rule and facts[key] not in rule[key]:
+                return False
+        if "red_flags" in rule and facts["red_flags"] != rule["red_flags"]:
+            return False
+        if "max_words" in rule and facts["words"] > rule["max_words"]:
+            return False
+        return True
@@ -2,7 +2,7 @@
 Data models for Leny Medical AI System
 """
 from typing import List, Dict, Optional, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from enum import Enum
 
 class ContextType(str, Enum):
@@ -81,6 +81,10 @@ class QueryInput(BaseModel):
     user_type: UserType = UserType.PATIENT
     context_hint: Optional[ContextType] = None
     specialty_hint: Optional[MedicalSpecialty] = None
+    # ClassificationResult filled in by ContextClassifier.classify_input; never serialized
+    classification: Optional[Any] = Field(default=None, exclude=True)
+    # Sentence-encoder model name -> query embedding, filled in by query_embeddings.embed_query; never serialized
+    embeddings: Dict[str, Any] = Field(default_factory=dict, exclude=True)
 
 class Diagnosis(BaseModel):
     name: str
@@ -0,0 +1,74 @@
+"""
+Prompt Packing for Leny Medical AI System
+Assembles prompts from prioritized segments within a token budget instead of truncating the tail
+"""
+import functools
+from dataclasses import dataclass, field
+from string import Formatter
+from typing import Callable, Dict, List
+import logging
+
+from metrics import PROMPT_DROPPED_TOKENS
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PromptSegment:
+    """A piece of prompt text; required segments are always kept, the rest compete by priority (lower first)"""
+    kind: str
+    text: str
+    priority: int = 0
+    required: bool = False
+
+@dataclass
+class PackedPrompt:
+    text: str
+    tokens: int
+    dropped_tokens: int = 0
+    dropped: Dict[str, int] = field(default_factory=dict)  # kind -> segments dropped
+
+def template_segments(template: str, fields: Dict[str, List[PromptSegment]]) -> List[PromptSegment]:
+    """
+    Split a str.format template into required instruction segments around its placeholders
+
+    Each placeholder is replaced by the segments given for it in `fields`, so the system
+    prefix, the instructions and the closing cue ("Response:") can never be dropped.
+    """
+    segments = []
+    for literal, name, _, _ in Formatter().parse(template):
+        if literal:
+            segments.append(PromptSegment("instructions", literal, required=True))
+        if name is not None:
+            segments.extend(fields[name])
+    return segments
+
+class PromptPacker:
+    """Keeps every required segment, then adds optional ones in priority order while they fit the budget"""
+
+    def __init__(self, count_tokens: Callable[[str], int], budget: int):
+        # Template text and knowledge-base snippets repeat across requests, so counts are cached
+        self.count_tokens = functools.lru_cache(maxsize=4096)(count_tokens)
+        self.budget = budget
+
+    def pack(self, segments: List[PromptSegment]) -> PackedPrompt:
+        counts = [self.count_tokens(segment.text) for segment in segments]
+        used = sum(count for segment, count in zip(segments, counts) if segment.required)
+        if used > self.budget:
+            logger.warning(f"Required prompt segments need {used} tokens, over the {self.budget}-token budget")
+
+        keep = [segment.required for segment in segments]
+        optional = sorted((index for index, segment in enumerate(segments) if not segment.required),
+                          key=lambda index: segments[index].priority)
+        for index in optional:
+            if used + counts[index] <= self.budget:
+                keep[index] = True
+                used += counts[index]
+
+        # Kept segments stay in template order; only the selection depends on priority
+        packed = PackedPrompt(text="".join(segment.text for segment, kept in zip(segments, keep) if kept), tokens=used)
+        for segment, count, kept in zip(segments, counts, keep):
+            if not kept:
+                packed.dropped_tokens += count
+                packed.dropped[segment.kind] = packed.dropped.get(segment.kind, 0) + 1
+                PROMPT_DROPPED_TOKENS.labels(segment.kind).inc(count)
+        return packed
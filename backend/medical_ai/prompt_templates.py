@@ -2,8 +2,14 @@
 Prompt Templates for Leny Medical AI System
 Based on the conversation analysis and competitor response structure
 """
-from typing import Dict
+import json
+from typing import Dict, Tuple
 from models import ContextType, UserType
+from json_shapes import json_shape
+
+# Bump whenever a prompt template here or in medgemma_integration changes;
+# it is part of the response cache key, so old answers stop being served.
+TEMPLATE_VERSION = "1"
 
 class PromptTemplates:
     def __init__(self):
@@ -15,6 +21,18 @@ class PromptTemplates:
             ContextType.TREATMENT_PLAN: self._treatment_plan_template(),
             ContextType.TRIAGE: self._triage_template()
         }
+        # JSON shape each template asks for, used to constrain local decoding
+        self.json_shapes = {
+            context_type: self._example_shape(template)
+            for context_type, template in self.templates.items()
+        }
+
+    @staticmethod
+    def _example_shape(template: str) -> Tuple:
+        """Parse the example object embedded in a template (escaped braces) into a JSON shape"""
+        start, end = template.index("{{"), template.rindex("}}") + 2
+        example = template[start:end].replace("{{", "{").replace("}}", "}")
+        return json_shape(json.loads(example))
 
     def _symptom_template(self) -> str:
         return """You are a board-certified physician analyzing a patient's symptom. Use chain-of-thought reasoning and provide a structured clinical response.
@@ -243,6 +261,10 @@ Provide structured triage assessment in JSON format:
         """Get the appropriate template for a context type"""
         return self.templates.get(context_type, self.templates[ContextType.SYMPTOM])
 
+    def get_json_shape(self, context_type: ContextType) -> Tuple:
+        """JSON shape of the response requested by the template for a context type"""
+        return self.json_shapes.get(context_type, self.json_shapes[ContextType.SYMPTOM])
+
     def format_template(self, context_type: ContextType, query: str, rag_context: str = "") -> str:
         """Format template with query and RAG context"""
         template = self.get_template(context_type)
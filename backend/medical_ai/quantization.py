@@ -0,0 +1,48 @@
+"""
+Quantized CPU Inference for Leny Medical AI System
+int8 dynamic quantization and 4-bit weight-only loading for GPU-less nodes
+"""
+import logging
+
+import torch
+from transformers import AutoModelForCausalLM
+
+logger = logging.getLogger(__name__)
+
+# none: fp32 weights; int8: dynamic int8 Linear layers; int4: NF4 weight-only via bitsandbytes
+QUANTIZATION_MODES = ("none", "int8", "int4")
+
+def quantize_int8_dynamic(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Swap Linear layers for int8 dynamically quantized ones (weights int8, activations quantized per call)
+
+    The output head stays fp32: it is usually tied to the embeddings, so quantizing it
+    would add a copy instead of saving memory, and it is the layer most sensitive to rounding.
+    """
+    from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+
+    qconfig_spec = {
+        name: default_dynamic_qconfig
+        for name, module in model.named_modules()
+        if isinstance(module, torch.nn.Linear) and name != "lm_head"
+    }
+    logger.info(f"Quantizing {len(qconfig_spec)} Linear layers to int8")
+    return quantize_dynamic(model, qconfig_spec, dtype=torch.qint8, inplace=True)
+
+def load_int4_model(model_name: str, cache_dir: str) -> torch.nn.Module:
+    """Load with 4-bit NF4 weights (bf16 compute) on CPU; needs bitsandbytes with its CPU backend"""
+    from transformers import BitsAndBytesConfig
+
+    quantization_config = BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_use_double_quant=True,
+        bnb_4bit_compute_dtype=torch.bfloat16
+    )
+    return AutoModelForCausalLM.from_pretrained(
+        model_name,
+        cache_dir=cache_dir,
+        quantization_config=quantization_config,
+        device_map="cpu",
+        low_cpu_mem_usage=True
+    )
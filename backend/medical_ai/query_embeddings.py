@@ -0,0 +1,49 @@
+"""
+Query Embeddings for Leny Medical AI System
+One sentence encoder per model name for the whole process, and per-request reuse of query embeddings
+"""
+import threading
+from typing import Dict, List
+import logging
+
+import numpy as np
+
+from models import QueryInput
+
+class SentenceEncoder:
+    """A SentenceTransformer loaded on first use; encode() is safe to call from several threads"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Unit-norm float32 embeddings, one row per text"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self.logger.info(f"Loading sentence encoder {self.model_name}...")
+                    self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+_encoders: Dict[str, SentenceEncoder] = {}
+_encoders_lock = threading.Lock()
+
+def get_encoder(model_name: str) -> SentenceEncoder:
+    """The process-wide encoder for `model_name`, so components configured with the same model share its weights"""
+    with _encoders_lock:
+        encoder = _encoders.get(model_name)
+        if encoder is None:
+            encoder = _encoders[model_name] = SentenceEncoder(model_name)
+        return encoder
+
+def embed_query(query_input: QueryInput, model_name: str) -> np.ndarray:
+    """Embedding of a request's text under `model_name`, encoded once and kept on the QueryInput; blocking"""
+    embedding = query_input.embeddings.get(model_name)
+    if embedding is None:
+        embedding = get_encoder(model_name).encode([query_input.text])[0]
+        query_input.embeddings[model_name] = embedding
+    return embedding
@@ -0,0 +1,119 @@
+"""
+Red Flag Scanner for Leny Medical AI System
+Prebuilt phrase trie over every red-flag keyword: one pass over the text reports all matches with their category
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import RED_FLAG_KEYWORDS
+
+# Inflections accepted after a phrase, so "seizures" and "fractured" still match "seizure" and "fracture"
+_SUFFIXES = ("", "s", "es", "d", "ed")
+
+# Trie key marking that a phrase ends at this node; no phrase character is empty
+_END = ""
+
+@dataclass(frozen=True)
+class RedFlagMatch:
+    phrase: str
+    category: str
+    start: int  # Offsets into the scanned text
+    end: int
+
+def _is_word_char(ch: str) -> bool:
+    # Same characters as [\w'] in the compiled pattern
+    return ch.isalnum() or ch in "_'"
+
+def normalize(text: str) -> str:
+    """Lowercase and fold typographic apostrophes, so "can’t breathe" matches the "can't breathe" flag"""
+    return text.lower().replace("’", "'")
+
+def _trie_pattern(node: Dict[str, Any]) -> str:
+    """Regular expression accepting exactly the phrases below `node`, factored along the trie"""
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch != _END]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    return f"(?:{pattern})?" if _END in node else pattern
+
+class RedFlagScanner:
+    """
+    Multi-pattern matcher built once from RED_FLAG_KEYWORDS
+
+    The phrase trie is compiled into one regular expression, so the regex engine walks it
+    from each word start in a single pass over the text and reports the longest phrase
+    at each position; shorter phrases it begins with are checked from a prebuilt table. Phrases
+    only match on word boundaries: "coma" is found in "in a coma" but not in "glaucoma".
+    A short inflection (see _SUFFIXES) may follow a phrase.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]] = RED_FLAG_KEYWORDS):
+        # phrase -> categories listing it; a phrase may belong to several
+        categories: Dict[str, List[str]] = {}
+        for category, phrases in keywords.items():
+            for phrase in phrases:
+                categories.setdefault(normalize(phrase), []).append(category)
+        self.phrases: List[Tuple[str, Tuple[str, ...]]] = [
+            (phrase, tuple(cats)) for phrase, cats in categories.items()
+        ]
+
+        trie: Dict[str, Any] = {}
+        for phrase, _ in self.phrases:
+            node = trie
+            for ch in phrase:
+                node = node.setdefault(ch, {})
+            node[_END] = True
+
+        # Phrase -> itself and every shorter phrase it starts with ("fever with rash" -> "fever")
+        self._prefixes: Dict[str, List[Tuple[str, Tuple[str, ...]]]] = {
+            phrase: sorted(((other, cats) for other, cats in self.phrases if phrase.startswith(other)),
+                           key=lambda entry: len(entry[0]))
+            for phrase, _ in self.phrases
+        }
+
+        suffixes = "|".join(re.escape(suffix) for suffix in _SUFFIXES if suffix)
+        # The longest phrase starting at a word boundary, captured as "phrase"
+        self.pattern = r"(?<![\w'])(?P<phrase>" + _trie_pattern(trie) + f")(?:{suffixes})?" + r"(?![\w'])"
+        self._phrase_at = re.compile(self.pattern)
+        # Zero-width, so phrases starting inside another match (e.g. "shortness of breath"
+        # within "severe shortness of breath") are found too
+        self._starts = re.compile(f"(?={self.pattern})")
+
+    def scan(self, text: str) -> List[RedFlagMatch]:
+        """Every red-flag phrase in `text`, ordered by where it starts, shorter phrases first"""
+        text = normalize(text)
+        matches = []
+        for candidate in self._starts.finditer(text):
+            matches.extend(self._expand(text, candidate.start(), candidate.group("phrase")))
+        return matches
+
+    def match_at(self, text: str, start: int) -> List[RedFlagMatch]:
+        """Red-flag phrases starting exactly at `start` of already normalized `text`"""
+        candidate = self._phrase_at.match(text, start)
+        return self._expand(text, start, candidate.group("phrase")) if candidate else []
+
+    def _expand(self, text: str, start: int, longest: str) -> List[RedFlagMatch]:
+        """The longest phrase found at `start` and every shorter phrase it begins with that also ends a word"""
+        matches = []
+        for phrase, cats in self._prefixes[longest]:
+            end = self._word_end(text, start + len(phrase))
+            if end is not None:
+                matches.extend(RedFlagMatch(phrase, category, start, end) for category in cats)
+        return matches
+
+    @staticmethod
+    def _word_end(text: str, end: int) -> Optional[int]:
+        """End offset of the match including an allowed inflection, or None if a longer word continues"""
+        for suffix in _SUFFIXES:
+            stop = end + len(suffix)
+            if text.startswith(suffix, end) and (stop == len(text) or not _is_word_char(text[stop])):
+                return stop
+        return None
+
+    def categories(self, text: str) -> List[str]:
+        """Distinct categories flagged in `text`, in order of first match"""
+        return list(dict.fromkeys(match.category for match in self.scan(text)))
+
+# Built once at import; the scanner is read-only and safe to share across threads
+red_flag_scanner = RedFlagScanner()
@@ -0,0 +1,137 @@
+"""
+Request Coalescing for Leny Medical AI System
+Single-flight sharing of one in-flight generation between concurrent identical requests
+"""
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from config import settings
+from inference_executor import RequestControl, GenerationAborted
+from metrics import COALESCED_REQUESTS
+
+class _Flight:
+    """One in-flight generation: the events produced so far and how many requests follow it"""
+
+    def __init__(self, control: RequestControl):
+        self.control = control
+        self.events: List[Any] = []
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def wake(self):
+        """Wake every subscriber waiting for the next event"""
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+class RequestCoalescer:
+    """
+    Lets concurrent requests with the same key share one generation
+
+    The first request for a key starts `produce` under a control owned by the flight;
+    requests arriving while it runs replay the events produced so far, then follow live.
+    A request whose own control is cancelled (deadline, disconnect) detaches alone; the
+    shared generation is only cancelled once every request following it has gone, and its
+    deadline is extended to the latest deadline among them.
+    """
+
+    def __init__(self, enabled: bool = settings.REQUEST_COALESCING):
+        self.enabled = enabled
+        self.leaders = 0
+        self.followers = 0
+        self._flights: Dict[str, _Flight] = {}
+        # Flights leave _flights once cancelled but keep unwinding; the event loop only keeps
+        # weak references to tasks, so they are held here until they finish
+        self._running: Set[asyncio.Task] = set()
+
+    async def subscribe(self, key: str, control: RequestControl,
+                        produce: Callable[[RequestControl], AsyncIterator[Any]]) -> AsyncIterator[Tuple[Any, bool]]:
+        """
+        Yield (event, shared) for every event of the flight for `key`, starting one if none is running
+
+        `shared` is True for requests that joined another request's generation; they must copy
+        events before changing them. Raises the producer's exception, or GenerationAborted
+        when `control` stops this request.
+        """
+        if not self.enabled:
+            async for event in produce(control):
+                yield event, False
+            return
+
+        flight = self._flights.get(key)
+        # The flight runs until the latest deadline of the requests following it. One already
+        # stopped (its last follower left, or its deadline passed) is still unwinding: joining
+        # it would hand this request someone else's aborted answer
+        if flight is not None and not flight.control.extend(control.deadline):
+            flight = None
+        shared = flight is not None
+        if not shared:
+            # The flight outlives any one request, so it gets its own control, starting from this deadline
+            flight_control = RequestControl(timeout=None)
+            flight_control.deadline = control.deadline
+            flight = _Flight(flight_control)
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, produce))
+            self._running.add(flight.task)
+            flight.task.add_done_callback(self._running.discard)
+            self.leaders += 1
+        else:
+            self.followers += 1
+        COALESCED_REQUESTS.labels("follower" if shared else "leader").inc()
+
+        flight.subscribers += 1
+        loop = asyncio.get_running_loop()
+        control.add_cancel_callback(lambda _: loop.call_soon_threadsafe(flight.wake))
+        index = 0
+        try:
+            while True:
+                while index < len(flight.events):
+                    yield flight.events[index], shared
+                    index += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                if control.should_stop():
+                    raise GenerationAborted(control.reason)
+                try:
+                    # Bounded by this request's deadline, which nothing else would wake it for
+                    await asyncio.wait_for(flight.changed.wait(), control.remaining())
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.control.cancel(control.reason or "cancelled")
+                # Identical requests arriving while it unwinds start a fresh generation
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    async def _run(self, key: str, flight: _Flight, produce: Callable[[RequestControl], AsyncIterator[Any]]):
+        try:
+            async for event in produce(flight.control):
+                flight.events.append(event)
+                flight.wake()
+        except asyncio.CancelledError:
+            flight.error = GenerationAborted("cancelled")
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            # Later identical requests start a fresh generation (or hit the response cache)
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.wake()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.followers
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalescing_ratio": round(self.followers / total, 4) if total else 0.0
+        }
@@ -0,0 +1,115 @@
+"""
+Response Cache for Leny Medical AI System
+LRU cache of formatted responses with TTL expiry and a memory cap
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from models import QueryInput, FormattedResponse
+from config import settings
+from metrics import CACHE_LOOKUPS
+
+class ResponseCache:
+    """In-memory LRU response cache keyed on normalized query, audience, hints and model/template versions"""
+
+    def __init__(self, ttl: int = settings.RESPONSE_CACHE_TTL,
+                 max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes: int = settings.RESPONSE_CACHE_MAX_MB * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, int, FormattedResponse]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Case-fold, collapse whitespace and drop trailing punctuation"""
+        return re.sub(r"\s+", " ", text.lower()).strip().rstrip("?!. ")
+
+    def make_key(self, query_input: QueryInput, version: str) -> str:
+        """Stable key for a query; `version` identifies the model and prompt templates that produced it"""
+        parts = [
+            self.normalize(query_input.text),
+            query_input.user_type.value,
+            query_input.context_hint.value if query_input.context_hint else "",
+            query_input.specialty_hint.value if query_input.specialty_hint else "",
+            version
+        ]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[FormattedResponse]:
+        """Return a copy of a live entry, or None on miss/expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                CACHE_LOOKUPS.labels("exact", "miss").inc()
+                return None
+
+            expires_at, _, response = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                self.misses += 1
+                CACHE_LOOKUPS.labels("exact", "miss").inc()
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_LOOKUPS.labels("exact", "hit").inc()
+            # Callers annotate metadata, so never hand out the stored object
+            return response.model_copy(deep=True)
+
+    def put(self, key: str, response: FormattedResponse):
+        """Store a response, evicting least-recently-used entries past the entry or memory cap"""
+        if not self.enabled:
+            return
+
+        size = len(response.model_dump_json())
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, response.model_copy(deep=True))
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for health and metrics reporting"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
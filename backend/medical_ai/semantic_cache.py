@@ -0,0 +1,129 @@
+"""
+Semantic Response Cache for Leny Medical AI System
+Serves cached answers for near-duplicate phrasings using sentence embeddings
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+import logging
+
+import numpy as np
+
+from models import FormattedResponse, QueryInput
+from config import settings
+from query_embeddings import embed_query
+from metrics import CACHE_LOOKUPS
+
+@dataclass
+class SemanticProbe:
+    """Embedding of a looked-up query, kept so a miss can be stored without re-encoding"""
+    scope: Tuple[str, ...]
+    embedding: np.ndarray
+
+class _ScopeIndex:
+    """Fixed-capacity ring of unit-norm query embeddings and their responses"""
+
+    def __init__(self, capacity: int, dim: int):
+        self.embeddings = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.responses = [None] * capacity
+        self.next_slot = 0
+        self.size = 0
+
+    def nearest(self, embedding: np.ndarray, now: float) -> Tuple[int, float]:
+        """Index and cosine similarity of the closest live entry (one matrix-vector product)"""
+        similarities = self.embeddings[:self.size] @ embedding
+        similarities[self.expires_at[:self.size] <= now] = -1.0
+        best = int(np.argmax(similarities))
+        return best, float(similarities[best])
+
+    def add(self, embedding: np.ndarray, response: FormattedResponse, expires_at: float):
+        slot = self.next_slot
+        self.embeddings[slot] = embedding
+        self.expires_at[slot] = expires_at
+        self.responses[slot] = response
+        self.next_slot = (slot + 1) % len(self.responses)
+        self.size = min(self.size + 1, len(self.responses))
+
+class SemanticResponseCache:
+    """Nearest-neighbour cache over query embeddings, scoped by user type, specialty and model version"""
+
+    def __init__(self, model_name: str = settings.SEMANTIC_CACHE_MODEL,
+                 threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+                 max_entries_per_scope: int = settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                 ttl: int = settings.RESPONSE_CACHE_TTL,
+                 enabled: bool = settings.SEMANTIC_CACHE_ENABLED):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries_per_scope = max_entries_per_scope
+        self.ttl = ttl
+        self.enabled = enabled and ttl > 0
+        self._scopes: Dict[Tuple[str, ...], _ScopeIndex] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(__name__)
+
+    def lookup(self, scope: Tuple[str, ...],
+               query_input: QueryInput) -> Tuple[Optional[FormattedResponse], Optional[SemanticProbe]]:
+        """
+        Return (cached response or None, probe) for a query; blocking, run it off the event loop
+
+        The query embedding is shared with other components using the same encoder model (see
+        embed_query). The probe is None when the cache is unavailable, in which case nothing
+        should be stored.
+        """
+        if not self.enabled:
+            return None, None
+
+        try:
+            embedding = embed_query(query_input, self.model_name)
+        except Exception as e:
+            # A missing or broken encoder turns the layer off rather than failing requests
+            self.logger.warning(f"Semantic cache disabled, encoder unavailable: {e}")
+            self.enabled = False
+            return None, None
+
+        probe = SemanticProbe(scope=scope, embedding=embedding)
+        with self._lock:
+            index = self._scopes.get(scope)
+            if index is None or index.size == 0:
+                self.misses += 1
+                CACHE_LOOKUPS.labels("semantic", "miss").inc()
+                return None, probe
+
+            best, similarity = index.nearest(embedding, time.monotonic())
+            if similarity < self.threshold:
+                self.misses += 1
+                CACHE_LOOKUPS.labels("semantic", "miss").inc()
+                return None, probe
+
+            self.hits += 1
+            CACHE_LOOKUPS.labels("semantic", "hit").inc()
+            response = index.responses[best].model_copy(deep=True)
+
+        response.metadata["cache"] = "semantic_hit"
+        response.metadata["cache_similarity"] = round(similarity, 4)
+        return response, probe
+
+    def add(self, probe: SemanticProbe, response: FormattedResponse):
+        """Store a response under the probe's embedding, overwriting the oldest entry when full"""
+        with self._lock:
+            index = self._scopes.get(probe.scope)
+            if index is None:
+                index = _ScopeIndex(self.max_entries_per_scope, probe.embedding.shape[0])
+                self._scopes[probe.scope] = index
+            index.add(probe.embedding, response.model_copy(deep=True), time.monotonic() + self.ttl)
+
+    def stats(self):
+        """Counters for health and metrics reporting"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "scopes": len(self._scopes),
+            "entries": sum(index.size for index in self._scopes.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
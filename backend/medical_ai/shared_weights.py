@@ -0,0 +1,99 @@
+"""
+Shared Model Weights for Leny Medical AI System
+Memory-mapped MedGemma weights so multiple CPU workers share one physical copy
+"""
+import os
+import logging
+from typing import Dict, Optional
+
+# torch and transformers are imported inside the loaders: the API imports process_memory
+# at startup, and the lite profile never loads a model
+logger = logging.getLogger(__name__)
+
+WEIGHTS_FILE = "weights.pt"
+
+def export_shared_weights(model_name: str, cache_dir: str, path: str, dtype: Optional["torch.dtype"] = None) -> str:
+    """
+    Write the model's config and flat tensor file to `path` once, if not already present
+
+    Safe to call from several workers at once: the first one holds a file lock and
+    writes, the others wait and then find the finished export.
+    """
+    import fcntl
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    os.makedirs(path, exist_ok=True)
+    weights_path = os.path.join(path, WEIGHTS_FILE)
+
+    with open(os.path.join(path, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(weights_path):
+                return weights_path
+
+            logger.info(f"Exporting {model_name} weights for memory-mapped sharing to {path}")
+            model = AutoModelForCausalLM.from_pretrained(
+                model_name, cache_dir=cache_dir, torch_dtype=dtype or torch.float32, low_cpu_mem_usage=True
+            )
+            model.config.save_pretrained(path)
+            model.generation_config.save_pretrained(path)
+
+            # Parameters (tied ones once) plus buffers, so nothing is left to initialize on load
+            tensors: Dict[str, "torch.Tensor"] = {
+                name: tensor.detach().contiguous()
+                for name, tensor in list(model.named_parameters()) + list(model.named_buffers())
+            }
+            # Write then rename so a crashed export never looks complete
+            torch.save(tensors, weights_path + ".tmp")
+            os.replace(weights_path + ".tmp", weights_path)
+            del model, tensors
+            return weights_path
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def load_shared_model(path: str) -> "torch.nn.Module":
+    """
+    Build the model on the meta device and attach tensors memory-mapped from the export
+
+    The mapping is copy-on-write and inference never writes to the weights, so every
+    process loading the same file shares the page cache instead of holding its own copy.
+    """
+    import torch
+    from transformers import AutoConfig, AutoModelForCausalLM, GenerationConfig
+
+    config = AutoConfig.from_pretrained(path)
+    with torch.device("meta"):
+        model = AutoModelForCausalLM.from_config(config)
+
+    tensors = torch.load(os.path.join(path, WEIGHTS_FILE), mmap=True, weights_only=True)
+    for name, tensor in tensors.items():
+        module_name, _, attr = name.rpartition(".")
+        module = model.get_submodule(module_name)
+        if attr in module._parameters:
+            module._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)
+        else:
+            module._buffers[attr] = tensor
+
+    model.tie_weights()
+    try:
+        model.generation_config = GenerationConfig.from_pretrained(path)
+    except OSError:
+        pass
+    return model.eval()
+
+def process_memory() -> Dict[str, float]:
+    """Resident memory of this worker in MB; `shared_mb` includes the mapped weights"""
+    memory = {"pid": os.getpid()}
+    fields = {"Rss:": "rss_mb", "Pss:": "pss_mb", "Shared_Clean:": "shared_mb", "Private_Dirty:": "private_mb"}
+    try:
+        # smaps_rollup separates shared pages from what this worker uniquely owns
+        with open("/proc/self/smaps_rollup") as smaps:
+            for line in smaps:
+                parts = line.split()
+                if parts and parts[0] in fields:
+                    memory[fields[parts[0]]] = round(int(parts[1]) / 1024, 1)
+    except OSError:
+        import resource
+        memory["rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return memory
@@ -0,0 +1,127 @@
+"""
+Specialty Router for Leny Medical AI System
+Ranks every MedicalSpecialty for a query by embedding similarity to per-specialty keyword centroids
+"""
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import logging
+
+import numpy as np
+import yaml
+
+from models import MedicalSpecialty, QueryInput
+from config import settings
+from query_embeddings import embed_query, get_encoder
+
+KEYWORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_configs_expanded.yaml")
+
+# Softmax temperature turning centroid similarities into confidences; cosine gaps between
+# specialties are small, so a low temperature is needed to separate them
+_TEMPERATURE = 0.05
+
+@dataclass(frozen=True)
+class SpecialtyMatch:
+    specialty: MedicalSpecialty
+    similarity: float  # Cosine similarity between the query and the specialty centroid
+    confidence: float  # Softmax of the similarities over every specialty
+
+def specialty_phrases(configs: Dict[str, Dict]) -> Dict[MedicalSpecialty, List[str]]:
+    """
+    Phrases describing each specialty: its name, prioritize_keywords and add_tests conditions
+
+    Specialties without an agent config are described by their name alone.
+    """
+    phrases = {}
+    for specialty in MedicalSpecialty:
+        config = configs.get(specialty.value) or {}
+        phrases[specialty] = (
+            [specialty.value.replace("_", " ")]
+            + list(config.get("prioritize_keywords", []))
+            + [test["condition"] for test in config.get("add_tests", []) if "condition" in test]
+        )
+    return phrases
+
+class SpecialtyRouter:
+    """
+    One unit-norm centroid per specialty, built from specialty_phrases
+
+    Ranking a query embedding is one matrix-vector product over every specialty. The
+    encoder (shared with the semantic cache when both use the same model) and centroids
+    load on first use; a missing encoder turns the router off rather than failing requests.
+    """
+
+    def __init__(self, model_name: str = settings.SPECIALTY_ROUTER_MODEL,
+                 keywords_file: str = KEYWORDS_FILE,
+                 min_confidence: float = settings.SPECIALTY_ROUTER_MIN_CONFIDENCE,
+                 top_k: int = settings.SPECIALTY_ROUTER_TOP_K,
+                 enabled: bool = settings.SPECIALTY_ROUTER_ENABLED):
+        self.model_name = model_name
+        self.keywords_file = keywords_file
+        self.min_confidence = min_confidence
+        self.top_k = top_k
+        self.enabled = enabled
+        self.specialties: List[MedicalSpecialty] = list(MedicalSpecialty)
+        self.centroids: Optional[np.ndarray] = None  # specialties x embedding dim
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def load(self):
+        """Encode every specialty phrase once and average them into the centroid matrix"""
+        with self._lock:
+            if self.centroids is not None:
+                return
+            with open(self.keywords_file, "r") as file:
+                phrases = specialty_phrases(yaml.safe_load(file) or {})
+            texts = [text for specialty in self.specialties for text in phrases[specialty]]
+            embeddings = get_encoder(self.model_name).encode(texts)
+
+            centroids = np.zeros((len(self.specialties), embeddings.shape[1]), dtype=np.float32)
+            offset = 0
+            for row, specialty in enumerate(self.specialties):
+                count = len(phrases[specialty])
+                centroids[row] = embeddings[offset:offset + count].mean(axis=0)
+                offset += count
+            self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+            self.logger.info(f"Specialty router ready: {len(texts)} phrases over {len(self.specialties)} specialties")
+
+    def route(self, embedding: np.ndarray, top_k: Optional[int] = None) -> List[SpecialtyMatch]:
+        """Best specialties for a unit-norm query embedding, most likely first; needs load()"""
+        similarities = self.centroids @ embedding
+        weights = np.exp((similarities - similarities.max()) / _TEMPERATURE)
+        confidences = weights / weights.sum()
+        top_k = min(top_k or self.top_k, len(self.specialties))
+        best = np.argpartition(-similarities, top_k - 1)[:top_k]
+        best = best[np.argsort(-similarities[best])]
+        return [
+            SpecialtyMatch(self.specialties[row], float(similarities[row]), float(confidences[row]))
+            for row in best
+        ]
+
+    def route_query(self, query_input: QueryInput, top_k: Optional[int] = None) -> List[SpecialtyMatch]:
+        """
+        Rank specialties for a request, reusing its embedding if already encoded; blocking, run it off the event loop
+
+        Returns an empty list when the router is disabled or its encoder is unavailable.
+        """
+        if not self.enabled:
+            return []
+        try:
+            if self.centroids is None:
+                self.load()
+            embedding = embed_query(query_input, self.model_name)
+        except Exception as e:
+            self.logger.warning(f"Specialty router disabled, encoder unavailable: {e}")
+            self.enabled = False
+            return []
+        return self.route(embedding, top_k)
+
+    def stats(self):
+        """State for health reporting"""
+        return {
+            "enabled": self.enabled,
+            "loaded": self.centroids is not None,
+            "specialties": len(self.specialties),
+            "min_confidence": self.min_confidence
+        }
@@ -0,0 +1,102 @@
+"""
+Speculative Decoding for Leny Medical AI System
+Small draft model for assisted generation, with acceptance tracking and automatic shut-off
+"""
+from typing import Any, Dict, Optional
+import logging
+
+import torch
+from transformers import AutoModelForCausalLM
+
+from metrics import SPECULATIVE_TOKENS, SPECULATIVE_ACCEPTANCE, SPECULATIVE_ENABLED
+
+class SpeculativeDecoder:
+    """
+    Draft model that proposes tokens for the target model to verify in one forward pass
+
+    Acceptance is estimated from forward-pass counts: every target pass yields its accepted
+    draft tokens plus one token of its own, and every draft pass proposes one token. Once a
+    window of proposals is accepted less often than `min_acceptance`, drafting stops paying
+    for itself and the decoder disables itself.
+    """
+
+    def __init__(self, draft_model: torch.nn.Module, target_model: torch.nn.Module,
+                 min_acceptance: float, window_tokens: int, model_name: str = ""):
+        self.draft_model = draft_model
+        self.model_name = model_name
+        self.min_acceptance = min_acceptance
+        self.window_tokens = window_tokens
+        self.enabled = True
+        self._draft_passes = 0
+        self._target_passes = 0
+        self._window_proposed = 0
+        self._window_accepted = 0
+        self.logger = logging.getLogger(__name__)
+
+        draft_model.register_forward_hook(self._count_draft_pass)
+        target_model.register_forward_hook(self._count_target_pass)
+        # Labelled by target model: with several models loaded each has its own decoder
+        self._enabled_gauge = SPECULATIVE_ENABLED.labels(model_name)
+        self._acceptance_gauge = SPECULATIVE_ACCEPTANCE.labels(model_name)
+        self._enabled_gauge.set(1)
+
+    @classmethod
+    def load(cls, draft_name: str, cache_dir: Optional[str], target_model: torch.nn.Module, device: str,
+             min_acceptance: float, window_tokens: int, model_name: str = "") -> Optional["SpeculativeDecoder"]:
+        """Load a draft model from the target's tokenizer family; None if it cannot be used"""
+        draft_model = AutoModelForCausalLM.from_pretrained(
+            draft_name,
+            cache_dir=cache_dir,
+            torch_dtype=torch.float16 if device == "cuda" else torch.float32,
+            low_cpu_mem_usage=True
+        ).eval()
+        if device == "cuda":
+            draft_model = draft_model.cuda()
+
+        # Token ids are exchanged directly, so both models must share one vocabulary
+        draft_vocab = draft_model.get_output_embeddings().out_features
+        target_vocab = target_model.get_output_embeddings().out_features
+        if draft_vocab != target_vocab:
+            logging.getLogger(__name__).warning(
+                f"Draft model {draft_name} has vocabulary {draft_vocab}, target has {target_vocab}; "
+                f"speculative decoding disabled"
+            )
+            return None
+        return cls(draft_model, target_model, min_acceptance, window_tokens, model_name)
+
+    def _count_draft_pass(self, *args):
+        self._draft_passes += 1
+
+    def _count_target_pass(self, *args):
+        self._target_passes += 1
+
+    def generate_kwargs(self, batch_size: int) -> Dict[str, Any]:
+        """Extra generate() kwargs for a call; assisted generation only supports single rows"""
+        if not self.enabled or batch_size != 1:
+            return {}
+        self._draft_passes = 0
+        self._target_passes = 0
+        return {"assistant_model": self.draft_model}
+
+    def record(self, new_tokens: int):
+        """Account one assisted generate call that produced `new_tokens` tokens"""
+        proposed = self._draft_passes
+        accepted = max(0, min(proposed, new_tokens - self._target_passes))
+        SPECULATIVE_TOKENS.labels("proposed").inc(proposed)
+        SPECULATIVE_TOKENS.labels("accepted").inc(accepted)
+
+        self._window_proposed += proposed
+        self._window_accepted += accepted
+        if self._window_proposed < self.window_tokens:
+            return
+
+        acceptance = self._window_accepted / self._window_proposed
+        self._acceptance_gauge.set(acceptance)
+        self._window_proposed = 0
+        self._window_accepted = 0
+        if acceptance < self.min_acceptance:
+            self.enabled = False
+            self._enabled_gauge.set(0)
+            self.logger.warning(
+                f"Draft acceptance {acceptance:.2f} below {self.min_acceptance:.2f}, speculative decoding disabled"
+            )
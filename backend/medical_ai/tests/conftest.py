@@ -0,0 +1,15 @@
+"""
+Test configuration for Leny Medical AI System
+Puts the service modules on sys.path and runs MedGemma on the fake backend
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time, so these must be in place before any service module loads
+os.environ.setdefault("MEDGEMMA_BACKEND", "fake")
+os.environ.setdefault("MEDGEMMA_WARMUP", "false")
+os.environ.setdefault("MEDGEMMA_FAKE_PREFILL_MS", "1")
+os.environ.setdefault("MEDGEMMA_FAKE_TOKEN_MS", "0")
+os.environ.setdefault("RESPONSE_CACHE_TTL", "0")
@@ -0,0 +1,42 @@
+"""
+API regression tests for Leny Medical AI System
+/query must be answered by the MedGemma path under an ASGI server, and shed load with 503 when the queue is full
+"""
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from model_registry import model_registry
+
+@pytest.fixture(scope="module")
+def client():
+    # Entering the client runs the startup hooks, which load MedGemma in the background
+    with TestClient(api.app) as client:
+        deadline = time.monotonic() + 60
+        while client.get("/health/ready").status_code != 200:
+            assert time.monotonic() < deadline, "MedGemma did not become ready"
+            time.sleep(0.1)
+        yield client
+
+def test_query_uses_medgemma(client):
+    response = client.post("/query", json={"text": "my knee hurts when I climb stairs"})
+    assert response.status_code == 200
+    metadata = response.json()["metadata"]
+    assert "response_mode" in metadata
+    assert metadata.get("system") != "legacy"
+    assert metadata.get("model_tier") == "large"
+
+@pytest.mark.parametrize("path", ["/query", "/query/stream"])
+def test_full_queue_returns_503_with_retry_after(client, path):
+    executor = model_registry.current().model.executor
+    slots = executor.max_pending - executor.queue_depth
+    executor.reserve(slots)
+    try:
+        response = client.post(path, json={"text": f"my shoulder hurts when I lift my arm ({path})"})
+    finally:
+        executor.release(slots)
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.json()["queue_depth"] == executor.max_pending
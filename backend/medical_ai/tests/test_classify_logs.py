@@ -0,0 +1,30 @@
+"""
+Offline classification tests for Leny Medical AI System
+Batching and error records of the classify_logs JSONL CLI
+"""
+import io
+import json
+
+from classify_logs import classify_batch, read_batches
+from context_classifier import ContextClassifier
+
+def test_records_with_their_own_error_field_are_classified():
+    lines = io.StringIO("\n".join([
+        json.dumps({"text": "my knee hurts", "error": None}),
+        json.dumps("chest pain"),
+        "not json",
+        json.dumps({"query": "no text field"}),
+        "",
+        json.dumps({"text": "fever", "error": "upstream timeout"}),
+    ]))
+    batches = list(read_batches(lines, "text", batch_size=2))
+    assert [[number for number, _, _ in batch] for batch in batches] == [[1, 2], [3, 4], [6]]
+
+    classified = sum(classify_batch(ContextClassifier(), batch, "text") for batch in batches)
+    records = [record for batch in batches for _, record, _ in batch]
+    assert classified == 3
+    assert [("classification" in record) for record in records] == [True, True, False, False, True]
+    assert records[0]["error"] is None
+    assert records[1]["text"] == "chest pain"
+    assert records[2]["line"] == 3 and "error" in records[2]
+    assert records[4]["error"] == "upstream timeout"
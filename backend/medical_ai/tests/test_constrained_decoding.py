@@ -0,0 +1,124 @@
+"""
+Constrained decoding tests for Leny Medical AI System
+JsonShapeLogitsProcessor over a stub vocabulary: every template shape decodes to JSON of that shape
+"""
+import json
+import string
+
+import pytest
+import torch
+
+from constrained_decoding import JsonCompleteCriteria, JsonShapeLogitsProcessor, TokenTable
+from json_shapes import json_shape
+from prompt_templates import PromptTemplates
+
+EOS = "</s>"
+
+class StubTokenizer:
+    """Character-level vocabulary plus merged punctuation tokens, like a real BPE vocabulary has"""
+
+    def __init__(self):
+        merged = ['{"', '": "', '", "', '": [', '": {', '"]', '"}', '"],', '"},', '}]', '}}', ']}', ', ',
+                  ', "', ', {', ' the', 'ing', '"ab', 'ab"', '\\n', '\\"', '\n', '\t', 'é', '�']
+        self.vocab = [EOS] + list(string.printable[:95]) + merged
+        self.ids = {token: index for index, token in enumerate(self.vocab)}
+        self.eos_token_id = 0
+        self.all_special_ids = [0]
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def tokenize(self, text):
+        return list(text)
+
+    def convert_tokens_to_ids(self, tokens):
+        return [self.ids[token] for token in tokens]
+
+    def decode(self, ids, **kwargs):
+        return "".join(self.vocab[token] for token in ids)
+
+    def batch_decode(self, sequences, **kwargs):
+        return [self.decode(ids) for ids in sequences]
+
+SHAPES = {context_type.value: shape for context_type, shape in PromptTemplates().json_shapes.items()}
+SHAPES["nested_arrays"] = json_shape({"grid": [["a"]], "empty": {}})
+SHAPES["array"] = json_shape([{"name": "a"}])
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    return StubTokenizer()
+
+def make_table(tokenizer, **kwargs):
+    # A few extra ids past the tokenizer, like a model whose embedding matrix is padded
+    return TokenTable(tokenizer, len(tokenizer) + 3, **kwargs)
+
+def generate(table, shape, max_new_tokens=2000, rows=1, seed=0, **kwargs):
+    """Greedy decoding over random scores, so every allowed token is equally likely to be picked"""
+    processor = JsonShapeLogitsProcessor(table, shape, max_new_tokens, **kwargs)
+    complete = JsonCompleteCriteria(processor)
+    generator = torch.Generator().manual_seed(seed)
+    input_ids = torch.full((rows, 3), table.vocab_size - 1)
+    for _ in range(processor.max_new_tokens):
+        scores = processor(input_ids, torch.rand((rows, table.vocab_size), generator=generator))
+        input_ids = torch.cat([input_ids, scores.argmax(dim=1, keepdim=True)], dim=1)
+        if complete(input_ids, scores).all():
+            break
+    return processor, [processor.text(row) for row in range(rows)]
+
+def conforms(value, shape, max_items):
+    if shape[0] == "string":
+        return isinstance(value, str)
+    if shape[0] == "array":
+        return (isinstance(value, list) and 1 <= len(value) <= max_items
+                and all(conforms(item, shape[1], max_items) for item in value))
+    return (isinstance(value, dict) and list(value) == [key for key, _ in shape[1]]
+            and all(conforms(value[key], item, max_items) for key, item in shape[1]))
+
+@pytest.mark.parametrize("name", sorted(SHAPES))
+@pytest.mark.parametrize("seed", range(3))
+def test_every_shape_decodes_to_json_of_that_shape(tokenizer, name, seed):
+    table = make_table(tokenizer)
+    processor, texts = generate(table, SHAPES[name], rows=2, seed=seed, max_string_chars=40, max_items=3)
+    for row, text in enumerate(texts):
+        assert processor.complete(row)
+        value = json.loads(text)
+        assert conforms(value, SHAPES[name], max_items=3), text
+        assert text == json.dumps(value, ensure_ascii=False)
+        # The cap is checked before each token, so a string may run over by one token less a character
+        assert all(len(part) <= 40 + 3 for part in text.split('"')[1::2])
+
+@pytest.mark.parametrize("name", sorted(SHAPES))
+def test_small_budgets_force_the_shortest_completion(tokenizer, name):
+    table = make_table(tokenizer)
+    processor, (text,) = generate(table, SHAPES[name], max_new_tokens=1)
+    assert processor.max_new_tokens > 1
+    assert processor.complete(0)
+    assert conforms(json.loads(text), SHAPES[name], max_items=8)
+
+def test_finished_rows_only_allow_end_of_sequence(tokenizer):
+    table = make_table(tokenizer)
+    processor, _ = generate(table, SHAPES["array"], seed=1)
+    mask = processor._row_mask((), remaining=10)
+    assert mask.nonzero().flatten().tolist() == [tokenizer.eos_token_id]
+
+def test_tokens_that_cannot_be_validated_are_never_allowed(tokenizer):
+    table = make_table(tokenizer)
+    for token in ("\\n", '\\"', "\n", "\t", "�", EOS):
+        assert not table.string_safe[tokenizer.ids[token]]
+    assert table.texts[tokenizer.ids["�"]] is None
+    assert table.texts[tokenizer.eos_token_id] is None
+    assert table.string_safe[tokenizer.ids["é"]]
+
+def test_masks_are_cached_per_state(tokenizer):
+    table = make_table(tokenizer)
+    processor = JsonShapeLogitsProcessor(table, SHAPES["array"], 100)
+    first = table.mask_for(processor.initial, 600, 8)
+    assert table.mask_for(processor.initial, 600, 8) is first
+    assert first.nonzero().flatten().tolist() == [tokenizer.ids["["]]
+
+def test_mask_caches_stay_within_their_limit(tokenizer):
+    table = make_table(tokenizer, max_cached_masks=4)
+    for seed in range(3):
+        generate(table, SHAPES["symptom"], seed=seed, max_string_chars=20, max_items=3)
+        assert 0 < len(table._masks) <= 4
+        assert 0 < len(table._quote_masks) <= 4
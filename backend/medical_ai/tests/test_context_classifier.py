@@ -0,0 +1,74 @@
+"""
+Context classifier tests for Leny Medical AI System
+Single-pass scoring of ContextClassifier against per-pattern findall, and classify_many against classify
+"""
+import re
+
+import pytest
+
+from context_classifier import ContextClassifier
+from models import ContextType, MedicalSpecialty, QueryInput
+
+TEXTS = [
+    "my knee hurts and I have a fever",
+    "I was diagnosed with diabetes and I'm taking metformin, what are the side effects?",
+    "Should I go to the ER? Crushing chest pain and shortness of breath",
+    "my blood work showed high cholesterol, what should I do next",
+    "feeling dizzy and nauseous with a severe headache",
+    "I have glaucoma, is my vision going to get worse",
+    "MRI results came back normal but my back pain is worse",
+    "how to treat a sprained ankle",
+    "",
+    "hello",
+]
+
+@pytest.fixture(scope="module")
+def classifier():
+    return ContextClassifier()
+
+def findall_scores(patterns, text):
+    """Scores as every pattern scanning the text on its own with re.findall"""
+    text = text.lower()
+    return {label: sum(len(re.findall(pattern, text)) for pattern in label_patterns)
+            for label, label_patterns in patterns.items()}
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_scores_match_per_pattern_findall(classifier, text):
+    result = classifier.classify(text)
+    assert result.context_scores == findall_scores(classifier.patterns, text)
+    assert result.specialty_scores == findall_scores(classifier.specialty_patterns, text)
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_red_flags_match_the_scanner(classifier, text):
+    assert classifier.classify(text).red_flags == classifier.find_red_flags(text)
+
+def test_no_match_defaults(classifier):
+    result = classifier.classify("hello")
+    assert result.context_type == ContextType.SYMPTOM
+    assert result.specialty == MedicalSpecialty.INTERNAL_MEDICINE
+    assert not result.has_red_flags
+
+def test_winners(classifier):
+    result = classifier.classify("Should I go to the ER? Crushing chest pain and shortness of breath")
+    assert result.context_type == ContextType.TRIAGE
+    assert result.specialty == MedicalSpecialty.CARDIOLOGY
+    assert result.has_red_flags
+
+def test_classify_many_matches_classify(classifier):
+    texts = TEXTS + [text.upper() for text in TEXTS]
+    assert [result.to_dict() for result in classifier.classify_many(texts)] == \
+        [classifier.classify(text).to_dict() for text in texts]
+    assert [result.spans for result in classifier.classify_many(texts)] == \
+        [classifier.classify(text).spans for text in texts]
+
+def test_classify_many_shares_results_for_equal_texts(classifier):
+    first, second, other = classifier.classify_many(["My knee hurts", "my KNEE hurts", "chest pain"])
+    assert first is second
+    assert first is not other
+    assert classifier.classify_many([]) == []
+
+def test_classify_input_is_computed_once(classifier):
+    query_input = QueryInput(text="my knee hurts")
+    result = classifier.classify_input(query_input)
+    assert classifier.classify_input(query_input) is result
+    assert "classification" not in query_input.model_dump()
@@ -0,0 +1,90 @@
+"""
+Clinical reasoning engine tests for Leny Medical AI System
+Deadlines of coalesced queries and batch cache probes in ClinicalReasoningEngine
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+
+from core_engine import ClinicalReasoningEngine
+from inference_executor import GenerationAborted, RequestControl
+from models import FormattedResponse, MedicalSpecialty, QueryInput
+
+class SlowIntegration:
+    """Stands in for MedGemmaIntegration: answers after `delay` seconds unless its control stops first"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+
+    async def respond(self, query_input: QueryInput, control: RequestControl) -> FormattedResponse:
+        self.calls += 1
+        for _ in range(10):
+            await asyncio.sleep(self.delay / 10)
+            if control.should_stop():
+                raise GenerationAborted(control.reason)
+        return FormattedResponse(original_query=query_input.text, user_type=query_input.user_type,
+                                 specialty=MedicalSpecialty.ORTHOPEDICS, content="Rest and ice the knee",
+                                 metadata={"response_mode": "consumer"})
+
+@pytest.fixture
+def integration():
+    return SlowIntegration(delay=0.3)
+
+@pytest.fixture
+def engine(monkeypatch, integration):
+    engine = ClinicalReasoningEngine()
+    engine.semantic_cache.enabled = False
+
+    @asynccontextmanager
+    async def medgemma_for(query_input):
+        yield integration, "large"
+
+    monkeypatch.setattr(engine, "_medgemma_for", medgemma_for)
+    return engine
+
+def test_follower_with_time_left_gets_the_model_answer(engine, integration):
+    async def scenario():
+        leader = asyncio.create_task(engine.aprocess_query(QueryInput(text="my knee hurts"), RequestControl(timeout=0.1)))
+        await asyncio.sleep(0.01)
+        follower = await engine.aprocess_query(QueryInput(text="My knee hurts?"), RequestControl(timeout=5))
+        return await leader, follower
+
+    leader, follower = asyncio.run(scenario())
+    assert leader.metadata.get("degraded") is True
+    assert follower.content == "Rest and ice the knee"
+    assert follower.original_query == "My knee hurts?"
+    assert not follower.metadata.get("degraded")
+    assert integration.calls == 1
+
+def test_every_deadline_passing_degrades(engine):
+    response = asyncio.run(engine.aprocess_query(QueryInput(text="my knee hurts"), RequestControl(timeout=0.05)))
+    assert response.metadata["degraded_reason"] == "deadline_exceeded"
+
+def test_flight_ending_without_an_answer_degrades(engine, monkeypatch):
+    async def subscribe(key, control, produce):
+        return
+        yield
+
+    monkeypatch.setattr(engine.coalescer, "subscribe", subscribe)
+    response = asyncio.run(engine.aprocess_query(QueryInput(text="my knee hurts"), RequestControl(timeout=5)))
+    assert response.metadata["degraded"] is True
+    assert response.metadata["degraded_reason"] == "no_response"
+
+def test_batch_cache_lookups_run_concurrently(engine, monkeypatch):
+    def lookup(scope, query_input):
+        time.sleep(0.2)
+        return FormattedResponse(original_query=query_input.text, user_type=query_input.user_type,
+                                 specialty=MedicalSpecialty.ORTHOPEDICS, content="Rest and ice the knee",
+                                 metadata={"response_mode": "consumer"}), None
+
+    engine.semantic_cache.enabled = True
+    monkeypatch.setattr(engine, "_cache_key", lambda query_input: query_input.text)
+    monkeypatch.setattr(engine.semantic_cache, "lookup", lookup)
+    queries = [QueryInput(text=f"my knee hurts after run {index}") for index in range(4)]
+    start = time.perf_counter()
+    results = asyncio.run(engine.aprocess_batch(queries))
+    assert [result.original_query for result in results] == [query.text for query in queries]
+    assert time.perf_counter() - start < 0.6
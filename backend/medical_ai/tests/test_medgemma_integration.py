@@ -0,0 +1,118 @@
+"""
+MedGemma integration tests for Leny Medical AI System
+Deadlines, client disconnects and response metadata of MedGemma on the fake inference backend
+"""
+import asyncio
+import time
+
+import pytest
+
+from inference_backend import FakeBackend, GenerationParams
+from inference_executor import GenerationAborted, RequestControl
+from medgemma_integration import MedGemmaConfig, MedGemmaIntegration, MedGemmaModel
+from models import QueryInput, UserType
+
+PARAMS = GenerationParams(max_new_tokens=20, temperature=0.1, top_p=0.95)
+
+def make_model(token_ms: float = 10.0) -> MedGemmaModel:
+    config = MedGemmaConfig(model_name="test-medgemma", batch_window_ms=5, max_batch_size=4)
+    return MedGemmaModel(config, FakeBackend(prefill_ms=5, token_ms=token_ms, output_tokens=20))
+
+def test_deadline_stops_generation_and_frees_the_queue():
+    async def scenario():
+        model = make_model()
+        start = time.monotonic()
+        with pytest.raises(GenerationAborted) as aborted:
+            await model.generate_response("my knee hurts", PARAMS, RequestControl(timeout=0.05))
+        return model, aborted.value, time.monotonic() - start
+
+    model, aborted, elapsed = asyncio.run(scenario())
+    assert aborted.reason == "deadline_exceeded"
+    assert elapsed < 0.15  # 20 tokens at 10 ms would take 0.2 s
+    assert model.executor.queue_depth == 0
+
+def test_disconnect_stops_only_that_request():
+    async def scenario():
+        model = make_model()
+        gone, stays = RequestControl(timeout=None), RequestControl(timeout=None)
+        requests = [asyncio.ensure_future(model.generate_response(text, PARAMS, control))
+                    for text, control in (("my knee hurts", gone), ("my back hurts", stays))]
+        await asyncio.sleep(0.05)
+        gone.cancel("client_disconnected")
+        return await asyncio.gather(*requests, return_exceptions=True)
+
+    aborted, answer = asyncio.run(scenario())
+    assert isinstance(aborted, GenerationAborted) and aborted.reason == "client_disconnected"
+    assert isinstance(answer, str) and len(answer.split()) == 20
+
+def test_prompts_already_stopped_are_dropped_before_generate():
+    async def scenario():
+        model = make_model()
+        calls = []
+        batch_generate = model.backend.batch_generate
+        model.backend.batch_generate = lambda prompts, *args: calls.append(prompts) or batch_generate(prompts, *args)
+        control = RequestControl(timeout=None)
+        control.cancel("client_disconnected")
+        with pytest.raises(GenerationAborted):
+            await model.generate_response("my knee hurts", PARAMS, control)
+        return model, calls
+
+    model, calls = asyncio.run(scenario())
+    assert calls == []
+    assert model.executor.queue_depth == 0
+
+def test_disconnect_stops_a_stream():
+    async def scenario():
+        model = make_model()
+        control = RequestControl(timeout=None)
+        chunks = []
+        with pytest.raises(GenerationAborted) as aborted:
+            async for chunk in model.stream_response("my knee hurts", PARAMS, control):
+                chunks.append(chunk)
+                if len(chunks) == 3:
+                    control.cancel("client_disconnected")
+        return model, chunks, aborted.value
+
+    model, chunks, aborted = asyncio.run(scenario())
+    assert aborted.reason == "client_disconnected"
+    assert 3 <= len(chunks) < 20
+    assert model.executor.queue_depth == 0
+
+def test_finished_rows_keep_their_answer_past_their_deadline():
+    backend = FakeBackend(prefill_ms=0, token_ms=10, output_tokens=20)
+    words = backend._words
+    backend._words = lambda prompt, params: words(prompt, params)[:2] if prompt == "short" else words(prompt, params)
+    answers = backend.batch_generate(["short", "long"], PARAMS,
+                                     [RequestControl(timeout=0.05), RequestControl(timeout=None)])
+    assert answers[0] == " ".join(words("short", PARAMS)[:2])
+    assert len(answers[1].split()) == 20
+
+@pytest.mark.parametrize("user_type", [UserType.PATIENT, UserType.PROVIDER])
+def test_responses_name_the_model_that_answered(user_type):
+    async def scenario():
+        integration = MedGemmaIntegration(MedGemmaConfig(model_name="test-medgemma-small"))
+        await integration.initialize()
+        return await integration.respond(QueryInput(text="my knee hurts", user_type=user_type))
+
+    response = asyncio.run(scenario())
+    assert response.metadata["model"] == "test-medgemma-small"
+
+def test_warmup_primes_the_prompts_live_requests_send():
+    query = "What should I know about chest pain?"
+
+    async def scenario():
+        # A tight budget makes packing drop evidence, so unpacked prompts would differ
+        integration = MedGemmaIntegration(MedGemmaConfig(model_name="test-medgemma", prompt_token_budget=150))
+        await integration.initialize()
+        sent = []
+        generate_response = integration.model.generate_response
+        integration.model.generate_response = lambda prompt, *args: sent.append(prompt) or generate_response(prompt, *args)
+        await integration.warmup([query], max_new_tokens=4)
+        rag_context = await integration.professional_mode.retrieve(query, integration.classifier.classify(query).specialty)
+        packed = [integration.consumer_mode.pack(name, query).text for name in integration.consumer_mode.consumer_prompts]
+        packed += [integration.professional_mode.pack(name, query, rag_context).text
+                   for name in integration.professional_mode.professional_prompts]
+        return sent, packed
+
+    sent, packed = asyncio.run(scenario())
+    assert set(sent) == set(packed)
@@ -0,0 +1,119 @@
+"""
+Model registry tests for Leny Medical AI System
+Single-flight loads, failure backoff, leases and live swaps of ModelRegistry
+"""
+import asyncio
+
+import pytest
+
+from medgemma_integration import MedGemmaIntegration
+from model_registry import ModelRegistry, ModelUnavailable
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Model names initialize() was called for; models named "broken*" fail to load"""
+    calls = []
+    initialize = MedGemmaIntegration.initialize
+
+    async def counting(self):
+        calls.append(self.config.model_name)
+        await asyncio.sleep(0.01)
+        if self.config.model_name.startswith("broken"):
+            raise RuntimeError("no weights")
+        await initialize(self)
+
+    monkeypatch.setattr(MedGemmaIntegration, "initialize", counting)
+    return calls
+
+def test_concurrent_gets_share_one_load(loads):
+    async def scenario():
+        registry = ModelRegistry(active_model="medgemma-a")
+        instances = await asyncio.gather(*[registry.get() for _ in range(5)])
+        return registry, instances
+
+    registry, instances = asyncio.run(scenario())
+    assert loads == ["medgemma-a"]
+    assert len({id(instance) for instance in instances}) == 1
+    assert registry.current() is instances[0]
+
+def test_failed_loads_back_off_exponentially_up_to_the_cap(loads):
+    async def scenario():
+        registry = ModelRegistry(active_model="broken", retry_seconds=0.05, max_retry_seconds=0.15)
+        backoffs = []
+        for _ in range(4):
+            with pytest.raises(ModelUnavailable) as failure:
+                await registry.get()
+            backoffs.append(failure.value.retry_in)
+            # Inside the window: refused without another load attempt
+            attempts = len(loads)
+            with pytest.raises(ModelUnavailable) as refused:
+                await registry.get()
+            assert len(loads) == attempts
+            assert 0 < refused.value.retry_in <= failure.value.retry_in
+            assert isinstance(refused.value.error, RuntimeError)
+            await asyncio.sleep(failure.value.retry_in + 0.01)
+        return registry, backoffs
+
+    registry, backoffs = asyncio.run(scenario())
+    assert backoffs == pytest.approx([0.05, 0.1, 0.15, 0.15])
+    assert len(loads) == 4
+    assert registry.status()["models"]["broken"]["failures"] == 4
+
+def test_successful_load_resets_failures(loads):
+    async def scenario():
+        registry = ModelRegistry(active_model="medgemma-a", retry_seconds=0.05)
+        with pytest.raises(ModelUnavailable):
+            await registry.get("broken")
+        await registry.get()
+        return registry
+
+    status = asyncio.run(scenario()).status()["models"]
+    assert status["medgemma-a"] == {"loaded": True, "failures": 0, "retry_in_seconds": 0.0, "leases": 0}
+    assert status["broken"]["loaded"] is False
+
+def test_swap_activates_the_new_model_and_releases_the_old_one(loads):
+    async def scenario():
+        registry = ModelRegistry(active_model="medgemma-a")
+        old = await registry.get()
+        new = await registry.swap("medgemma-b")
+        await asyncio.gather(*registry._retiring)
+        return registry, old, new
+
+    registry, old, new = asyncio.run(scenario())
+    assert registry.active_model == "medgemma-b"
+    assert registry.current() is new and new is not old
+    assert registry.current("medgemma-a") is None
+    assert registry.swapping_to is None
+
+def test_swap_waits_for_requests_leasing_the_old_model(loads):
+    async def scenario():
+        registry = ModelRegistry(active_model="medgemma-a")
+        async with registry.lease() as old:
+            assert registry.status()["models"]["medgemma-a"]["leases"] == 1
+            new = await registry.swap("medgemma-b")
+            await asyncio.sleep(0.3)
+            # The request got its instance before the swap and has not reached the model yet
+            answer = await old.model.generate_response("my knee hurts")
+            assert registry.status()["retiring"] == 1
+        await asyncio.gather(*registry._retiring)
+        with pytest.raises(RuntimeError):
+            await old.model.generate_response("my knee hurts")
+        return registry, new, answer
+
+    registry, new, answer = asyncio.run(scenario())
+    assert answer
+    assert registry.current() is new
+    assert registry.status()["retiring"] == 0
+
+def test_failed_swap_keeps_the_active_model(loads):
+    async def scenario():
+        registry = ModelRegistry(active_model="medgemma-a")
+        old = await registry.get()
+        with pytest.raises(ModelUnavailable):
+            await registry.swap("broken")
+        return registry, old
+
+    registry, old = asyncio.run(scenario())
+    assert registry.active_model == "medgemma-a"
+    assert registry.current() is old
+    assert registry.swapping_to is None
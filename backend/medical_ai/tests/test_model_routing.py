@@ -0,0 +1,67 @@
+"""
+Model routing tests for Leny Medical AI System
+Rule matching, defaults and validation of ModelRouter
+"""
+import pytest
+
+from context_classifier import ContextClassifier
+from model_routing import ModelRouter
+from models import QueryInput, UserType
+
+RULES = [
+    {"tier": "large", "red_flags": True},
+    {"tier": "large", "user_type": "provider"},
+    {"tier": "small", "context_type": ["symptom", "treatment_plan"], "max_words": 8},
+    {"tier": "small", "specialty": "orthopedics"},
+]
+
+@pytest.fixture(scope="module")
+def classifier():
+    return ContextClassifier()
+
+def make_router(classifier, **kwargs):
+    kwargs.setdefault("small_model", "medgemma-small")
+    kwargs.setdefault("rules", RULES)
+    kwargs.setdefault("default_tier", "large")
+    return ModelRouter(classifier, **kwargs)
+
+def test_first_matching_rule_wins(classifier):
+    router = make_router(classifier)
+    assert router.route(QueryInput(text="my knee hurts")) == "small"
+    # Orthopedic and short, but the red flag rule comes first
+    assert router.route(QueryInput(text="my knee hurts after a seizure")) == "large"
+    assert router.route(QueryInput(text="my knee hurts", user_type=UserType.PROVIDER)) == "large"
+
+def test_every_condition_of_a_rule_must_hold(classifier):
+    router = make_router(classifier)
+    long_symptom = "my stomach hurts after every meal and it has been going on for weeks now"
+    assert router.route(QueryInput(text=long_symptom)) == "large"
+    assert router.route(QueryInput(text="my stomach hurts")) == "small"
+
+def test_unmatched_queries_get_the_default_tier(classifier):
+    router = make_router(classifier, rules=[], default_tier="small")
+    assert router.route(QueryInput(text="what is my cholesterol test result telling me")) == "small"
+
+def test_without_a_small_model_everything_is_large_and_unclassified(classifier):
+    router = make_router(classifier, small_model="", default_tier="small")
+    query_input = QueryInput(text="my knee hurts")
+    assert not router.enabled
+    assert router.route(query_input) == "large"
+    assert query_input.classification is None
+
+def test_routing_reuses_the_request_classification(classifier):
+    router = make_router(classifier)
+    query_input = QueryInput(text="my knee hurts")
+    router.route(query_input)
+    assert query_input.classification is not None
+    assert classifier.classify_input(query_input) is query_input.classification
+
+@pytest.mark.parametrize("rules, default_tier", [
+    ([{"tier": "medium"}], "large"),
+    ([{"red_flags": True}], "large"),
+    ([{"tier": "small", "age": 40}], "large"),
+    ([], "tiny"),
+])
+def test_invalid_configuration_is_rejected(classifier, rules, default_tier):
+    with pytest.raises(ValueError):
+        make_router(classifier, rules=rules, default_tier=default_tier)
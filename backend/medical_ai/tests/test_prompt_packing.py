@@ -0,0 +1,47 @@
+"""
+Prompt packing tests for Leny Medical AI System
+Budgeted segment selection of PromptPacker and template splitting
+"""
+from prompt_packing import PromptPacker, PromptSegment, template_segments
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+def test_required_segments_are_always_kept():
+    packer = PromptPacker(count_words, budget=3)
+    packed = packer.pack([PromptSegment("instructions", "one two three four ", required=True),
+                          PromptSegment("context", "five ")])
+    assert packed.text == "one two three four "
+    assert packed.tokens == 4
+    assert packed.dropped == {"context": 1}
+    assert packed.dropped_tokens == 1
+
+def test_optional_segments_fill_the_budget_by_priority_in_template_order():
+    packer = PromptPacker(count_words, budget=7)
+    packed = packer.pack([
+        PromptSegment("instructions", "answer this: ", required=True),
+        PromptSegment("context", "low priority snippet ", priority=2),
+        PromptSegment("context", "best snippet ", priority=0),
+        PromptSegment("history", "earlier turn ", priority=1),
+        PromptSegment("instructions", "Response:", required=True),
+    ])
+    assert packed.text == "answer this: best snippet earlier turn Response:"
+    assert packed.tokens == 7
+    assert packed.dropped == {"context": 1}
+    assert packed.dropped_tokens == 3
+
+def test_smaller_segments_still_fit_after_a_larger_one_is_dropped():
+    packer = PromptPacker(count_words, budget=3)
+    packed = packer.pack([PromptSegment("context", "a b c d", priority=0),
+                          PromptSegment("context", "e f", priority=1)])
+    assert packed.text == "e f"
+    assert packed.tokens == 2
+
+def test_template_segments_keep_literals_required():
+    segments = template_segments("Question: {query}\nResponse:",
+                                 {"query": [PromptSegment("query", "knee pain", required=True)]})
+    assert [(segment.kind, segment.text, segment.required) for segment in segments] == [
+        ("instructions", "Question: ", True),
+        ("query", "knee pain", True),
+        ("instructions", "\nResponse:", True),
+    ]
@@ -0,0 +1,52 @@
+"""
+Red flag scanner tests for Leny Medical AI System
+Word-boundary matching, inflections and overlapping phrases of RedFlagScanner
+"""
+from red_flag_scanner import RedFlagMatch, RedFlagScanner
+
+KEYWORDS = {
+    "neurological": ["coma", "seizure", "severe headache"],
+    "respiratory": ["shortness of breath", "severe shortness of breath", "can't breathe"],
+    "infectious": ["fever", "fever with rash"],
+    "pediatric": ["fever"],
+}
+
+scanner = RedFlagScanner(KEYWORDS)
+
+def phrases(text: str):
+    return [(match.phrase, match.category) for match in scanner.scan(text)]
+
+def test_phrases_only_match_whole_words():
+    assert phrases("I have glaucoma") == []
+    assert phrases("comatose") == []
+    assert phrases("he is in a coma.") == [("coma", "neurological")]
+    assert phrases("Coma") == [("coma", "neurological")]
+
+def test_short_inflections_are_accepted():
+    assert phrases("she had two seizures") == [("seizure", "neurological")]
+    assert phrases("seizured") == [("seizure", "neurological")]
+    assert phrases("seizurex") == []
+
+def test_match_offsets_include_the_inflection():
+    assert scanner.scan("two seizures today") == [RedFlagMatch("seizure", "neurological", 4, 12)]
+
+def test_nested_and_overlapping_phrases_are_all_reported():
+    assert phrases("severe shortness of breath") == [
+        ("severe shortness of breath", "respiratory"),
+        ("shortness of breath", "respiratory"),
+    ]
+    assert phrases("fever with rash") == [
+        ("fever", "infectious"), ("fever", "pediatric"), ("fever with rash", "infectious"),
+    ]
+
+def test_longer_phrase_falls_back_to_its_prefix():
+    assert phrases("fever with rashes") == [
+        ("fever", "infectious"), ("fever", "pediatric"), ("fever with rash", "infectious"),
+    ]
+    assert phrases("fever with rashy skin") == [("fever", "infectious"), ("fever", "pediatric")]
+
+def test_typographic_apostrophes_are_folded():
+    assert phrases("I can’t breathe") == [("can't breathe", "respiratory")]
+
+def test_categories_are_distinct_in_order_of_first_match():
+    assert scanner.categories("severe headache and fever") == ["neurological", "infectious", "pediatric"]
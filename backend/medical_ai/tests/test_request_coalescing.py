@@ -0,0 +1,208 @@
+"""
+Request coalescing tests for Leny Medical AI System
+Sharing, detaching and cancellation of RequestCoalescer flights
+"""
+import asyncio
+import time
+
+import pytest
+
+from inference_executor import GenerationAborted, RequestControl, until_deadline
+from request_coalescing import RequestCoalescer
+
+class Producer:
+    """Yields `count` events `delay` seconds apart, counting how many generations it ran"""
+
+    def __init__(self, count: int = 5, delay: float = 0.05, error: Exception = None):
+        self.count = count
+        self.delay = delay
+        self.error = error
+        self.started = 0
+        self.stopped = []
+
+    async def __call__(self, control: RequestControl):
+        self.started += 1
+        for index in range(self.count):
+            if control.should_stop():
+                self.stopped.append(control.reason)
+                raise GenerationAborted(control.reason)
+            await asyncio.sleep(self.delay)
+            yield index
+        if self.error is not None:
+            raise self.error
+
+async def consume(coalescer, control, produce, key="key"):
+    """(outcome, shared, events) of one request following the flight for `key`"""
+    events, shared = [], None
+    try:
+        async for event, shared in coalescer.subscribe(key, control, produce):
+            events.append(event)
+    except GenerationAborted as e:
+        return e.reason, shared, events
+    return "ok", shared, events
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_concurrent_identical_requests_share_one_generation():
+    async def scenario():
+        coalescer, produce = RequestCoalescer(enabled=True), Producer()
+        results = await asyncio.gather(*[consume(coalescer, RequestControl(timeout=None), produce) for _ in range(3)])
+        return coalescer, produce, results
+
+    coalescer, produce, results = run(scenario())
+    assert produce.started == 1
+    assert results == [("ok", False, [0, 1, 2, 3, 4])] + [("ok", True, [0, 1, 2, 3, 4])] * 2
+    assert coalescer.stats()["leaders"] == 1
+    assert coalescer.stats()["followers"] == 2
+    assert coalescer.stats()["in_flight"] == 0
+
+def test_late_follower_replays_earlier_events():
+    async def scenario():
+        coalescer, produce = RequestCoalescer(enabled=True), Producer()
+        leader = asyncio.create_task(consume(coalescer, RequestControl(timeout=None), produce))
+        await asyncio.sleep(0.12)
+        follower = await consume(coalescer, RequestControl(timeout=None), produce)
+        return produce, await leader, follower
+
+    produce, leader, follower = run(scenario())
+    assert produce.started == 1
+    assert leader == ("ok", False, [0, 1, 2, 3, 4])
+    assert follower == ("ok", True, [0, 1, 2, 3, 4])
+
+def test_disabled_coalescer_runs_every_request():
+    async def scenario():
+        coalescer, produce = RequestCoalescer(enabled=False), Producer(count=2, delay=0.01)
+        await asyncio.gather(*[consume(coalescer, RequestControl(timeout=None), produce) for _ in range(3)])
+        return produce
+
+    assert run(scenario()).started == 3
+
+def test_producer_errors_reach_every_subscriber():
+    async def scenario():
+        coalescer, produce = RequestCoalescer(enabled=True), Producer(count=1, delay=0.01, error=RuntimeError("boom"))
+
+        async def expect_error():
+            with pytest.raises(RuntimeError, match="boom"):
+                await consume(coalescer, RequestControl(timeout=None), produce)
+
+        await asyncio.gather(expect_error(), expect_error())
+        return produce
+
+    assert run(scenario()).started == 1
+
+def test_cancelled_follower_detaches_without_stopping_the_flight():
+    async def scenario():
+        coalescer, produce = RequestCoalescer(enabled=True), Producer()
+        leader = asyncio.create_task(consume(coalescer, RequestControl(timeout=None), produce))
+        control = RequestControl(timeout=None)
+        follower = asyncio.create_task(consume(coalescer, control, produce))
+        await asyncio.sleep(0.07)
+        control.cancel("client_disconnected")
+        return produce, await leader, await follower
+
+    produce, leader, follower = run(scenario())
+    assert leader == ("ok", False, [0, 1, 2, 3, 4])
+    assert follower[0] == "client_disconnected"
+    assert produce.stopped == []
+
+def test_last_subscriber_leaving_cancels_the_flight_and_new_requests_start_fresh():
+    async def scenario():
+        coalescer, produce = RequestCoalescer(enabled=True), Producer()
+        control = RequestControl(timeout=None)
+        leader = asyncio.create_task(consume(coalescer, control, produce))
+        await asyncio.sleep(0.07)
+        control.cancel("client_disconnected")
+        await asyncio.sleep(0.01)
+        fresh = await consume(coalescer, RequestControl(timeout=None), produce)
+        return coalescer, produce, await leader, fresh
+
+    coalescer, produce, leader, fresh = run(scenario())
+    assert leader[0] == "client_disconnected"
+    assert fresh == ("ok", False, [0, 1, 2, 3, 4])
+    assert produce.started == 2
+    assert produce.stopped == ["client_disconnected"]
+    assert coalescer.stats()["leaders"] == 2
+
+def test_expired_flight_is_not_joined_while_it_unwinds():
+    async def scenario():
+        coalescer, produce = RequestCoalescer(enabled=True), Producer(count=3, delay=0.2)
+        leader = asyncio.create_task(consume(coalescer, RequestControl(timeout=0.05), produce))
+        await asyncio.sleep(0.01)
+        # Block the loop past the deadline, so nothing has noticed it when the next request arrives
+        time.sleep(0.05)
+        fresh = await consume(coalescer, RequestControl(timeout=None), produce)
+        return produce, await leader, fresh
+
+    produce, leader, fresh = run(scenario())
+    assert leader[0] == "deadline_exceeded"
+    assert fresh == ("ok", False, [0, 1, 2])
+    assert produce.started == 2
+
+def test_follower_is_woken_at_its_own_deadline():
+    async def scenario():
+        coalescer, produce = RequestCoalescer(enabled=True), Producer(count=3, delay=0.3)
+        leader = asyncio.create_task(consume(coalescer, RequestControl(timeout=None), produce))
+        await asyncio.sleep(0.01)
+        start = time.monotonic()
+        follower = await consume(coalescer, RequestControl(timeout=0.1), produce)
+        return time.monotonic() - start, follower, await leader
+
+    waited, follower, leader = run(scenario())
+    assert follower[0] == "deadline_exceeded"
+    assert follower[2] == []
+    assert waited < 0.25
+    assert leader == ("ok", False, [0, 1, 2])
+
+def test_flight_runs_until_the_latest_follower_deadline():
+    async def scenario():
+        coalescer, produce = RequestCoalescer(enabled=True), Producer(count=3, delay=0.1)
+        leader = asyncio.create_task(consume(coalescer, RequestControl(timeout=0.05), produce))
+        await asyncio.sleep(0.01)
+        follower = await consume(coalescer, RequestControl(timeout=5), produce)
+        return produce, await leader, follower
+
+    produce, leader, follower = run(scenario())
+    assert leader[0] == "deadline_exceeded"
+    assert follower == ("ok", True, [0, 1, 2])
+    assert produce.started == 1
+    assert produce.stopped == []
+
+def test_extend_only_moves_the_deadline_later():
+    control = RequestControl(timeout=10)
+    deadline = control.deadline
+    assert control.extend(deadline - 5)
+    assert control.deadline == deadline
+    assert control.extend(deadline + 5)
+    assert control.deadline == deadline + 5
+    assert control.extend(None)
+    assert control.deadline is None
+    control.cancel("client_disconnected")
+    assert not control.extend(None)
+
+def test_expired_control_cannot_be_extended():
+    control = RequestControl(timeout=0.01)
+    time.sleep(0.02)
+    assert not control.extend(None)
+    assert control.should_stop()
+
+def test_until_deadline_follows_extensions():
+    async def scenario():
+        control = RequestControl(timeout=0.05)
+
+        async def extend_later():
+            await asyncio.sleep(0.02)
+            control.extend(control.deadline + 0.2)
+
+        async def slow():
+            await asyncio.sleep(0.1)
+            return "done"
+
+        extender = asyncio.create_task(extend_later())
+        result = await until_deadline(slow(), control)
+        await extender
+        with pytest.raises(asyncio.TimeoutError):
+            await until_deadline(asyncio.sleep(1), RequestControl(timeout=0.02))
+        return result
+
+    assert run(scenario()) == "done"
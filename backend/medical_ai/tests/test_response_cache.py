@@ -0,0 +1,65 @@
+"""
+Response cache tests for Leny Medical AI System
+Key normalization, TTL expiry and LRU eviction of ResponseCache
+"""
+import time
+
+from models import FormattedResponse, MedicalSpecialty, QueryInput, UserType
+from response_cache import ResponseCache
+
+def make_response(content: str = "Rest and ice the knee") -> FormattedResponse:
+    return FormattedResponse(original_query="knee pain", user_type=UserType.PATIENT,
+                             specialty=MedicalSpecialty.ORTHOPEDICS, content=content, metadata={})
+
+def test_key_ignores_case_whitespace_and_trailing_punctuation():
+    cache = ResponseCache(ttl=60, max_entries=10)
+    key = cache.make_key(QueryInput(text="Why does my  knee hurt?"), "v1")
+    assert cache.make_key(QueryInput(text="why does my knee hurt"), "v1") == key
+    assert cache.make_key(QueryInput(text="why does my knee hurt", user_type=UserType.PROVIDER), "v1") != key
+    assert cache.make_key(QueryInput(text="why does my knee hurt"), "v2") != key
+
+def test_get_returns_a_copy():
+    cache = ResponseCache(ttl=60, max_entries=10)
+    cache.put("key", make_response())
+    cache.get("key").metadata["cached"] = True
+    assert cache.get("key").metadata == {}
+    assert (cache.hits, cache.misses) == (2, 0)
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=60, max_entries=10)
+    cache.put("key", make_response())
+    now[0] += 59
+    assert cache.get("key") is not None
+    now[0] += 1
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(ttl=60, max_entries=2)
+    cache.put("a", make_response("a"))
+    cache.put("b", make_response("b"))
+    cache.get("a")
+    cache.put("c", make_response("c"))
+    assert cache.get("b") is None
+    assert cache.get("a").content == "a"
+    assert cache.get("c").content == "c"
+    assert cache.evictions == 1
+
+def test_byte_cap_evicts_and_skips_oversized_responses():
+    size = len(make_response("x" * 100).model_dump_json())
+    cache = ResponseCache(ttl=60, max_entries=10, max_bytes=size * 2)
+    cache.put("a", make_response("x" * 100))
+    cache.put("b", make_response("y" * 100))
+    cache.put("c", make_response("z" * 100))
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == size * 2
+    cache.put("huge", make_response("x" * size * 2))
+    assert cache.get("huge") is None
+
+def test_zero_ttl_disables_the_cache():
+    cache = ResponseCache(ttl=0, max_entries=10)
+    assert not cache.enabled
+    cache.put("key", make_response())
+    assert cache.get("key") is None
@@ -0,0 +1,66 @@
+"""
+Transformers backend tests for Leny Medical AI System
+Per-row deadline and cancellation checks of ControlStoppingCriteria
+"""
+from types import SimpleNamespace
+
+import torch
+
+from inference_executor import RequestControl
+from transformers_backend import ControlStoppingCriteria, TransformersBackend
+
+EOS = 2
+PAD = 0
+
+def step(criteria, rows):
+    return criteria(torch.tensor(rows), None).tolist()
+
+def test_cancelled_rows_stop_and_others_continue():
+    controls = [RequestControl(timeout=None), RequestControl(timeout=None), None]
+    criteria = ControlStoppingCriteria(controls, [EOS], prompt_length=2)
+    assert step(criteria, [[7, 8, 5], [7, 8, 6], [7, 8, 5]]) == [False, False, False]
+    controls[1].cancel("client_disconnected")
+    assert step(criteria, [[7, 8, 5, 5], [7, 8, 6, 6], [7, 8, 5, 5]]) == [False, True, False]
+    assert criteria.stopped == {1}
+
+def test_rows_past_their_deadline_stop():
+    controls = [RequestControl(timeout=0.000001)]
+    criteria = ControlStoppingCriteria(controls, [EOS], prompt_length=2)
+    assert step(criteria, [[7, 8, 5]]) == [True]
+    assert criteria.stopped == {0}
+    assert controls[0].reason == "deadline_exceeded"
+
+def test_finished_rows_are_never_marked_stopped():
+    controls = [RequestControl(timeout=None), RequestControl(timeout=None)]
+    criteria = ControlStoppingCriteria(controls, [EOS], prompt_length=2)
+    assert step(criteria, [[7, 8, EOS], [7, 8, 5]]) == [False, False]
+    # Row 0 answered; its request times out while row 1 keeps decoding
+    controls[0].cancel("deadline_exceeded")
+    assert step(criteria, [[7, 8, EOS, PAD], [7, 8, 5, 6]]) == [False, False]
+    assert step(criteria, [[7, 8, EOS, PAD, PAD], [7, 8, 5, 6, 6]]) == [False, False]
+    assert criteria.stopped == set()
+    assert criteria.finished == {0}
+
+def test_eos_inside_a_multi_token_step_finishes_the_row():
+    controls = [RequestControl(timeout=None)]
+    criteria = ControlStoppingCriteria(controls, [EOS, 3], prompt_length=2)
+    controls[0].cancel("deadline_exceeded")
+    # A draft model accepted three tokens at once, the end of sequence among them
+    assert step(criteria, [[7, 8, 5, 3, 6]]) == [False]
+    assert criteria.stopped == set()
+
+def test_eos_in_the_prompt_does_not_finish_the_row():
+    controls = [RequestControl(timeout=None)]
+    criteria = ControlStoppingCriteria(controls, [EOS], prompt_length=3)
+    controls[0].cancel("client_disconnected")
+    assert step(criteria, [[EOS, 7, 8, 5]]) == [True]
+
+def test_control_criteria_reads_every_eos_token():
+    backend = TransformersBackend.__new__(TransformersBackend)
+    backend.model = SimpleNamespace(generation_config=SimpleNamespace(eos_token_id=[1, 106]))
+    backend.tokenizer = SimpleNamespace(eos_token_id=1)
+    criteria = backend._control_criteria([None], {"input_ids": torch.zeros((1, 4), dtype=torch.long)})
+    assert criteria.eos_token_ids == [1, 106]
+
+    backend.model.generation_config.eos_token_id = None
+    assert backend._control_criteria([None], {"input_ids": torch.zeros((1, 4))}).eos_token_ids == [1]
@@ -0,0 +1,363 @@
+"""
+Transformers Inference Backend for Leny Medical AI System
+Hugging Face checkpoints with batching, prefix KV reuse, quantization, speculative and constrained decoding
+"""
+import os
+import copy
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+import logging
+
+import torch
+from transformers import (
+    AutoTokenizer, AutoModelForCausalLM, TextStreamer, StoppingCriteria, StoppingCriteriaList, LogitsProcessorList
+)
+
+from inference_executor import RequestControl, GenerationAborted
+from inference_backend import InferenceBackend, GenerationParams
+from constrained_decoding import TokenTable, JsonShapeLogitsProcessor, JsonCompleteCriteria
+from quantization import QUANTIZATION_MODES, quantize_int8_dynamic, load_int4_model
+from speculative_decoding import SpeculativeDecoder
+from metrics import stage_timer, observe_generation, CACHE_LOOKUPS
+
+@dataclass
+class _PrefixEntry:
+    """Token ids of a template's static preamble and the KV cache from prefilling them"""
+    input_ids: torch.LongTensor
+    past_key_values: Any
+
+class ControlStoppingCriteria(StoppingCriteria):
+    """
+    Stops each batch row once its request is cancelled or past its deadline
+
+    Rows that already produced an end-of-sequence token are finished: they keep padding
+    while longer rows decode, but their answer is complete and is never marked stopped.
+    """
+
+    def __init__(self, controls: List[Optional[RequestControl]], eos_token_ids: List[int], prompt_length: int):
+        self.controls = controls
+        self.eos_token_ids = eos_token_ids
+        self.stopped = set()
+        self.finished = set()
+        self._checked = prompt_length  # Tokens before this position were already checked for EOS
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        # A step may append several tokens (speculative decoding), so check all the new ones
+        if self.eos_token_ids:
+            new_tokens = input_ids[:, self._checked:]
+            eos = torch.isin(new_tokens, torch.tensor(self.eos_token_ids, device=input_ids.device)).any(dim=1)
+            self.finished.update(row for row, ended in enumerate(eos.tolist()) if ended)
+        self._checked = input_ids.shape[1]
+
+        flags = []
+        for row, control in enumerate(self.controls):
+            stop = row not in self.finished and control is not None and control.should_stop()
+            if stop:
+                self.stopped.add(row)
+            flags.append(stop)
+        return torch.tensor(flags, dtype=torch.bool, device=input_ids.device)
+
+class GenerationTimer(StoppingCriteria):
+    """Never stops generation; timestamps the first step to split prefill from decode"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_step_at: Optional[float] = None
+        self.steps = 0
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.first_step_at is None:
+            self.first_step_at = time.perf_counter()
+        self.steps += 1
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+    def record(self, tokens: int, speculative: bool = False):
+        """Publish prefill/decode latency and throughput for a finished generate call"""
+        end = time.perf_counter()
+        first_step_at = self.first_step_at or end
+        observe_generation(first_step_at - self.start, end - first_step_at, tokens,
+                           "speculative" if speculative else "standard")
+
+class CallbackStreamer(TextStreamer):
+    """Text streamer that hands each decoded chunk to a callback on the generation thread"""
+
+    def __init__(self, tokenizer, on_text: Callable[[str], None]):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.on_text = on_text
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.on_text(text)
+
+class TransformersBackend(InferenceBackend):
+    """MedGemma through transformers generate(), on GPU (fp16) or CPU (fp32, int8 or int4)"""
+
+    name = "transformers"
+    supports_json = True
+
+    def __init__(self, config: "MedGemmaConfig"):
+        self.config = config
+        self.model = None
+        self.tokenizer = None
+        self._counting_tokenizer = None
+        self.logger = logging.getLogger(__name__)
+        self.prefix_cache: Dict[str, _PrefixEntry] = {}
+        self._token_table: Optional[TokenTable] = None
+        self.speculative: Optional[SpeculativeDecoder] = None
+
+    def load(self):
+        """Load tokenizer and weights"""
+        try:
+            self.logger.info("Loading MedGemma 4B-IT model...")
+
+            # Load tokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(
+                self.config.model_name,
+                cache_dir=self.config.model_path
+            )
+            # Prompt packing counts tokens on the event loop; a separate instance keeps it clear of the
+            # padding and truncation state the inference thread sets on the main tokenizer
+            self._counting_tokenizer = copy.deepcopy(self.tokenizer)
+
+            if self.config.device == "cpu":
+                torch.set_num_threads(self.config.cpu_threads())
+
+            # Quantized modes target CPU nodes; on GPU the fp16 weights are used as before
+            quantization = self.config.quantization if self.config.device == "cpu" else "none"
+            if quantization not in QUANTIZATION_MODES:
+                raise ValueError(f"Unknown MEDGEMMA_QUANTIZATION '{quantization}', expected one of {QUANTIZATION_MODES}")
+
+            # Load model
+            if quantization == "int4":
+                self.model = load_int4_model(self.config.model_name, self.config.model_path)
+            elif self.config.shared_weights and self.config.device == "cpu":
+                from shared_weights import export_shared_weights, load_shared_model
+                # One export per model so changing PRIMARY_MODEL never maps stale weights
+                export_path = os.path.join(self.config.shared_weights_path, self.config.model_name.replace("/", "--"))
+                export_shared_weights(self.config.model_name, self.config.model_path, export_path)
+                self.model = load_shared_model(export_path)
+            else:
+                self.model = AutoModelForCausalLM.from_pretrained(
+                    self.config.model_name,
+                    cache_dir=self.config.model_path,
+                    torch_dtype=torch.float16 if self.config.device == "cuda" else torch.float32,
+                    device_map="auto" if self.config.device == "cuda" else None,
+                    low_cpu_mem_usage=True
+                )
+
+            if self.config.device == "cuda":
+                self.model = self.model.cuda()
+
+            if quantization == "int8":
+                self.model = quantize_int8_dynamic(self.model)
+
+            if self.config.draft_model:
+                self.speculative = SpeculativeDecoder.load(
+                    self.config.draft_model, self.config.model_path, self.model, self.config.device,
+                    self.config.draft_min_acceptance, self.config.draft_window_tokens, self.config.model_name
+                )
+
+            if self.config.torch_compile:
+                self._compile()
+
+            self.logger.info("MedGemma model loaded successfully")
+
+        except Exception as e:
+            self.logger.error(f"Failed to load MedGemma model: {e}")
+            raise
+
+    def _compile(self):
+        """
+        Compile the forward pass with dynamic shapes (batch size and sequence length vary per call)
+
+        Compilation happens lazily on the first calls, i.e. during warmup. Inductor artifacts go
+        to compile_cache_dir, so a restart with the same model and shapes skips most of the work.
+        """
+        os.makedirs(self.config.compile_cache_dir, exist_ok=True)
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.abspath(self.config.compile_cache_dir))
+        self.model.forward = torch.compile(self.model.forward, dynamic=True)
+        self.logger.info(f"Model forward compiled lazily, cache in {os.environ['TORCHINDUCTOR_CACHE_DIR']}")
+
+    def warm_prefixes(self, prefixes: List[str]):
+        """Prefill static template preambles once so requests only prefill their own text"""
+        if not self.config.prefix_cache:
+            return
+        for prefix in prefixes:
+            if prefix in self.prefix_cache:
+                continue
+            # The last token can merge with the query text that follows it, so leave it to the request
+            input_ids = self.tokenizer(prefix, return_tensors="pt")["input_ids"][:, :-1]
+            if self.config.device == "cuda":
+                input_ids = input_ids.cuda()
+            with torch.no_grad():
+                outputs = self.model(input_ids=input_ids, use_cache=True)
+            self.prefix_cache[prefix] = _PrefixEntry(input_ids, outputs.past_key_values)
+        self.logger.info(f"Prefix KV cache holds {len(self.prefix_cache)} template preambles")
+
+    def _prefix_kv(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        generate() kwargs reusing the cached KV of the preamble a single prompt starts with
+
+        Only single-prompt calls qualify: left padding shifts the preamble's positions
+        differently in every row of a batch.
+        """
+        input_ids = inputs["input_ids"]
+        if not self.prefix_cache or input_ids.shape[0] != 1:
+            return {}
+        for entry in self.prefix_cache.values():
+            length = entry.input_ids.shape[1]
+            if input_ids.shape[1] > length and torch.equal(input_ids[0, :length], entry.input_ids[0]):
+                CACHE_LOOKUPS.labels("prefix", "hit").inc()
+                # generate() appends to the cache it is given, so the shared entry must stay untouched
+                return {"past_key_values": copy.deepcopy(entry.past_key_values)}
+        CACHE_LOOKUPS.labels("prefix", "miss").inc()
+        return {}
+
+    def count_tokens(self, text: str) -> int:
+        if self._counting_tokenizer is None:
+            return super().count_tokens(text)
+        return len(self._counting_tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def _prepare_inputs(self, prompts: List[str]) -> Dict[str, Any]:
+        """Tokenize a batch of prompts with left padding"""
+        # Left padding keeps every prompt flush against its generated continuation
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"
+        # Prompts are packed to MEDGEMMA_PROMPT_TOKEN_BUDGET already; should one still overflow,
+        # cut the start rather than the instructions and response cue at the end
+        self.tokenizer.truncation_side = "left"
+
+        inputs = self.tokenizer(
+            prompts,
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=2048
+        )
+
+        if self.config.device == "cuda":
+            inputs = {k: v.cuda() for k, v in inputs.items()}
+
+        return inputs
+
+    def _generation_kwargs(self, params: GenerationParams) -> Dict[str, Any]:
+        return {
+            "max_new_tokens": params.max_new_tokens,
+            "temperature": params.temperature,
+            "top_p": params.top_p,
+            "do_sample": params.do_sample,
+            "pad_token_id": self.tokenizer.pad_token_id
+        }
+
+    def _speculative_kwargs(self, batch_size: int) -> Dict[str, Any]:
+        """Draft-model kwargs for generate(); empty when speculative decoding is off or cannot apply"""
+        return self.speculative.generate_kwargs(batch_size) if self.speculative else {}
+
+    def _control_criteria(self, controls: List[Optional[RequestControl]],
+                          inputs: Dict[str, Any]) -> ControlStoppingCriteria:
+        """Deadline and cancellation checks for a generate() call over the tokenized `inputs`"""
+        eos_token_id = self.model.generation_config.eos_token_id
+        if eos_token_id is None:
+            eos_token_id = self.tokenizer.eos_token_id
+        eos_token_ids = [] if eos_token_id is None else [eos_token_id] if isinstance(eos_token_id, int) else list(eos_token_id)
+        return ControlStoppingCriteria(controls, eos_token_ids, inputs["input_ids"].shape[1])
+
+    def batch_generate(self, prompts: List[str], params: GenerationParams,
+                       controls: Optional[List[Optional[RequestControl]]] = None) -> List[Any]:
+        """
+        Tokenize, generate and decode a padded batch
+
+        Rows stopped by their RequestControl come back as GenerationAborted instead of text.
+        """
+        try:
+            with stage_timer("tokenization"):
+                inputs = self._prepare_inputs(prompts)
+            stopping = self._control_criteria(controls or [None] * len(prompts), inputs)
+            timer = GenerationTimer()
+            assistant = self._speculative_kwargs(len(prompts))
+
+            # Generate response
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    **inputs, **self._generation_kwargs(params), **self._prefix_kv(inputs), **assistant,
+                    stopping_criteria=StoppingCriteriaList([stopping, timer])
+                )
+
+            # Padding after a row finishes is not generated work
+            prompt_length = inputs['input_ids'].shape[1]
+            generated = outputs[:, prompt_length:]
+            new_tokens = int((generated != self.tokenizer.pad_token_id).sum())
+            timer.record(new_tokens, speculative=bool(assistant))
+            if assistant:
+                self.speculative.record(new_tokens)
+
+            # Decode responses, dropping the (padded) prompt prefix of each row
+            with stage_timer("decode_to_text"):
+                return [
+                    GenerationAborted(stopping.controls[row].reason) if row in stopping.stopped
+                    else self.tokenizer.decode(output, skip_special_tokens=True).strip()
+                    for row, output in enumerate(generated)
+                ]
+
+        except Exception as e:
+            self.logger.error(f"Error generating MedGemma response: {e}")
+            raise
+
+    def generate_json(self, prompt: str, shape: Tuple, params: GenerationParams,
+                      control: Optional[RequestControl] = None) -> Dict[str, Any]:
+        """Decode under the JSON shape constraint and stop as the object closes"""
+        if self._token_table is None:
+            self._token_table = TokenTable(self.tokenizer, self.model.get_output_embeddings().out_features)
+
+        with stage_timer("tokenization"):
+            inputs = self._prepare_inputs([prompt])
+        processor = JsonShapeLogitsProcessor(self._token_table, shape, params.max_new_tokens)
+        generation_kwargs = {**self._generation_kwargs(params), "max_new_tokens": processor.max_new_tokens}
+        stopping = self._control_criteria([control], inputs)
+        timer = GenerationTimer()
+        # No draft model here: the processor tracks one growing sequence and cannot follow
+        # candidate tokens that verification later rejects
+        with torch.no_grad():
+            outputs = self.model.generate(
+                **inputs, **generation_kwargs, **self._prefix_kv(inputs),
+                logits_processor=LogitsProcessorList([processor]),
+                stopping_criteria=StoppingCriteriaList([stopping, JsonCompleteCriteria(processor), timer])
+            )
+        timer.record(outputs.shape[1] - inputs["input_ids"].shape[1])
+
+        if stopping.stopped:
+            raise GenerationAborted(control.reason)
+        # The processor kept the exact validated text, so this parse cannot fail
+        with stage_timer("decode_to_text"):
+            return json.loads(processor.text(0))
+
+    def stream(self, prompt: str, params: GenerationParams, on_text: Callable[[str], None],
+               control: Optional[RequestControl] = None):
+        """Generate a single prompt, passing text to `on_text` as tokens decode"""
+        try:
+            with stage_timer("tokenization"):
+                inputs = self._prepare_inputs([prompt])
+            stopping = self._control_criteria([control], inputs)
+            timer = GenerationTimer()
+            assistant = self._speculative_kwargs(1)
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    **inputs, **self._generation_kwargs(params), **self._prefix_kv(inputs), **assistant,
+                    streamer=CallbackStreamer(self.tokenizer, on_text),
+                    stopping_criteria=StoppingCriteriaList([stopping, timer])
+                )
+            # Text is decoded incrementally by the streamer, inside the decode stage; with a draft
+            # model one step can emit several tokens, so count them from the output
+            new_tokens = outputs.shape[1] - inputs["input_ids"].shape[1]
+            timer.record(new_tokens, speculative=bool(assistant))
+            if assistant:
+                self.speculative.record(new_tokens)
+        except Exception as e:
+            self.logger.error(f"Error streaming MedGemma response: {e}")
+            raise
+
+        if stopping.stopped:
+            raise GenerationAborted(control.reason)
@@ -6,9 +6,12 @@ require('dotenv').config();
 const app = express();
 const PORT = process.env.PORT || 3001;
 const MEDICAL_AI_URL = process.env.MEDICAL_AI_URL || 'http://localhost:8000';
+// The medical AI bounds each query by its own REQUEST_TIMEOUT (30s by default) and answers
+// with a degraded response when it passes, so the proxy waits a little longer than that
+const MEDICAL_AI_TIMEOUT_MS = parseInt(process.env.MEDICAL_AI_TIMEOUT_MS || '35000', 10);
 
 // Middleware
-app.use(cors());
+app.use(cors({ exposedHeaders: ['Retry-After'] }));
 app.use(express.json());
 
 // Health check endpoint
@@ -21,8 +24,26 @@ app.get('/health', (req, res) => {
 });
 
 
+// Relays an upstream error status with its Retry-After, so clients see the queue's backoff hint
+function sendUpstreamError(res, error, message) {
+  const retryAfter = error.response.headers['retry-after'];
+  if (retryAfter) {
+    res.set('Retry-After', retryAfter);
+  }
+  res.status(error.response.status).json({
+    error: 'Medical AI processing error',
+    message
+  });
+}
+
 // Medical AI proxy endpoints
 app.post('/api/medical/query', async (req, res) => {
+  const controller = new AbortController();
+  // A client that gives up stops the upstream request, which stops generation
+  res.on('close', () => {
+    if (!res.writableEnded) controller.abort();
+  });
+
   try {
     console.log('Received medical query:', req.body);
     
@@ -30,13 +51,17 @@ app.post('/api/medical/query', async (req, res) => {
       headers: {
         'Content-Type': 'application/json'
       },
-      timeout: 30000 // 30 second timeout
+      timeout: MEDICAL_AI_TIMEOUT_MS,
+      signal: controller.signal
     });
     
     console.log('Medical AI response received');
     res.json(response.data);
     
   } catch (error) {
+    if (axios.isCancel(error)) {
+      return;
+    }
     console.error('Medical AI error:', error.message);
     
     if (error.code === 'ECONNREFUSED') {
@@ -45,9 +70,11 @@ app.post('/api/medical/query', async (req, res) => {
         message: 'Please ensure the Python medical AI service is running on port 8000'
       });
     } else if (error.response) {
-      res.status(error.response.status).json({
-        error: 'Medical AI processing error',
-        message: error.response.data?.detail || error.message
+      sendUpstreamError(res, error, error.response.data?.detail || error.message);
+    } else if (error.code === 'ECONNABORTED') {
+      res.status(504).json({
+        error: 'Medical AI timeout',
+        message: error.message
       });
     } else {
       res.status(500).json({ 
@@ -58,6 +85,53 @@ app.post('/api/medical/query', async (req, res) => {
   }
 });
 
+// Streaming proxy: relays server-sent events as they arrive, so no overall timeout applies
+app.post('/api/medical/query/stream', async (req, res) => {
+  const controller = new AbortController();
+  // req's 'close' already fired once express.json() read the body; res closes when the client goes away
+  res.on('close', () => {
+    if (!res.writableEnded) controller.abort();
+  });
+
+  try {
+    const response = await axios.post(`${MEDICAL_AI_URL}/query/stream`, req.body, {
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      responseType: 'stream',
+      signal: controller.signal
+    });
+
+    res.writeHead(200, {
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache',
+      'Connection': 'keep-alive'
+    });
+    response.data.pipe(res);
+
+  } catch (error) {
+    if (axios.isCancel(error)) {
+      return;
+    }
+    console.error('Medical AI stream error:', error.message);
+
+    if (error.code === 'ECONNREFUSED') {
+      res.status(503).json({
+        error: 'Medical AI service unavailable',
+        message: 'Please ensure the Python medical AI service is running on port 8000'
+      });
+    } else if (error.response) {
+      // The error body is a stream here, so only the status text is relayed
+      sendUpstreamError(res, error, error.message);
+    } else {
+      res.status(500).json({
+        error: 'Internal server error',
+        message: error.message
+      });
+    }
+  }
+});
+
 app.post('/api/medical/classify', async (req, res) => {
   try {
     const { text } = req.body;